@@ -7,13 +7,19 @@ from .admin.routes import admin_bp
 from .domestic.routes import domestic_bp
 from .international.routes import international_bp
 from .reconciliation.routes import reconciliation_bp
+from .services.status_events import init_status_events
+from .services.query_stats import init_query_stats
+from .serializers import OrjsonProvider
 from config import config
 
 def create_app(env="development"):
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     app.config.from_object(config[env])
 
     db.init_app(app)
+    init_status_events(app)
+    init_query_stats(app)
     # Correctly initialize CORS to allow all API requests from any origin
     cors.init_app(
         app,
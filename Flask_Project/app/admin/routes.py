@@ -1,19 +1,46 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app.models import Shipment, User, PaymentRequest, BalanceCode
 from app.extensions import db
-from sqlalchemy import or_, func, and_
-from sqlalchemy.orm.attributes import flag_modified
-from datetime import datetime
+from sqlalchemy import func, and_, select
+from sqlalchemy.orm import with_expression
+from datetime import datetime, timedelta
+import json
 import string
 import random
 from werkzeug.security import generate_password_hash
 from functools import wraps
 from decimal import Decimal, InvalidOperation
-from app.utils import generate_shipment_id_str
+from app.serializers import ADMIN_SHIPMENT, BALANCE_CODE, PAYMENT, USER, USER_SHIPMENT
+from app.services.shipment_ids import allocate_shipment_id_str
+from app.services.quote_cache import quote_cache
+from app.services.tracking import insert_shipment_with_event, set_status_with_event, shipment_tracking_history
+from app.services.status_events import (
+    ensure_status_listener, payment_event, publish_status_change, status_broker, stream_status_events
+)
+from app.services.shipment_detail_cache import shipment_detail_cache
+from app.services.balance_ledger import available_balance_column
+from app.services.pagination import InvalidCursor, paginated_listing
+from app.services.query_stats import count_query_chunks
+from app.services.search import search_shipments, search_users
+from app.services.analytics_rollups import SHIPMENT_DIMENSIONS, parse_day_range, shipment_totals, user_count
+from app.reconciliation.statement import (
+    INVOICE_OWNER_EMAIL,
+    build_invoice_shipment,
+    invoice_tracking_event,
+    iter_statement_lines,
+    mark_shipment_paid,
+    reconcile_statement,
+    statement_format,
+)
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
+SHIPMENT_STATUSES = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered', 'Cancelled']
+
+# Bulk status updates commit this many shipments per transaction
+BULK_STATUS_CHUNK_SIZE = 1000
+
 # --- Admin Authentication Decorator ---
 def admin_required(f):
     @wraps(f)
@@ -50,90 +77,46 @@ def create_invoice_from_payment():
     if not sender_data or not receiver_data:
         return jsonify({"error": "Missing 'sender' or 'receiver' data within the 'order' object"}), 400
 
-    admin_user = User.query.filter_by(email="dhillon@logistix.com").first()
+    admin_user = User.query.filter_by(email=INVOICE_OWNER_EMAIL).first()
     if not admin_user:
-        return jsonify({"error": "Default admin user 'dhillon@logistix.com' not found. Please run the add_admin.py script."}), 404
+        return jsonify({"error": f"Default admin user '{INVOICE_OWNER_EMAIL}' not found. Please run the add_admin.py script."}), 404
 
     try:
-        total_price = Decimal(transaction.get("amount"))
-        weight_kg = Decimal(transaction.get("weight", 0))
-        price_without_tax = total_price / Decimal("1.18")
-        tax_amount = total_price - price_without_tax
-        now_iso = datetime.utcnow().isoformat()
-        
-        sender_street = f"{sender_data.get('address_line1', '')} {sender_data.get('address_line2', '')}".strip()
-        receiver_street = f"{receiver_data.get('address_line1', '')} {receiver_data.get('address_line2', '')}".strip()
-
-        # Random descriptions for goods
-        possible_descriptions = [
-            "Paper Goods", "Printed Material", "Sample Documents", 
-            "Commercial Sample", "Marketing Material"
-        ]
-        random_description = random.choice(possible_descriptions)
-        
-        goods_description_with_weight = f"{random_description} ({weight_kg} kg)"
-
-        new_shipment = Shipment(
-            user_id=admin_user.id,
-            user_email=admin_user.email,
-            shipment_id_str=generate_shipment_id_str(db.session, Shipment),
-            
-            sender_name=sender_data.get("name"),
-            sender_address_street=sender_street,
-            sender_address_city=sender_data.get("city"),
-            sender_address_state=sender_data.get("state"),
-            sender_address_pincode=sender_data.get("pincode"),
-            sender_address_country=sender_data.get("country"),
-            sender_phone=sender_data.get("phone"),
-
-            receiver_name=receiver_data.get("name"),
-            receiver_address_street=receiver_street,
-            receiver_address_city=receiver_data.get("city"),
-            receiver_address_state=receiver_data.get("state"),
-            receiver_address_pincode=receiver_data.get("pincode"),
-            receiver_address_country=receiver_data.get("country"),
-            receiver_phone=receiver_data.get("phone"),
-
-            package_weight_kg=weight_kg,
-            package_length_cm=0,
-            package_width_cm=0,
-            package_height_cm=0,
-            
-            goods_details=[{
-                "description": goods_description_with_weight,
-                "quantity": 1,
-                "value": float(price_without_tax), # Value is price before tax
-                "hsn_code": "996812" # HSN for courier services
-            }],
-
-            pickup_date=datetime.strptime(transaction.get("date"), "%Y-%m-%d").date() if transaction.get("date") else datetime.utcnow().date(),
-            service_type="Reconciled",
-            status="Booked",
-
-            price_without_tax=price_without_tax,
-            tax_amount_18_percent=tax_amount,
-            total_with_tax_18_percent=total_price,
-
-            tracking_history=[{
-                "stage": "Booked",
-                "date": now_iso,
-                "location": sender_data.get("city", "N/A"),
-                "activity": f"Shipment booked and paid via {transaction.get('type', 'N/A')}. UTR: {transaction.get('utr', 'N/A')}"
-            }]
+        shipment_id_str = allocate_shipment_id_str(db.session)
+        insert_shipment_with_event(
+            build_invoice_shipment(admin_user, transaction, sender_data, receiver_data, shipment_id_str),
+            *invoice_tracking_event(transaction, sender_data)
         )
-
-        db.session.add(new_shipment)
         db.session.commit()
 
         return jsonify({
             "message": "Paid invoice and shipment created successfully.",
-            "shipment_id_str": new_shipment.shipment_id_str,
+            "shipment_id_str": shipment_id_str,
         }), 201
 
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@admin_bp.route("/reconcile-statement", methods=["POST"])
+@admin_required
+def reconcile_bank_statement():
+    try:
+        fmt, stream = statement_format(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    admin_user = User.query.filter_by(email=INVOICE_OWNER_EMAIL).first()
+    if not admin_user:
+        return jsonify({"error": f"Default admin user '{INVOICE_OWNER_EMAIL}' not found. Please run the add_admin.py script."}), 404
+
+    try:
+        report = reconcile_statement(iter_statement_lines(fmt, stream), admin_user)
+        return jsonify(report), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
 
 @admin_bp.route("/balance-codes", methods=["POST"])
 @admin_required
@@ -182,17 +165,7 @@ def get_balance_codes():
 
     codes = query.order_by(BalanceCode.created_at.desc()).all()
     
-    result = []
-    for code, email in codes:
-        result.append({
-            "id": code.id,
-            "code": code.code,
-            "amount": float(code.amount),
-            "is_redeemed": code.is_redeemed,
-            "created_at": code.created_at.isoformat(),
-            "redeemed_at": code.redeemed_at.isoformat() if code.redeemed_at else None,
-            "redeemed_by": email
-        })
+    result = [BALANCE_CODE.dump(code, redeemed_by=email) for code, email in codes]
     return jsonify(result), 200
 
 @admin_bp.route("/balance-codes/<int:code_id>", methods=["DELETE"])
@@ -213,15 +186,13 @@ def delete_balance_code(code_id):
 @admin_bp.route("/shipments", methods=["GET"])
 @admin_required
 def get_all_shipments():
-    page = int(request.args.get("page", 1))
-    limit = int(request.args.get("limit", 10))
     status = request.args.get("status")
     q = request.args.get("q")
     
     query = db.session.query(
-        Shipment,
+        *ADMIN_SHIPMENT.columns(Shipment),
         User.is_employee
-    ).join(User, Shipment.user_id == User.id)
+    ).select_from(Shipment).join(User, Shipment.user_id == User.id)
 
     # By default, do not show shipments that are pending payment
     if not status or status.lower() == 'all':
@@ -229,92 +200,159 @@ def get_all_shipments():
     elif status:
         query = query.filter(Shipment.status == status)
 
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                Shipment.shipment_id_str.ilike(like_q),
-                Shipment.sender_name.ilike(like_q),
-                Shipment.receiver_name.ilike(like_q),
-                User.email.ilike(like_q)
-            )
+    query, rank = search_shipments(query, q)
+
+    def dump_page(rows):
+        return [ADMIN_SHIPMENT.dump(row, user_type="Employee" if row.is_employee else "Customer") for row in rows]
+
+    try:
+        body = paginated_listing(
+            query, Shipment.booking_date, Shipment.id, request.args, "shipments", dump_page,
+            count_key=("admin_shipments", status, q), rank=rank,
         )
-    
-    total_count = query.count()
-    pagination = query.order_by(Shipment.booking_date.desc()).paginate(page=page, per_page=limit, error_out=False)
-    shipments_with_user_type = pagination.items
-
-    result = []
-    for s, is_employee in shipments_with_user_type:
-        result.append({
-            "id": s.id,
-            "shipment_id_str": s.shipment_id_str,
-            "sender_name": s.sender_name,
-            "receiver_name": s.receiver_name,
-            "receiver_address_city": s.receiver_address_city,
-            "service_type": s.service_type,
-            "package_weight_kg": float(s.package_weight_kg),
-            "booking_date": s.booking_date.isoformat(),
-            "status": s.status,
-            "price_without_tax": float(s.price_without_tax),
-            "tax_amount_18_percent": float(s.tax_amount_18_percent),
-            "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
-            "user_type": "Employee" if is_employee else "Customer",
-        })
-    return jsonify({
-        "shipments": result,
-        "totalPages": pagination.pages or 1,
-        "currentPage": page,
-        "totalCount": total_count
-    }), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(body), 200
+
+def _parse_bulk_status_filter(filters):
+    """
+    Turns {"status", "date_from", "date_to"} (booking dates, YYYY-MM-DD,
+    both inclusive) into SQLAlchemy criteria. Raises ValueError if the filter
+    is empty or malformed, so a typo can't select every shipment.
+    """
+    if not isinstance(filters, dict):
+        raise ValueError("filter must be an object.")
+
+    criteria = []
+    if filters.get("status"):
+        criteria.append(Shipment.status == filters["status"])
+    try:
+        if filters.get("date_from"):
+            criteria.append(Shipment.booking_date >= datetime.strptime(filters["date_from"], "%Y-%m-%d"))
+        if filters.get("date_to"):
+            criteria.append(Shipment.booking_date < datetime.strptime(filters["date_to"], "%Y-%m-%d") + timedelta(days=1))
+    except (TypeError, ValueError):
+        raise ValueError("date_from and date_to must be in YYYY-MM-DD format.")
+
+    if not criteria:
+        raise ValueError("filter needs at least one of status, date_from or date_to.")
+    return criteria
+
+def _bulk_status_id_chunks(shipment_ids, criteria):
+    # Explicit IDs are chunked as given; a filter is walked in id order, so
+    # updating rows out of the filter's status never skips or repeats any
+    if shipment_ids is not None:
+        ids = sorted(set(shipment_ids))
+        for start in range(0, len(ids), BULK_STATUS_CHUNK_SIZE):
+            yield ids[start:start + BULK_STATUS_CHUNK_SIZE]
+        return
+
+    last_id = 0
+    while True:
+        ids = [
+            row[0] for row in db.session.query(Shipment.id)
+            .filter(Shipment.id > last_id, *criteria)
+            .order_by(Shipment.id)
+            .limit(BULK_STATUS_CHUNK_SIZE)
+        ]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+def _run_bulk_status_update(shipment_ids, criteria, new_status):
+    """
+    Updates one chunk per transaction and yields a progress dict after each.
+    The last dict has "done": True, or an "error" if a chunk failed (earlier
+    chunks stay committed).
+    """
+    activity = f"Status updated to {new_status} via bulk action."
+    now = datetime.utcnow()
+    progress = {"matched": 0, "updated_count": 0, "chunks": 0}
+
+    try:
+        for ids in _bulk_status_id_chunks(shipment_ids, criteria):
+            # Location is not provided in bulk update
+            progress["updated_count"] += set_status_with_event(ids, new_status, "", activity, now)
+            db.session.commit()
+            count_query_chunks()
+            progress["matched"] += len(ids)
+            progress["chunks"] += 1
+            yield dict(progress)
+    except Exception as e:
+        db.session.rollback()
+        yield {**progress, "error": f"An unexpected error occurred during bulk update: {str(e)}"}
+        return
+
+    yield {
+        **progress,
+        "done": True,
+        "message": f"Successfully updated status for {progress['updated_count']} shipments to '{new_status}'.",
+    }
+
+@admin_bp.route("/shipments/events", methods=["GET"])
+def stream_all_shipment_events():
+    """
+    Server-sent status changes for all shipments. EventSource can't send
+    headers, so the admin email may also be given as ?email=.
+    """
+    user_email = request.headers.get("X-User-Email") or request.args.get("email")
+    if not user_email:
+        return jsonify({"error": "Authentication required: Missing user email header"}), 401
+
+    user = User.query.filter_by(email=user_email).first()
+    if not user or not user.is_admin:
+        return jsonify({"error": "Forbidden: Admin access required"}), 403
+    db.session.remove()  # Don't hold a pooled connection for the life of the stream
+
+    ensure_status_listener(current_app._get_current_object())
+    return Response(
+        stream_status_events(status_broker.subscribe()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @admin_bp.route("/shipments/bulk-status-update", methods=["POST"])
 @admin_required
 def bulk_update_shipment_status():
+    """
+    Sets the status of the shipments in "shipment_ids", or of every shipment
+    matching "filter", in chunks of set-based updates. With "stream": true
+    (or Accept: application/x-ndjson) progress is streamed as NDJSON, one
+    line per chunk.
+    """
     data = request.get_json()
     shipment_ids = data.get("shipment_ids")
+    filters = data.get("filter")
     new_status = data.get("status")
 
-    valid_statuses = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered', 'Cancelled']
-    if not all([shipment_ids, new_status]) or new_status not in valid_statuses:
-        return jsonify({"error": "Invalid payload: shipment_ids and a valid status are required."}), 400
-    
-    if not isinstance(shipment_ids, list) or len(shipment_ids) == 0:
+    if new_status not in SHIPMENT_STATUSES:
+        return jsonify({"error": "Invalid payload: shipment_ids or filter and a valid status are required."}), 400
+
+    criteria = None
+    if filters is not None:
+        try:
+            criteria = _parse_bulk_status_filter(filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        shipment_ids = None
+    elif not isinstance(shipment_ids, list) or len(shipment_ids) == 0:
         return jsonify({"error": "shipment_ids must be a non-empty list."}), 400
+    elif not all(isinstance(i, int) for i in shipment_ids):
+        return jsonify({"error": "shipment_ids must be integers."}), 400
 
-    try:
-        updated_count = 0
-        now_iso = datetime.utcnow().isoformat()
-        
-        # Query all shipments at once
-        shipments_to_update = Shipment.query.filter(Shipment.id.in_(shipment_ids)).all()
-
-        for shipment in shipments_to_update:
-            shipment.status = new_status
-            
-            entry = {
-                "stage": new_status,
-                "date": now_iso,
-                "location": "",  # Location is not provided in bulk update
-                "activity": f"Status updated to {new_status} via bulk action.",
-            }
-            
-            history = shipment.tracking_history or []
-            history.append(entry)
-            shipment.tracking_history = history
-            flag_modified(shipment, "tracking_history")
-            updated_count += 1
-
-        db.session.commit()
+    updates = _run_bulk_status_update(shipment_ids, criteria, new_status)
 
-        return jsonify({
-            "message": f"Successfully updated status for {updated_count} shipments to '{new_status}'.",
-            "updated_count": updated_count
-        }), 200
+    if data.get("stream") or request.accept_mimetypes.best == "application/x-ndjson":
+        return Response(
+            stream_with_context(json.dumps(progress) + "\n" for progress in updates),
+            mimetype="application/x-ndjson",
+        )
 
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": f"An unexpected error occurred during bulk update: {str(e)}"}), 500
+    progress = list(updates)[-1]
+    if "error" in progress:
+        return jsonify(progress), 500
+    return jsonify(progress), 200
 
 
 @admin_bp.route("/shipments/<shipment_id_str>/status", methods=["PUT"])
@@ -325,50 +363,73 @@ def update_shipment_status(shipment_id_str):
     location = data.get("location")
     activity = data.get("activity")
 
-    valid_statuses = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered', 'Cancelled']
-    if not new_status or new_status not in valid_statuses:
+    if not new_status or new_status not in SHIPMENT_STATUSES:
         return jsonify({"error": "Invalid or missing status"}), 400
 
     shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).first()
     if not shipment:
         return jsonify({"error": "Shipment not found"}), 404
 
-    shipment.status = new_status
-    entry = {
-        "stage": new_status,
-        "date": datetime.utcnow().isoformat(),
-        "location": location or "",
-        "activity": activity or f"Status updated to {new_status}",
-    }
-    history = shipment.tracking_history or []
-    history.append(entry)
-    shipment.tracking_history = history
-    flag_modified(shipment, "tracking_history")
-    db.session.commit()
-
-    return jsonify({
+    # One statement sets the status and records the event; the response is
+    # built before committing, so the shipment is not reloaded afterwards
+    set_status_with_event([shipment.id], new_status, location, activity or f"Status updated to {new_status}")
+    body = {
         "message": "Shipment status updated successfully",
         "updatedShipment": {
             "shipment_id_str": shipment.shipment_id_str,
-            "status": shipment.status,
-            "tracking_history": shipment.tracking_history,
+            "status": new_status,
+            "tracking_history": shipment_tracking_history(shipment),
         }
-    }), 200
+    }
+    db.session.commit()
+    return jsonify(body), 200
 
 @admin_bp.route("/web_analytics", methods=["GET"])
 @admin_required
 def web_analytics():
-    total_orders = db.session.query(func.count(Shipment.id)).scalar() or 0
-    total_revenue = db.session.query(func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0)).scalar() or 0.0
-    total_users = db.session.query(func.count(User.id)).filter(User.is_admin == False, User.is_employee == False).scalar() or 0
+    # Served from the daily rollups: ?from= and ?to= (YYYY-MM-DD, inclusive,
+    # IST days) bound the range, ?group_by= breaks the totals down
+    try:
+        start, end = parse_day_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    group_by = [d.strip() for d in request.args.get("group_by", "").split(",") if d.strip()]
+    unknown = [d for d in group_by if d not in SHIPMENT_DIMENSIONS]
+    if unknown:
+        return jsonify({"error": f"Cannot group by {', '.join(unknown)}. Use any of: {', '.join(SHIPMENT_DIMENSIONS)}"}), 400
+    group_by = list(dict.fromkeys(group_by))
+
+    if group_by:
+        groups = [
+            {**{d: row[i] for i, d in enumerate(group_by)}, "orders": row.orders, "revenue": float(row.revenue)}
+            for row in shipment_totals(start, end, group_by)
+        ]
+        total_orders = sum(g["orders"] for g in groups)
+        total_revenue = sum(g["revenue"] for g in groups)
+    else:
+        totals = shipment_totals(start, end)[0]
+        total_orders, total_revenue = totals.orders, float(totals.revenue)
     avg_revenue = (total_revenue / total_orders) if total_orders > 0 else 0.0
 
-    return jsonify({
+    body = {
         "total_orders": total_orders,
-        "total_revenue": float(total_revenue),
+        "total_revenue": total_revenue,
         "avg_revenue": float(avg_revenue),
-        "total_users": total_users
-    }), 200
+        "total_users": user_count(start, end),
+    }
+    if group_by:
+        body["groups"] = groups
+    return jsonify(body), 200
+
+@admin_bp.route("/quote-cache/stats", methods=["GET"])
+@admin_required
+def quote_cache_stats():
+    return jsonify(quote_cache.stats()), 200
+
+@admin_bp.route("/shipment-cache/stats", methods=["GET"])
+@admin_required
+def shipment_cache_stats():
+    return jsonify(shipment_detail_cache.stats()), 200
 
 @admin_bp.route("/payments", methods=["GET"])
 @admin_required
@@ -384,18 +445,10 @@ def get_payments():
         Shipment, PaymentRequest.shipment_id == Shipment.id
     ).order_by(PaymentRequest.created_at.desc()).all()
 
-    result = []
-    for payment, first_name, last_name, shipment_id_str in payments_query:
-        result.append({
-            "id": payment.id,
-            "order_id": shipment_id_str,
-            "first_name": first_name,
-            "last_name": last_name,
-            "amount": float(payment.amount),
-            "utr": payment.utr,
-            "status": payment.status,
-            "created_at": payment.created_at.isoformat()
-        })
+    result = [
+        PAYMENT.dump(payment, order_id=shipment_id_str, first_name=first_name, last_name=last_name)
+        for payment, first_name, last_name, shipment_id_str in payments_query
+    ]
     return jsonify(result), 200
 
 @admin_bp.route("/payments/<int:payment_id>/status", methods=["PUT"])
@@ -407,128 +460,97 @@ def update_payment_status(payment_id):
     if new_status not in ["Approved", "Rejected"]:
         return jsonify({"error": "Invalid status"}), 400
 
-    payment = PaymentRequest.query.get(payment_id)
-    if not payment:
+    # The payment and its shipment in one query
+    row = db.session.query(PaymentRequest, Shipment).outerjoin(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ).filter(PaymentRequest.id == payment_id).first()
+    if not row:
         return jsonify({"error": "Payment not found"}), 404
+    payment, shipment = row
     
     if payment.status != 'Pending':
         return jsonify({"error": "Payment has already been processed"}), 400
 
     payment.status = new_status
 
-    if new_status == "Approved":
-        shipment = Shipment.query.get(payment.shipment_id)
-        if shipment:
-            shipment.status = "Booked"
-            now_iso = datetime.utcnow().isoformat()
-            history = shipment.tracking_history or []
-            found = False
-            for entry in history:
-                if entry.get("stage") == "Pending Payment":
-                    entry["stage"] = "Booked"
-                    entry["date"] = now_iso
-                    entry["activity"] = "Shipment booked and payment confirmed."
-                    found = True
-                    break
-            if not found:
-                 history.insert(0, {
-                    "stage": "Booked",
-                    "date": now_iso,
-                    "location": shipment.sender_address_city,
-                    "activity": "Shipment booked and payment confirmed."
-                 })
-            shipment.tracking_history = history
-            flag_modified(shipment, "tracking_history")
-
+    if shipment:
+        if new_status == "Approved":
+            mark_shipment_paid(shipment)
+        else:
+            publish_status_change(payment_event(shipment.shipment_id_str, shipment.user_id, new_status))
 
     db.session.commit()
     return jsonify({"message": f"Payment {new_status.lower()} successfully"}), 200
 
+def _with_shipment_totals(query):
+    """
+    Loads each listed user's shipment count and total spent with the page
+    itself, as correlated subqueries that Postgres runs only for the rows
+    of the page.
+    """
+    def per_user(aggregate):
+        return select(aggregate).where(Shipment.user_id == User.id).correlate(User).scalar_subquery()
+
+    return query.options(
+        with_expression(User.shipment_count, per_user(func.count(Shipment.id))),
+        with_expression(User.total_spent, per_user(func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0))),
+    ).populate_existing()
+
+def _dump_listed_user(user, **extra):
+    return USER.dump(user, shipment_count=user.shipment_count, total_spent=float(user.total_spent), **extra)
+
 @admin_bp.route("/users", methods=["GET"])
 @admin_required
 def get_all_users():
-    page = int(request.args.get("page", 1))
-    limit = int(request.args.get("limit", 10))
     q = request.args.get("q")
     # Only get customers (not admins, not employees)
     query = User.query.filter(User.is_admin == False, User.is_employee == False)
 
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                User.first_name.ilike(like_q),
-                User.last_name.ilike(like_q),
-                User.email.ilike(like_q)
-            )
-        )
-    
-    total_count = query.count()
-    pagination = query.order_by(User.created_at.desc()).paginate(page=page, per_page=limit, error_out=False)
-    users = pagination.items
-
-    result = []
-    for user in users:
-        result.append({
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "created_at": user.created_at.isoformat(),
-            "shipment_count": len(user.shipments)
-        })
+    query, rank = search_users(query, q)
+    query = _with_shipment_totals(query)
 
-    return jsonify({
-        "users": result,
-        "totalPages": pagination.pages or 1,
-        "currentPage": page,
-        "totalCount": total_count
-    }), 200
+    def dump_page(users):
+        return [_dump_listed_user(user) for user in users]
+
+    try:
+        body = paginated_listing(
+            query, User.created_at, User.id, request.args, "users", dump_page,
+            count_key=("admin_users", q), rank=rank,
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(body), 200
 
 @admin_bp.route("/users/<int:user_id>", methods=["GET"])
 @admin_required
 def get_user_details(user_id):
-    user = User.query.get_or_404(user_id)
+    user = User.query.options(
+        with_expression(User.available_balance, available_balance_column())
+    ).populate_existing().filter_by(id=user_id).first_or_404()
     if user.is_admin:
         return jsonify({"error": "Cannot access admin user details"}), 403
 
-    shipments_query = Shipment.query.filter_by(user_id=user.id).order_by(Shipment.booking_date.desc()).all()
-    shipments_result = []
-    for s in shipments_query:
-        shipments_result.append({
-            "id": s.id,
-            "shipment_id_str": s.shipment_id_str,
-            "receiver_name": s.receiver_name,
-            "booking_date": s.booking_date.isoformat(),
-            "status": s.status,
-            "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
-        })
-
-    payments_query = PaymentRequest.query.filter_by(user_id=user.id).order_by(PaymentRequest.created_at.desc()).all()
-    payments_result = []
-    for p in payments_query:
-        shipment_for_payment = Shipment.query.get(p.shipment_id)
-        shipment_id_str_for_payment = shipment_for_payment.shipment_id_str if shipment_for_payment else "N/A"
-        payments_result.append({
-            "id": p.id,
-            "shipment_id_str": shipment_id_str_for_payment,
-            "amount": float(p.amount),
-            "utr": p.utr,
-            "status": p.status,
-            "created_at": p.created_at.isoformat()
-        })
-    
-    user_details = {
-        "id": user.id,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "email": user.email,
-        "created_at": user.created_at.isoformat(),
-        "is_employee": user.is_employee,
-    }
+    shipments_query = Shipment.query.with_entities(
+        *USER_SHIPMENT.columns(Shipment)
+    ).filter_by(user_id=user.id).order_by(Shipment.booking_date.desc()).all()
+    shipments_result = USER_SHIPMENT.dump_many(shipments_query)
+
+    payments_query = db.session.query(
+        PaymentRequest,
+        Shipment.shipment_id_str
+    ).outerjoin(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ).filter(
+        PaymentRequest.user_id == user.id
+    ).order_by(PaymentRequest.created_at.desc()).all()
+    payments_result = [
+        PAYMENT.dump(p, shipment_id_str=shipment_id_str or "N/A") for p, shipment_id_str in payments_query
+    ]
+
+    user_details = USER.dump(user, is_employee=user.is_employee)
 
     if user.is_employee:
-        user_details["balance"] = float(user.balance)
+        user_details["balance"] = float(user.available_balance)
 
     return jsonify({
         "user": user_details,
@@ -578,43 +600,23 @@ def create_employee():
 @admin_bp.route("/employees", methods=["GET"])
 @admin_required
 def get_all_employees():
-    page = int(request.args.get("page", 1))
-    limit = int(request.args.get("limit", 10))
     q = request.args.get("q")
     query = User.query.filter_by(is_employee=True)
 
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                User.first_name.ilike(like_q),
-                User.last_name.ilike(like_q),
-                User.email.ilike(like_q)
-            )
-        )
-    
-    total_count = query.count()
-    pagination = query.order_by(User.created_at.desc()).paginate(page=page, per_page=limit, error_out=False)
-    employees = pagination.items
-
-    result = []
-    for user in employees:
-        result.append({
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "created_at": user.created_at.isoformat(),
-            "shipment_count": len(user.shipments),
-            "balance": float(user.balance)
-        })
+    query, rank = search_users(query, q)
+    query = _with_shipment_totals(query).options(with_expression(User.available_balance, available_balance_column()))
 
-    return jsonify({
-        "users": result,
-        "totalPages": pagination.pages or 1,
-        "currentPage": page,
-        "totalCount": total_count
-    }), 200
+    def dump_page(employees):
+        return [_dump_listed_user(user, balance=float(user.available_balance)) for user in employees]
+
+    try:
+        body = paginated_listing(
+            query, User.created_at, User.id, request.args, "users", dump_page,
+            count_key=("admin_employees", q), rank=rank,
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(body), 200
 
 @admin_bp.route("/employees/<int:employee_id>", methods=["PUT"])
 @admin_required
@@ -624,16 +626,17 @@ def update_employee(employee_id):
         return jsonify({"error": "This is not an employee account"}), 400
 
     data = request.get_json()
-    
-    # Update fields if they exist in the request
-    if 'firstName' in data:
-        employee.first_name = data['firstName']
-    if 'lastName' in data:
-        employee.last_name = data['lastName']
+
+    # Update fields if they exist in the request. The email check comes
+    # first, so its query doesn't autoflush the other changes separately
     if 'email' in data and data['email'] != employee.email:
         if User.query.filter_by(email=data['email']).first():
             return jsonify({"error": "Email already in use"}), 409
         employee.email = data['email']
+    if 'firstName' in data:
+        employee.first_name = data['firstName']
+    if 'lastName' in data:
+        employee.last_name = data['lastName']
     if 'password' in data and data['password']:
         employee.password = generate_password_hash(data['password'])
 
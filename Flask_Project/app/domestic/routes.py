@@ -1,9 +1,24 @@
-
+import math
 from flask import Blueprint, request, jsonify
-from app.services.domestic_pricing_service import calculate_domestic_price
+from app.services.domestic_pricing_service import (
+    calculate_domestic_price,
+    calculate_domestic_price_batch,
+    calculate_domestic_quote_all,
+)
+from app.services.quote_token import issue_quote_token
+from app.utils import load_batch_rows
 
 domestic_bp = Blueprint("domestic", __name__, url_prefix="/api/domestic")
 
+# The frontend sends 'Express', 'Air Cargo', 'Surface Cargo', so we map them
+MODE_MAP = {
+    "Express": "express",
+    "Air Cargo": "air",
+    "Surface Cargo": "surface"
+}
+
+MAX_BATCH_ROWS = 50000
+
 @domestic_bp.route("/price", methods=["POST"])
 def price_calculator():
     try:
@@ -11,22 +26,16 @@ def price_calculator():
         state = data.get("state")
         city = data.get("city")
 
-        # The frontend sends 'Express', 'Air Cargo', 'Surface Cargo', so we map them
-        mode_map = {
-            "Express": "express",
-            "Air Cargo": "air",
-            "Surface Cargo": "surface"
-        }
         frontend_mode = data.get("mode")
-        mode = mode_map.get(frontend_mode)
-        
+        mode = MODE_MAP.get(frontend_mode)
+
         weight = float(data.get("weight", 0))
 
         if not mode or weight <= 0 or not (city or state):
             return jsonify({"error": "A destination (city or state), mode, and positive weight are required"}), 400
 
         result = calculate_domestic_price(state_name=state or "", city_name=city or "", mode=mode, weight_kg=weight)
-        
+
         if "error" in result:
              return jsonify(result), 400
 
@@ -39,7 +48,129 @@ def price_calculator():
             "weight_kg": weight,
             "rounded_weight": result["rounded_weight"],
             "total_price": final_price_with_tax,
-            "zone": result["zone"]
+            "zone": result["zone"],
+            "quote_token": issue_quote_token("domestic", (state, city), frontend_mode, weight, final_price_with_tax)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@domestic_bp.route("/quote-all", methods=["POST"])
+def quote_all_modes():
+    try:
+        data = request.get_json()
+        state = data.get("state")
+        city = data.get("city")
+        weight = float(data.get("weight", 0))
+
+        if weight <= 0 or not (city or state):
+            return jsonify({"error": "A destination (city or state) and positive weight are required"}), 400
+
+        result = calculate_domestic_quote_all(state_name=state or "", city_name=city or "", weight_kg=weight)
+
+        if "error" in result:
+            return jsonify(result), 400
+
+        quotes = {}
+        for frontend_mode, mode in MODE_MAP.items():
+            quote = result["quotes"][mode]
+            if "error" in quote:
+                quotes[frontend_mode] = quote
+                continue
+            total_price = round(quote["price"] * 1.18, 2)
+            quotes[frontend_mode] = {
+                "rounded_weight": quote["rounded_weight"],
+                "total_price": total_price,
+                "quote_token": issue_quote_token("domestic", (state, city), frontend_mode, weight, total_price)
+            }
+
+        cheapest = None
+        if result["cheapest"]:
+            cheapest_mode = next(fm for fm, mode in MODE_MAP.items() if mode == result["cheapest"])
+            cheapest = {"mode": cheapest_mode, "total_price": quotes[cheapest_mode]["total_price"]}
+
+        return jsonify({
+            "destination_state": state.title() if state else "N/A",
+            "weight_kg": weight,
+            "zone": result["zone"],
+            "quotes": quotes,
+            "cheapest": cheapest
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _parse_batch_row(row):
+    """
+    Accepts either {"state", "city", "mode", "weight"} or a
+    [destination, mode, weight] triple, where destination may be a city or a state.
+    Returns (state, city, frontend_mode, weight) or None if the row is invalid.
+    """
+    if isinstance(row, dict):
+        state = row.get("state") or ""
+        city = row.get("city") or row.get("destination") or ""
+        frontend_mode = row.get("mode")
+        weight = row.get("weight", 0)
+    elif isinstance(row, (list, tuple)) and len(row) == 3:
+        state = ""
+        city, frontend_mode, weight = row
+    else:
+        return None
+
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        return None
+
+    if not isinstance(state, str) or not isinstance(city, str) or frontend_mode not in MODE_MAP:
+        return None
+    if weight <= 0 or not math.isfinite(weight) or not (city or state):
+        return None
+    return state, city, frontend_mode, weight
+
+@domestic_bp.route("/price/batch", methods=["POST"])
+def price_calculator_batch():
+    try:
+        rows = load_batch_rows(request, MAX_BATCH_ROWS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        parsed_rows = [_parse_batch_row(row) for row in rows]
+        valid_rows = [row for row in parsed_rows if row]
+        priced = iter(calculate_domestic_price_batch([
+            (state, city, MODE_MAP[frontend_mode], weight)
+            for state, city, frontend_mode, weight in valid_rows
+        ]))
+
+        results = []
+        error_count = 0
+        for parsed in parsed_rows:
+            if not parsed:
+                error_count += 1
+                results.append({"error": "A destination (city or state), mode, and positive weight are required"})
+                continue
+
+            state, city, frontend_mode, weight = parsed
+            result = next(priced)
+            if "error" in result:
+                error_count += 1
+                results.append(result)
+                continue
+
+            results.append({
+                "destination_state": state.title() if state else "N/A",
+                "mode": frontend_mode.title(),
+                "weight_kg": weight,
+                "rounded_weight": result["rounded_weight"],
+                "total_price": round(result["price"] * 1.18, 2),
+                "zone": result["zone"]
+            })
+
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "error_count": error_count
         }), 200
 
     except Exception as e:
@@ -1,17 +1,34 @@
-
 import math
 from flask import Blueprint, request, jsonify
-from app.services.pricing_service import calculate_international_price
+from app.services.pricing_service import calculate_international_price, calculate_international_price_batch
+from app.services.quote_token import issue_quote_token
+from app.utils import load_batch_rows
 
 international_bp = Blueprint("international", __name__, url_prefix="/api/international")
 
+MAX_BATCH_ROWS = 50000
+
+def _format_quote(price_result, weight_kg):
+    # Apply only the 18% tax, no other discounts
+    final_price = round(price_result["base_price"] * 1.18, 2)
+
+    return {
+        "country": price_result["country_name"],
+        "zone": price_result["zone"],
+        "mode": "Express",
+        "weight_kg": weight_kg,
+        "rounded_weight": price_result["rounded_weight"],
+        "price_per_kg": f"₹{price_result['per_kg_rate']}",
+        "total_price": final_price
+    }
+
 @international_bp.route("/price", methods=["POST"])
 def intl_price():
     try:
         data = request.get_json()
         country = data.get("country", "").strip().lower()
         weight_kg = float(data.get("weight", 0.5))
-        
+
         if not country or weight_kg <= 0:
             return jsonify({"error": "Country and positive weight are required"}), 400
 
@@ -21,17 +38,66 @@ def intl_price():
         if "error" in price_result:
             return jsonify(price_result), 404
 
-        # Apply only the 18% tax, no other discounts
-        final_price = round(price_result["base_price"] * 1.18, 2)
+        quote = _format_quote(price_result, weight_kg)
+        quote["quote_token"] = issue_quote_token("international", country, None, weight_kg, quote["total_price"])
+        return jsonify(quote), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _parse_batch_row(row):
+    """
+    Accepts either {"country", "weight"} or a [country, weight] pair.
+    Returns (country, weight) or None if the row is invalid.
+    """
+    if isinstance(row, dict):
+        country = row.get("country") or row.get("destination") or ""
+        weight = row.get("weight", 0.5)
+    elif isinstance(row, (list, tuple)) and len(row) == 2:
+        country, weight = row
+    else:
+        return None
+
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        return None
+
+    if not isinstance(country, str) or not country.strip() or weight <= 0 or not math.isfinite(weight):
+        return None
+    return country.strip().lower(), weight
+
+@international_bp.route("/price/batch", methods=["POST"])
+def intl_price_batch():
+    try:
+        rows = load_batch_rows(request, MAX_BATCH_ROWS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        parsed_rows = [_parse_batch_row(row) for row in rows]
+        priced = iter(calculate_international_price_batch([row for row in parsed_rows if row]))
+
+        results = []
+        error_count = 0
+        for parsed in parsed_rows:
+            if not parsed:
+                error_count += 1
+                results.append({"error": "Country and positive weight are required"})
+                continue
+
+            price_result = next(priced)
+            if "error" in price_result:
+                error_count += 1
+                results.append(price_result)
+                continue
+
+            results.append(_format_quote(price_result, parsed[1]))
 
         return jsonify({
-            "country": price_result["country_name"],
-            "zone": price_result["zone"],
-            "mode": "Express",
-            "weight_kg": weight_kg,
-            "rounded_weight": price_result["rounded_weight"],
-            "price_per_kg": f"₹{price_result['per_kg_rate']}",
-            "total_price": final_price
+            "results": results,
+            "count": len(results),
+            "error_count": error_count
         }), 200
 
     except Exception as e:
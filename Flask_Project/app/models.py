@@ -1,5 +1,6 @@
 
 from .extensions import db
+from sqlalchemy import DDL, event, func, literal_column
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
@@ -19,14 +20,30 @@ class User(db.Model):
     balance = db.Column(db.Numeric(10, 2), nullable=False, default=0.00)
 
     shipments = db.relationship('Shipment', backref='user', lazy=True)
-    saved_addresses = db.relationship('SavedAddress', backref='user', lazy=True, cascade="all, delete-orphan")
+    # The foreign keys cascade, so deleting a user leaves these rows to the database
+    saved_addresses = db.relationship(
+        'SavedAddress', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True
+    )
 
+    # Loaded only by queries that ask for them with with_expression() (the admin
+    # user and employee lists); None otherwise
+    shipment_count = db.query_expression()
+    total_spent = db.query_expression()
+    available_balance = db.query_expression()
+
+    # Keyset pagination of the admin user and employee lists (see app/services/pagination.py)
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+
+# Shipment IDs are allocated in blocks claimed from this sequence (see app/services/shipment_ids.py)
+SHIPMENT_ID_BLOCK_SEQ = db.Sequence("shipment_id_block_seq", metadata=db.metadata)
 
 class Shipment(db.Model):
     __tablename__ = "shipments"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     user_email = db.Column(db.String(255), nullable=False, index=True)
     shipment_id_str = db.Column(db.String(20), unique=True, nullable=False, index=True)
 
@@ -51,7 +68,9 @@ class Shipment(db.Model):
     package_width_cm = db.Column(db.Numeric(10, 2), nullable=False)
     package_height_cm = db.Column(db.Numeric(10, 2), nullable=False)
     
-    goods_details = db.Column(JSONB, default=list)
+    # The JSONB columns are deferred: list queries never detoast them, and the
+    # views that need them load them explicitly with db.undefer()
+    goods_details = db.deferred(db.Column(JSONB, default=list))
 
     pickup_date = db.Column(db.Date, nullable=False)
     service_type = db.Column(db.String(50), nullable=False)
@@ -62,19 +81,67 @@ class Shipment(db.Model):
     tax_amount_18_percent = db.Column(db.Numeric(10, 2), nullable=False)
     total_with_tax_18_percent = db.Column(db.Numeric(10, 2), nullable=False)
 
-    tracking_history = db.Column(JSONB, default=list)
+    # Legacy: history now lives in tracking_events (see backfill_tracking_events.py).
+    # Until a shipment's JSONB entries are copied over it is not migrated, and
+    # its history is the JSONB entries followed by its events. Shipments created
+    # since have nothing to copy; existing rows get false when the column is added.
+    tracking_history = db.deferred(db.Column(JSONB, default=list))
+    tracking_history_migrated = db.Column(db.Boolean, nullable=False, default=True, server_default=db.false())
+
+    tracking_events = db.relationship(
+        'TrackingEvent', backref='shipment', lazy=True,
+        order_by='[TrackingEvent.created_at, TrackingEvent.id]', passive_deletes=True
+    )
+
+    # Keyset pagination of the admin shipment list and of an employee's
+    # day-end table (see app/services/pagination.py)
+    __table_args__ = (
+        db.Index('ix_shipments_booking_date_id', 'booking_date', 'id'),
+        db.Index('ix_shipments_user_booking_date_id', 'user_id', 'booking_date', 'id'),
+    )
+
+class TrackingEvent(db.Model):
+    __tablename__ = "tracking_events"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    shipment_id = db.Column(db.Integer, db.ForeignKey('shipments.id', ondelete='CASCADE'), nullable=False)
+    stage = db.Column(db.String(50), nullable=False)
+    location = db.Column(db.String(255), nullable=False, default="")
+    activity = db.Column(db.Text, nullable=False, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_tracking_events_shipment_created', 'shipment_id', 'created_at'),
+    )
 
 class PaymentRequest(db.Model):
     __tablename__ = "payment_requests"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     shipment_id = db.Column(db.Integer, db.ForeignKey('shipments.id'), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     utr = db.Column(db.String(64), nullable=False)
     status = db.Column(db.String(20), default='Pending')  # Pending, Approved, Rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class BalanceLedgerEntry(db.Model):
+    __tablename__ = 'balance_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)  # Signed: top-ups positive, debits negative
+    entry_type = db.Column(db.String(20), nullable=False)  # 'top_up' or 'debit'
+    reference = db.Column(db.String(64), nullable=True)  # Balance code or shipment ID(s)
+    # Whether the amount is already included in User.balance. Debits are applied
+    # as they are written; top-ups wait for compaction.
+    applied = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_balance_ledger_pending', 'user_id', postgresql_where=db.text('NOT applied')),
+    )
+
 class BalanceCode(db.Model):
     __tablename__ = 'balance_codes'
 
@@ -86,7 +153,7 @@ class BalanceCode(db.Model):
     redeemed_at = db.Column(db.DateTime, nullable=True)
     redeemed_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
 
-    redeemed_by = db.relationship('User', backref='redeemed_codes', lazy=True)
+    redeemed_by = db.relationship('User', backref=db.backref('redeemed_codes', passive_deletes=True), lazy=True)
 
 class SavedAddress(db.Model):
     __tablename__ = 'saved_addresses'
@@ -105,3 +172,181 @@ class SavedAddress(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'nickname', 'address_type', name='_user_nickname_type_uc'),)
 
     
+
+# --- Analytics rollups (see app/services/analytics_rollups.py) ---
+# Daily shipment and signup totals for the admin dashboard. Triggers on
+# shipments and users append a signed delta row for every change, so no
+# writer contends on a shared total; compaction later folds the deltas
+# into the rollups, and reads add any deltas not folded yet.
+ROLLUP_TIMEZONE = "Asia/Kolkata"
+
+class ShipmentDailyRollup(db.Model):
+    __tablename__ = 'shipment_daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)  # booking day in ROLLUP_TIMEZONE
+    service_type = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    user_type = db.Column(db.String(20), primary_key=True)  # 'Employee' or 'Customer'
+    shipment_count = db.Column(db.BigInteger, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+
+class ShipmentRollupDelta(db.Model):
+    __tablename__ = 'shipment_rollup_deltas'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    service_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    user_type = db.Column(db.String(20), nullable=False)
+    shipment_count = db.Column(db.Integer, nullable=False)  # +1 or -1
+    revenue = db.Column(db.Numeric(16, 2), nullable=False)
+
+class UserDailyRollup(db.Model):
+    __tablename__ = 'user_daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)  # signup day in ROLLUP_TIMEZONE
+    user_type = db.Column(db.String(20), primary_key=True)  # 'Admin', 'Employee' or 'Customer'
+    user_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class UserRollupDelta(db.Model):
+    __tablename__ = 'user_rollup_deltas'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_type = db.Column(db.String(20), nullable=False)
+    user_count = db.Column(db.Integer, nullable=False)  # +1 or -1
+
+SHIPMENT_ROLLUP_TRIGGERS = DDL(f"""
+CREATE OR REPLACE FUNCTION shipment_rollup_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO shipment_rollup_deltas (day, service_type, status, user_type, shipment_count, revenue)
+        SELECT (OLD.booking_date AT TIME ZONE 'UTC' AT TIME ZONE '{ROLLUP_TIMEZONE}')::date, OLD.service_type, OLD.status,
+               CASE WHEN u.is_employee THEN 'Employee' ELSE 'Customer' END, -1, -OLD.total_with_tax_18_percent
+        FROM (SELECT 1) AS one LEFT JOIN users u ON u.id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO shipment_rollup_deltas (day, service_type, status, user_type, shipment_count, revenue)
+        SELECT (NEW.booking_date AT TIME ZONE 'UTC' AT TIME ZONE '{ROLLUP_TIMEZONE}')::date, NEW.service_type, NEW.status,
+               CASE WHEN u.is_employee THEN 'Employee' ELSE 'Customer' END, 1, NEW.total_with_tax_18_percent
+        FROM (SELECT 1) AS one LEFT JOIN users u ON u.id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS shipments_rollup_insert_delete ON shipments;
+CREATE TRIGGER shipments_rollup_insert_delete AFTER INSERT OR DELETE ON shipments
+    FOR EACH ROW EXECUTE FUNCTION shipment_rollup_delta();
+
+DROP TRIGGER IF EXISTS shipments_rollup_update ON shipments;
+CREATE TRIGGER shipments_rollup_update
+    AFTER UPDATE OF booking_date, service_type, status, total_with_tax_18_percent, user_id ON shipments
+    FOR EACH ROW
+    WHEN ((OLD.booking_date, OLD.service_type, OLD.status, OLD.total_with_tax_18_percent, OLD.user_id)
+          IS DISTINCT FROM (NEW.booking_date, NEW.service_type, NEW.status, NEW.total_with_tax_18_percent, NEW.user_id))
+    EXECUTE FUNCTION shipment_rollup_delta();
+
+-- A user's shipments are counted under the user's current type, so when it
+-- changes their totals move across. A deleted user's shipments are moved to
+-- 'Customer' before the cascade deletes them, where their own deltas land.
+CREATE OR REPLACE FUNCTION user_shipments_rollup_move() RETURNS trigger AS $$
+DECLARE
+    old_type text := CASE WHEN OLD.is_employee THEN 'Employee' ELSE 'Customer' END;
+    new_type text := 'Customer';
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.is_employee THEN
+        new_type := 'Employee';
+    END IF;
+    IF old_type <> new_type THEN
+        INSERT INTO shipment_rollup_deltas (day, service_type, status, user_type, shipment_count, revenue)
+        SELECT (s.booking_date AT TIME ZONE 'UTC' AT TIME ZONE '{ROLLUP_TIMEZONE}')::date, s.service_type, s.status,
+               moved.user_type, moved.sign * count(*), moved.sign * sum(s.total_with_tax_18_percent)
+        FROM shipments s CROSS JOIN (VALUES (old_type, -1), (new_type, 1)) AS moved(user_type, sign)
+        WHERE s.user_id = OLD.id
+        GROUP BY 1, 2, 3, moved.user_type, moved.sign;
+    END IF;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_shipment_rollup_update ON users;
+CREATE TRIGGER users_shipment_rollup_update AFTER UPDATE OF is_employee ON users
+    FOR EACH ROW
+    WHEN (OLD.is_employee IS DISTINCT FROM NEW.is_employee)
+    EXECUTE FUNCTION user_shipments_rollup_move();
+
+DROP TRIGGER IF EXISTS users_shipment_rollup_delete ON users;
+CREATE TRIGGER users_shipment_rollup_delete BEFORE DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION user_shipments_rollup_move();
+""")
+
+USER_ROLLUP_TRIGGERS = DDL(f"""
+CREATE OR REPLACE FUNCTION user_rollup_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO user_rollup_deltas (day, user_type, user_count) VALUES (
+            (COALESCE(OLD.created_at, now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AT TIME ZONE '{ROLLUP_TIMEZONE}')::date,
+            CASE WHEN OLD.is_admin THEN 'Admin' WHEN OLD.is_employee THEN 'Employee' ELSE 'Customer' END,
+            -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_rollup_deltas (day, user_type, user_count) VALUES (
+            (COALESCE(NEW.created_at, now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AT TIME ZONE '{ROLLUP_TIMEZONE}')::date,
+            CASE WHEN NEW.is_admin THEN 'Admin' WHEN NEW.is_employee THEN 'Employee' ELSE 'Customer' END,
+            1
+        );
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_rollup_insert_delete ON users;
+CREATE TRIGGER users_rollup_insert_delete AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION user_rollup_delta();
+
+DROP TRIGGER IF EXISTS users_rollup_update ON users;
+CREATE TRIGGER users_rollup_update AFTER UPDATE OF created_at, is_admin, is_employee ON users
+    FOR EACH ROW
+    WHEN ((OLD.created_at, OLD.is_admin, OLD.is_employee) IS DISTINCT FROM (NEW.created_at, NEW.is_admin, NEW.is_employee))
+    EXECUTE FUNCTION user_rollup_delta();
+""")
+
+# create_all() installs the triggers with the tables they are on;
+# rebuild_rollups.py (re)installs them on an existing database
+event.listen(Shipment.__table__, "after_create", SHIPMENT_ROLLUP_TRIGGERS)
+event.listen(User.__table__, "after_create", USER_ROLLUP_TRIGGERS)
+
+# --- Admin search (see app/services/search.py) ---
+# Each searchable table has one pg_trgm GIN index over its searchable columns
+# joined by spaces, so a substring match is a single index scan. The queries
+# must use these same expressions for the planner to pick the indexes.
+_SPACE = literal_column("' '")
+
+SHIPMENT_SEARCH_TEXT = (
+    Shipment.shipment_id_str + _SPACE + Shipment.sender_name + _SPACE
+    + Shipment.receiver_name + _SPACE + Shipment.user_email
+)
+USER_SEARCH_TEXT = User.first_name + _SPACE + User.last_name + _SPACE + User.email
+
+db.Index(
+    'ix_shipments_search_trgm', SHIPMENT_SEARCH_TEXT.label('search_text'),
+    postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+)
+db.Index(
+    'ix_users_search_trgm', USER_SEARCH_TEXT.label('search_text'),
+    postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+)
+
+# Case-insensitive email lookups: exact matches, and the prefix matches that
+# serve search terms too short for the trigram indexes (text_pattern_ops
+# lets LIKE 'abc%' use the index whatever the database collation)
+USER_EMAIL_LOWER = func.lower(User.email)
+db.Index(
+    'ix_users_email_lower', USER_EMAIL_LOWER.label('email_lower'),
+    postgresql_ops={'email_lower': 'text_pattern_ops'},
+)
+
+PG_TRGM = DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+event.listen(db.metadata, "before_create", PG_TRGM)
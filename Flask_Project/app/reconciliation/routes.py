@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from .service import get_shipment_suggestion
+from .service import find_matching_shipments, DEFAULT_TOLERANCE, DEFAULT_MATCH_LIMIT
 
 reconciliation_bp = Blueprint("reconciliation", __name__, url_prefix="/api/reconciliation")
 
@@ -7,16 +7,22 @@ reconciliation_bp = Blueprint("reconciliation", __name__, url_prefix="/api/recon
 def find_destinations():
     data = request.get_json()
     amount = data.get("amount")
+    tolerance = data.get("tolerance", DEFAULT_TOLERANCE)
+    limit = data.get("limit", DEFAULT_MATCH_LIMIT)
 
     if not isinstance(amount, (int, float)) or amount <= 0:
         return jsonify({"error": "A valid, positive amount is required."}), 400
+    if not isinstance(tolerance, (int, float)) or tolerance < 0:
+        return jsonify({"error": "tolerance must be a non-negative number."}), 400
+    if not isinstance(limit, int) or limit <= 0:
+        return jsonify({"error": "limit must be a positive integer."}), 400
 
     try:
-        suggestion = get_shipment_suggestion(float(amount))
-        if not suggestion:
+        matches = find_matching_shipments(float(amount), float(tolerance), limit)
+        if not matches:
             return jsonify({"message": "No potential shipment match found for this amount."}), 404
-        
-        return jsonify(suggestion), 200
+
+        return jsonify({"matches": matches}), 200
     except Exception as e:
         # In a real app, you'd log the error.
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
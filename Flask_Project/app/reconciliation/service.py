@@ -1,90 +1,133 @@
-import random
+import threading
 
-# This new system uses a predefined lookup table for suggestions.
-# It provides more realistic and varied results than reverse-calculating from price lists.
+import numpy as np
 
-SUGGESTION_LOOKUP = [
-    {
-        "range": (0, 750),
-        "suggestions": [
-            {"destinations": ["Mumbai"], "weight_suggestion": "1kg", "mode": "Express"},
-            {"destinations": ["Delhi"], "weight_suggestion": "1.5kg", "mode": "Air"},
-            {"destinations": ["Pune"], "weight_suggestion": "1kg", "mode": "Express"},
-            {"destinations": ["Bangalore"], "weight_suggestion": "2kg", "mode": "Air"},
-            {"destinations": ["Chennai"], "weight_suggestion": "1.5kg", "mode": "Surface"},
-            {"destinations": ["Ahmedabad"], "weight_suggestion": "2kg", "mode": "Surface"},
-            {"destinations": ["Jaipur"], "weight_suggestion": "1.5kg", "mode": "Surface"},
-            {"destinations": ["Lucknow"], "weight_suggestion": "2kg", "mode": "Surface"},
-            {"destinations": ["Surat"], "weight_suggestion": "1kg", "mode": "Express"},
-            {"destinations": ["Nagpur"], "weight_suggestion": "1.5kg", "mode": "Surface"},
-            {"destinations": ["Haryana"], "weight_suggestion": "0.5kg", "mode": "Express"},
-            {"destinations": ["Punjab"], "weight_suggestion": "1kg", "mode": "Express"},
-        ]
-    },
-    {
-        "range": (751, 1500),
-        "suggestions": [
-            {"destinations": ["Mumbai"], "weight_suggestion": "5kg", "mode": "Air"},
-            {"destinations": ["Punjab"], "weight_suggestion": "6kg", "mode": "Surface"},
-            {"destinations": ["Odisha"], "weight_suggestion": "2kg", "mode": "Air"},
-            {"destinations": ["Delhi"], "weight_suggestion": "4kg", "mode": "Air"},
-            {"destinations": ["Bangalore"], "weight_suggestion": "5.5kg", "mode": "Air"},
-            {"destinations": ["Kerala"], "weight_suggestion": "3kg", "mode": "Air"},
-            {"destinations.py": ["Rajasthan"], "weight_suggestion": "4.5kg", "mode": "Surface"},
-            {"destinations": ["Gujarat"], "weight_suggestion": "5kg", "mode": "Surface"},
-            {"destinations": ["Kolkata"], "weight_suggestion": "3.5kg", "mode": "Air"},
-            {"destinations": ["Hyderabad"], "weight_suggestion": "4kg", "mode": "Air"},
-        ]
-    },
-    {
-        "range": (1501, 3000),
-        "suggestions": [
-            {"destinations": ["Jammu & Kashmir"], "weight_suggestion": "8kg", "mode": "Surface"},
-            {"destinations": ["Assam"], "weight_suggestion": "10kg", "mode": "Surface"},
-            {"destinations": ["Mumbai"], "weight_suggestion": "12kg", "mode": "Surface"},
-            {"destinations": ["Punjab"], "weight_suggestion": "15kg", "mode": "Surface"},
-            {"destinations": ["Kerala"], "weight_suggestion": "9kg", "mode": "Air"},
-            {"destinations": ["Goa"], "weight_suggestion": "8kg", "mode": "Air"},
-            {"destinations": ["Port Blair"], "weight_suggestion": "7kg", "mode": "Air"},
-            {"destinations": ["Delhi"], "weight_suggestion": "13kg", "mode": "Surface"},
-            {"destinations": ["Bangalore"], "weight_suggestion": "11kg", "mode": "Air"},
-            {"destinations": ["Kolkata"], "weight_suggestion": "10kg", "mode": "Air"},
-        ]
-    },
-    {
-        "range": (3001, float('inf')),
-        "suggestions": [
-            {"destinations": ["UK"], "weight_suggestion": "2kg", "mode": "International"},
-            {"destinations": ["USA"], "weight_suggestion": "1kg", "mode": "International"},
-            {"destinations": ["Canada"], "weight_suggestion": "1kg", "mode": "International"},
-            {"destinations": ["Australia"], "weight_suggestion": "1.5kg", "mode": "International"},
-            {"destinations": ["Germany"], "weight_suggestion": "2.5kg", "mode": "International"},
-            {"destinations": ["Singapore"], "weight_suggestion": "3kg", "mode": "International"},
-            {"destinations": ["UAE"], "weight_suggestion": "4kg", "mode": "International"},
-            {"destinations": ["South Africa"], "weight_suggestion": "1.5kg", "mode": "International"},
-            {"destinations": ["New Zealand"], "weight_suggestion": "1kg", "mode": "International"},
+from app.services.domestic_pricing_service import (
+    DOMESTIC_MODES,
+    DOMESTIC_RATE_VERSION,
+    DOMESTIC_ZONES,
+    FLAT_RATE_MODES,
+    MODE_MIN_WEIGHT,
+    EXPRESS_BANDS,
+    calculate_domestic_zone_price_batch,
+    find_domestic_zone,
+)
+from app.services.pricing_service import (
+    calculate_international_price_batch,
+    get_rate_card,
+    international_rate_card_version,
+)
+
+GST_RATE = 1.18
+
+# Suggestions are drawn from this weight grid: whole kilos for slab-priced
+# services, 0.1 kg steps for per-kg services (weights are entered to 0.1 kg)
+PER_KG_WEIGHT_STEP = 0.1
+MAX_DOMESTIC_WEIGHT = 100
+MAX_INTERNATIONAL_WEIGHT = 30
+
+# Default +/- tolerance (in rupees) between the amount and a suggested total
+DEFAULT_TOLERANCE = 1.0
+DEFAULT_MATCH_LIMIT = 10
+
+FRONTEND_MODE_NAMES = {"express": "Express", "air": "Air Cargo", "surface": "Surface Cargo"}
+
+# The sorted price index, rebuilt whenever either rate card changes
+_index = {"versions": None, "totals": None, "entries": None}
+_index_lock = threading.Lock()
+
+def _domestic_weights(mode):
+    if mode in FLAT_RATE_MODES:
+        # Express is flat-priced beyond its last slab, so heavier weights add nothing
+        return [float(w) for w in range(1, len(EXPRESS_BANDS) + 1)]
+    # Anything under the minimum chargeable weight is priced at the minimum
+    steps = int(round((MAX_DOMESTIC_WEIGHT - MODE_MIN_WEIGHT[mode]) / PER_KG_WEIGHT_STEP))
+    return [round(MODE_MIN_WEIGHT[mode] + i * PER_KG_WEIGHT_STEP, 1) for i in range(steps + 1)]
+
+def _build_price_index():
+    """
+    Prices every (destination, mode, weight) combination on the suggestion
+    grid with the batch pricers and returns (totals, entries), both sorted by
+    GST-inclusive total. Domestic destinations are grouped by zone, since
+    every destination in a zone is priced the same, and each zone is priced
+    by its own rate row.
+    """
+    entries = []
+
+    if DOMESTIC_ZONES:
+        rows, meta = [], []
+        for column, locations in DOMESTIC_ZONES.items():
+            # A destination listed under several zones is priced at the first
+            # one, so it only appears in that zone's suggestions
+            destinations = [location for location in locations if find_domestic_zone("", location) == column]
+            if not destinations:
+                continue
+            for mode in DOMESTIC_MODES:
+                for weight in _domestic_weights(mode):
+                    rows.append((column, mode, weight))
+                    meta.append((destinations, mode, weight))
+        for (destinations, mode, weight), result in zip(meta, calculate_domestic_zone_price_batch(rows)):
+            if "error" in result:
+                continue
+            entries.append({
+                "type": "Domestic",
+                "destinations": destinations,
+                "mode": FRONTEND_MODE_NAMES[mode],
+                "weight_kg": weight,
+                "calculated_base_price": round(result["price"], 2),
+                "total_price_with_tax": round(result["price"] * GST_RATE, 2),
+            })
+
+    rate_card = get_rate_card()
+    if rate_card:
+        rows = [
+            (country_data["country"], float(weight))
+            for country_data in rate_card["countries"].values()
+            for weight in range(1, MAX_INTERNATIONAL_WEIGHT + 1)
         ]
-    }
-]
+        for (country, weight), result in zip(rows, calculate_international_price_batch(rows)):
+            if "error" in result:
+                continue
+            entries.append({
+                "type": "International",
+                "destinations": [country],
+                "mode": "Express",
+                "weight_kg": weight,
+                "calculated_base_price": round(result["base_price"], 2),
+                "total_price_with_tax": round(result["base_price"] * GST_RATE, 2),
+            })
+
+    entries.sort(key=lambda e: e["total_price_with_tax"])
+    totals = np.array([e["total_price_with_tax"] for e in entries], dtype=float)
+    return totals, entries
 
-def get_shipment_suggestion(amount: float):
+def _get_price_index():
+    versions = (DOMESTIC_RATE_VERSION, international_rate_card_version())
+    with _index_lock:
+        if _index["versions"] != versions:
+            _index["totals"], _index["entries"] = _build_price_index()
+            _index["versions"] = versions
+        return _index["totals"], _index["entries"]
+
+def find_matching_shipments(amount: float, tolerance: float = DEFAULT_TOLERANCE, limit: int = DEFAULT_MATCH_LIMIT):
     """
-    Selects a random shipment suggestion from a predefined lookup table based on the amount.
+    Returns the shipment configurations whose GST-inclusive total is within
+    `tolerance` of `amount`, closest first (then lightest), using a binary
+    search over the sorted price index.
     """
-    for item in SUGGESTION_LOOKUP:
-        min_val, max_val = item["range"]
-        if min_val <= amount <= max_val:
-            selected_suggestion = random.choice(item["suggestions"])
-            
-            # Determine type based on amount or explicitly
-            shipment_type = "International" if amount > 3000 else "Domestic"
-            
-            return {
-                "type": shipment_type,
-                "destinations": selected_suggestion["destinations"],
-                "mode": selected_suggestion["mode"],
-                "weight_suggestion": selected_suggestion["weight_suggestion"],
-                "total_price_with_tax": amount, # Return the original amount for display
-            }
-            
-    return None
+    totals, entries = _get_price_index()
+    lo = int(np.searchsorted(totals, amount - tolerance, side="left"))
+    hi = int(np.searchsorted(totals, amount + tolerance, side="right"))
+
+    candidates = sorted(
+        entries[lo:hi],
+        key=lambda e: (abs(e["total_price_with_tax"] - amount), e["weight_kg"]),
+    )
+    matches = []
+    for entry in candidates[:limit]:
+        matches.append({
+            **entry,
+            "weight_suggestion": f"{entry['weight_kg']:g} kg",
+            "difference": round(entry["total_price_with_tax"] - amount, 2),
+        })
+    return matches
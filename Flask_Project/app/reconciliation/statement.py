@@ -0,0 +1,421 @@
+import csv
+import io
+import json
+import random
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import insert, update
+
+from app.extensions import db
+from app.models import PaymentRequest, Shipment
+from app.services.query_stats import count_query_chunks
+from app.services.shipment_ids import allocate_shipment_id_strs
+from app.services.tracking import add_tracking_event, add_tracking_events
+from app.services.status_events import payment_event, publish_status_change
+from app.utils import NDJSON_MIMETYPES
+
+# Reconciled invoices are booked against this account
+INVOICE_OWNER_EMAIL = "dhillon@logistix.com"
+
+CSV_MIMETYPES = ("text/csv", "application/csv", "application/vnd.ms-excel")
+
+# Statement lines are joined, approved and inserted this many at a time
+STATEMENT_CHUNK_SIZE = 1000
+
+GOODS_DESCRIPTIONS = [
+    "Paper Goods", "Printed Material", "Sample Documents",
+    "Commercial Sample", "Marketing Material"
+]
+
+ADDRESS_FIELDS = ("name", "address_line1", "address_line2", "city", "state", "pincode", "country", "phone")
+
+DEBIT_MARKERS = ("dr", "debit", "d")
+
+# Order fields an invoice cannot be inserted without, by the shipments column they fill
+INVOICE_PARTY_COLUMNS = {
+    "name": "name",
+    "city": "address_city",
+    "state": "address_state",
+    "pincode": "address_pincode",
+    "country": "address_country",
+    "phone": "phone",
+}
+
+def mark_shipment_paid(shipment, now=None):
+    """
+    Moves a shipment from "Pending Payment" to "Booked", records the
+    confirmed payment in its tracking history and publishes the approval.
+    """
+    shipment.status = "Booked"
+    publish_status_change(payment_event(shipment.shipment_id_str, shipment.user_id, "Approved"))
+    add_tracking_event(shipment, "Booked", shipment.sender_address_city, "Shipment booked and payment confirmed.", now)
+
+def invoice_tracking_event(transaction, sender_data):
+    # (stage, location, activity) of the first tracking event of a reconciled invoice
+    return (
+        "Booked",
+        sender_data.get("city", "N/A"),
+        f"Shipment booked and paid via {transaction.get('type', 'N/A')}. UTR: {transaction.get('utr', 'N/A')}"
+    )
+
+def build_invoice_shipment(owner, transaction, sender_data, receiver_data, shipment_id_str):
+    """
+    Returns the column values of a paid "Reconciled" shipment for a bank
+    transaction that has no booking behind it.
+    """
+    total_price = Decimal(transaction.get("amount"))
+    weight_kg = Decimal(transaction.get("weight") or 0)
+    price_without_tax = total_price / Decimal("1.18")
+    tax_amount = total_price - price_without_tax
+
+    sender_street = f"{sender_data.get('address_line1', '')} {sender_data.get('address_line2', '')}".strip()
+    receiver_street = f"{receiver_data.get('address_line1', '')} {receiver_data.get('address_line2', '')}".strip()
+
+    goods_description_with_weight = f"{random.choice(GOODS_DESCRIPTIONS)} ({weight_kg} kg)"
+
+    return {
+        "user_id": owner.id,
+        "user_email": owner.email,
+        "shipment_id_str": shipment_id_str,
+
+        "sender_name": sender_data.get("name"),
+        "sender_address_street": sender_street,
+        "sender_address_city": sender_data.get("city"),
+        "sender_address_state": sender_data.get("state"),
+        "sender_address_pincode": sender_data.get("pincode"),
+        "sender_address_country": sender_data.get("country"),
+        "sender_phone": sender_data.get("phone"),
+
+        "receiver_name": receiver_data.get("name"),
+        "receiver_address_street": receiver_street,
+        "receiver_address_city": receiver_data.get("city"),
+        "receiver_address_state": receiver_data.get("state"),
+        "receiver_address_pincode": receiver_data.get("pincode"),
+        "receiver_address_country": receiver_data.get("country"),
+        "receiver_phone": receiver_data.get("phone"),
+
+        "package_weight_kg": weight_kg,
+        "package_length_cm": 0,
+        "package_width_cm": 0,
+        "package_height_cm": 0,
+
+        "goods_details": [{
+            "description": goods_description_with_weight,
+            "quantity": 1,
+            "value": float(price_without_tax), # Value is price before tax
+            "hsn_code": "996812" # HSN for courier services
+        }],
+
+        "pickup_date": datetime.strptime(transaction.get("date"), "%Y-%m-%d").date() if transaction.get("date") else datetime.utcnow().date(),
+        "service_type": "Reconciled",
+        "status": "Booked",
+
+        "price_without_tax": price_without_tax,
+        "tax_amount_18_percent": tax_amount,
+        "total_with_tax_18_percent": total_price,
+    }
+
+def statement_format(req):
+    """
+    Returns ("csv" | "ndjson", binary stream) for an uploaded statement, sent
+    either as the raw request body or as the "statement" file of a multipart
+    form. Raises ValueError if the format is not recognised.
+    """
+    upload = req.files.get("statement") if req.mimetype == "multipart/form-data" else None
+    if upload:
+        mimetype, stream = upload.mimetype, upload.stream
+        filename = (upload.filename or "").lower()
+        if filename.endswith(".csv"):
+            mimetype = "text/csv"
+        elif filename.endswith((".ndjson", ".jsonl")):
+            mimetype = "application/x-ndjson"
+    else:
+        mimetype, stream = req.mimetype, req.stream
+
+    if mimetype in CSV_MIMETYPES:
+        return "csv", stream
+    if mimetype in NDJSON_MIMETYPES:
+        return "ndjson", stream
+    raise ValueError("Upload the statement as CSV or NDJSON (text/csv or application/x-ndjson).")
+
+def _split_flat_row(row):
+    # CSV columns (and flat NDJSON objects) carry the order as sender_*/receiver_* fields
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    parties = {}
+    for party in ("sender", "receiver"):
+        fields = {f: row.get(f"{party}_{f}") for f in ADDRESS_FIELDS if row.get(f"{party}_{f}") not in (None, "")}
+        parties[party] = fields or None
+    return row, parties["sender"], parties["receiver"]
+
+def _parse_amount(value):
+    if value in (None, ""):
+        return None
+    amount = Decimal(str(value).replace(",", "").strip())
+    if not amount.is_finite():
+        raise InvalidOperation
+    return amount.quantize(Decimal("0.01"))
+
+def _validate_invoice_party(party, data):
+    # Checked per line, so one incomplete order fails its own line rather
+    # than the insert of its whole chunk
+    problems = []
+    for field, column in INVOICE_PARTY_COLUMNS.items():
+        value = data.get(field)
+        max_length = Shipment.__table__.c[f"{party}_{column}"].type.length
+        if value in (None, "") or not str(value).strip():
+            problems.append(f"{party} {field} is missing")
+        elif max_length and len(str(value)) > max_length:
+            problems.append(f"{party} {field} is longer than {max_length} characters")
+    street = f"{data.get('address_line1', '')} {data.get('address_line2', '')}".strip()
+    street_length = Shipment.__table__.c[f"{party}_address_street"].type.length
+    if len(street) > street_length:
+        problems.append(f"{party} address is longer than {street_length} characters")
+    return problems
+
+def _normalize_line(raw):
+    """
+    Turns one statement line into a transaction dict (with a Decimal
+    "amount", or None for debits) plus the sender/receiver dicts, both None
+    unless the line carries both. Raises ValueError for lines that cannot be
+    reconciled, including order details an invoice could not be built from.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Each line must be an object.")
+
+    if isinstance(raw.get("transaction"), dict):
+        transaction = dict(raw["transaction"])
+        order = raw.get("order") if isinstance(raw.get("order"), dict) else {}
+        sender, receiver = order.get("sender"), order.get("receiver")
+    else:
+        transaction, sender, receiver = _split_flat_row(raw)
+
+    utr = str(transaction.get("utr") or "").strip()
+    if not utr:
+        raise ValueError("Missing UTR.")
+
+    try:
+        # Statements either sign a single amount column or split credit/debit columns
+        amount = _parse_amount(transaction.get("amount"))
+        if amount is None:
+            amount = _parse_amount(transaction.get("credit"))
+        weight = _parse_amount(transaction.get("weight"))
+    except (InvalidOperation, ValueError):
+        raise ValueError("Invalid amount or weight.")
+
+    if transaction.get("date"):
+        try:
+            datetime.strptime(str(transaction["date"]), "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("Dates must be in YYYY-MM-DD format.")
+
+    if isinstance(sender, dict) and isinstance(receiver, dict):
+        problems = _validate_invoice_party("sender", sender) + _validate_invoice_party("receiver", receiver)
+        if problems:
+            raise ValueError(f"Invalid order details: {'; '.join(problems)}.")
+    else:
+        sender = receiver = None
+
+    is_debit = str(transaction.get("cr_dr") or "").strip().lower() in DEBIT_MARKERS
+    transaction.update({
+        "utr": utr,
+        "amount": None if is_debit or amount is None or amount <= 0 else amount,
+        "weight": weight or 0,
+    })
+    return transaction, sender, receiver
+
+def iter_statement_lines(fmt, stream):
+    """
+    Lazily yields (line number, raw row or None, error or None) from a CSV or
+    NDJSON statement stream, so the statement is never held in memory whole.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except json.JSONDecodeError:
+            yield line_number, None, "Invalid JSON."
+
+def _new_report():
+    return {
+        "summary": {"lines": 0, "credits": 0, "matched": 0, "invoiced": 0, "unmatched": 0, "skipped_debits": 0, "errors": 0},
+        "matched": [],
+        "invoiced": [],
+        "unmatched": [],
+        "errors": [],
+    }
+
+def _add(report, bucket, item):
+    report[bucket].append(item)
+    report["summary"][bucket] += 1
+
+def _reconcile_chunk(credits, owner, seen_utrs, report):
+    """
+    Joins one chunk of credit lines against pending payment requests by
+    (UTR, amount), approves the matches and bulk-inserts invoices for
+    credits that have no booking behind them.
+    """
+    utrs = {transaction["utr"] for _, transaction, _, _ in credits}
+
+    # Hash side of the join: every pending request for the chunk's UTRs
+    pending = defaultdict(list)
+    for payment in (PaymentRequest.query
+                    .filter(PaymentRequest.status == "Pending", PaymentRequest.utr.in_(utrs))
+                    .order_by(PaymentRequest.created_at)):
+        pending[(payment.utr, payment.amount)].append(payment)
+    pending_utrs = {utr for utr, _ in pending}
+
+    reconciled_utrs = {
+        row[0] for row in db.session.query(PaymentRequest.utr)
+        .filter(PaymentRequest.status == "Approved", PaymentRequest.utr.in_(utrs))
+    }
+
+    matches, invoices = [], []
+    for line_number, transaction, sender, receiver in credits:
+        utr, amount = transaction["utr"], transaction["amount"]
+        line = {"line": line_number, "utr": utr, "amount": float(amount)}
+
+        if utr in seen_utrs:
+            _add(report, "unmatched", {**line, "reason": "Duplicate UTR in this statement."})
+            continue
+        seen_utrs.add(utr)
+
+        candidates = pending.get((utr, amount))
+        if candidates:
+            matches.append((line, candidates.pop(0)))
+        elif utr in pending_utrs:
+            _add(report, "unmatched", {**line, "reason": "A pending payment has this UTR but a different amount."})
+        elif utr in reconciled_utrs:
+            _add(report, "unmatched", {**line, "reason": "UTR has already been reconciled."})
+        elif sender and receiver:
+            invoices.append((line, transaction, sender, receiver))
+        else:
+            _add(report, "unmatched", {**line, "reason": "No pending payment and no order details to invoice."})
+
+    now = datetime.utcnow()
+    matched_items, invoiced_items = [], []
+
+    if matches:
+        payment_ids = [payment.id for _, payment in matches]
+        db.session.execute(
+            update(PaymentRequest)
+            .where(PaymentRequest.id.in_(payment_ids))
+            .values(status="Approved"),
+            execution_options={"synchronize_session": False},
+        )
+        shipments = {
+            shipment.id: shipment
+            for shipment in Shipment.query.filter(Shipment.id.in_([p.shipment_id for _, p in matches]))
+        }
+        for line, payment in matches:
+            shipment = shipments.get(payment.shipment_id)
+            if shipment:
+                mark_shipment_paid(shipment, now)
+            matched_items.append({
+                **line,
+                "payment_id": payment.id,
+                "shipment_id_str": shipment.shipment_id_str if shipment else None,
+            })
+
+    if invoices:
+        shipment_ids = allocate_shipment_id_strs(db.session, len(invoices))
+        rows = [
+            build_invoice_shipment(owner, transaction, sender, receiver, shipment_id_str)
+            for (_, transaction, sender, receiver), shipment_id_str in zip(invoices, shipment_ids)
+        ]
+        inserted = db.session.execute(
+            insert(Shipment).returning(Shipment.id, Shipment.shipment_id_str, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        # Record each invoice's UTR as an approved payment so a re-upload skips it
+        db.session.execute(insert(PaymentRequest), [
+            {
+                "user_id": owner.id,
+                "shipment_id": shipment_id,
+                "amount": transaction["amount"],
+                "utr": transaction["utr"],
+                "status": "Approved",
+                "created_at": datetime.utcnow(),
+            }
+            for (_, transaction, _, _), (shipment_id, _) in zip(invoices, inserted)
+        ])
+        add_tracking_events([
+            dict(
+                zip(("stage", "location", "activity"), invoice_tracking_event(transaction, sender)),
+                shipment_id=shipment_id, shipment_id_str=shipment_id_str, user_id=owner.id, created_at=now,
+            )
+            for (_, transaction, sender, _), (shipment_id, shipment_id_str) in zip(invoices, inserted)
+        ])
+        for (line, _, _, _), (_, shipment_id_str) in zip(invoices, inserted):
+            invoiced_items.append({**line, "shipment_id_str": shipment_id_str})
+
+    db.session.commit()
+
+    for item in matched_items:
+        _add(report, "matched", item)
+    for item in invoiced_items:
+        _add(report, "invoiced", item)
+
+def reconcile_statement(lines, owner, chunk_size=None):
+    """
+    Reconciles a bank statement given as an iterable of
+    (line number, raw row, parse error) and returns a match report.
+    Each chunk is committed on its own; a chunk that fails to commit is
+    rolled back and its credits are reported as errors.
+    """
+    report = _new_report()
+    seen_utrs = set()
+    lines = iter(lines)
+    chunk_size = chunk_size or STATEMENT_CHUNK_SIZE
+
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+
+        credits = []
+        for line_number, raw, error in chunk:
+            report["summary"]["lines"] += 1
+            if error is None:
+                try:
+                    transaction, sender, receiver = _normalize_line(raw)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                _add(report, "errors", {"line": line_number, "error": error})
+                continue
+            if transaction["amount"] is None:
+                report["summary"]["skipped_debits"] += 1
+                continue
+            credits.append((line_number, transaction, sender, receiver))
+
+        if not credits:
+            continue
+        report["summary"]["credits"] += len(credits)
+        count_query_chunks()
+
+        seen_before = set(seen_utrs)
+        unmatched_before = len(report["unmatched"])
+        try:
+            _reconcile_chunk(credits, owner, seen_utrs, report)
+        except Exception as e:
+            db.session.rollback()
+            # Nothing from this chunk was saved, so report all of it as failed
+            seen_utrs.clear()
+            seen_utrs.update(seen_before)
+            report["summary"]["unmatched"] -= len(report["unmatched"]) - unmatched_before
+            del report["unmatched"][unmatched_before:]
+            for line_number, _, _, _ in credits:
+                _add(report, "errors", {"line": line_number, "error": f"Could not be reconciled: {str(e)}"})
+
+    return report
@@ -37,7 +37,7 @@ class ShipmentCreateSchema(Schema):
     receiver_address_country = fields.Str(required=True)
 
     # Package
-    package_weight_kg = fields.Float(required=True)
+    package_weight_kg = fields.Float(required=True, validate=validate.Range(min=0, min_inclusive=False, error="Weight must be a positive number."))
     package_length_cm = fields.Float(required=True)
     package_width_cm = fields.Float(required=True)
     package_height_cm = fields.Float(required=True)
@@ -56,6 +56,14 @@ class ShipmentCreateSchema(Schema):
     shipmentType = fields.Str(allow_none=True)
     user_email = fields.Email(required=True)
     final_total_price_with_tax = fields.Float(required=True)
+    quote_token = fields.Str(required=True)
+
+
+class BulkShipmentRowSchema(ShipmentCreateSchema):
+    # Bulk bookings are re-priced on the server, so a quote and total are optional;
+    # user_email is filled in from the batch
+    final_total_price_with_tax = fields.Float(load_default=None)
+    quote_token = fields.Str(load_default=None)
 
 
 class PaymentSubmitSchema(Schema):
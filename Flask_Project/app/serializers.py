@@ -0,0 +1,137 @@
+from decimal import Decimal
+from operator import attrgetter
+
+import orjson
+from flask.json.provider import JSONProvider
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson, so jsonify() and request.get_json()
+    skip the stdlib encoder. datetime, date, UUID and dataclasses are encoded
+    natively (datetimes as ISO 8601); Decimal and numpy scalars as numbers.
+    """
+
+    sort_keys = True
+    mimetype = "application/json"
+
+    def _option(self):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=_default, option=self._option())
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Same as JSONProvider.response, without the bytes -> str -> bytes round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "item"):  # numpy scalars that are not float/int subclasses
+        return value.item()
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _money(value):
+    return float(value) if value is not None else None
+
+class FieldSpec:
+    """
+    The fields of a model as they appear in API payloads, by attribute name.
+    `money` fields (Numeric columns) are sent as floats; dates and datetimes
+    are left to the JSON provider.
+
+    dump() works on anything with the attributes: model instances or the
+    named rows of a column query.
+    """
+
+    def __init__(self, *fields, money=()):
+        self.keys = fields
+        self._get = attrgetter(*fields)
+        self._money = tuple(i for i, key in enumerate(fields) if key in money)
+
+    def dump(self, obj, **extra):
+        values = self._get(obj)
+        if len(self.keys) == 1:
+            values = (values,)
+        if self._money:
+            values = list(values)
+            for i in self._money:
+                values[i] = _money(values[i])
+        data = dict(zip(self.keys, values))
+        if extra:
+            data.update(extra)
+        return data
+
+    def dump_many(self, objs):
+        return [self.dump(obj) for obj in objs]
+
+    def columns(self, model):
+        """The model's columns for these fields, to select only what is dumped."""
+        return [getattr(model, key) for key in self.keys]
+
+SHIPMENT_PRICE_FIELDS = ("price_without_tax", "tax_amount_18_percent", "total_with_tax_18_percent")
+
+# /api/shipments
+SHIPMENT_SUMMARY = FieldSpec(
+    "id", "shipment_id_str", "sender_name", "receiver_name", "service_type", "booking_date", "status",
+    "total_with_tax_18_percent",
+    money=SHIPMENT_PRICE_FIELDS,
+)
+
+# /api/admin/shipments (plus user_type)
+ADMIN_SHIPMENT = FieldSpec(
+    "id", "shipment_id_str", "sender_name", "receiver_name", "receiver_address_city", "service_type",
+    "package_weight_kg", "booking_date", "status", *SHIPMENT_PRICE_FIELDS,
+    money=("package_weight_kg",) + SHIPMENT_PRICE_FIELDS,
+)
+
+# /api/admin/users/<id>
+USER_SHIPMENT = FieldSpec(
+    "id", "shipment_id_str", "receiver_name", "booking_date", "status", "total_with_tax_18_percent",
+    money=SHIPMENT_PRICE_FIELDS,
+)
+
+# /api/employee/day-end-stats
+EMPLOYEE_SHIPMENT = FieldSpec(
+    "id", "shipment_id_str", "receiver_name", "booking_date", "status", "total_with_tax_18_percent",
+    money=SHIPMENT_PRICE_FIELDS,
+)
+
+# /api/shipments/<shipment_id_str> (plus tracking_history and payment_status)
+SHIPMENT_DETAIL = FieldSpec(
+    "id", "shipment_id_str",
+    "sender_name", "sender_address_street", "sender_address_city", "sender_address_state",
+    "sender_address_pincode", "sender_address_country", "sender_phone", "user_email",
+    "receiver_name", "receiver_address_street", "receiver_address_city", "receiver_address_state",
+    "receiver_address_pincode", "receiver_address_country", "receiver_phone",
+    "package_weight_kg", "package_length_cm", "package_width_cm", "package_height_cm",
+    "booking_date", "service_type", "status", *SHIPMENT_PRICE_FIELDS, "goods_details",
+    money=("package_weight_kg", "package_length_cm", "package_width_cm", "package_height_cm") + SHIPMENT_PRICE_FIELDS,
+)
+
+# Payment lists; the shipment_id_str (or order_id) is joined in by the caller
+PAYMENT = FieldSpec("id", "amount", "utr", "status", "created_at", money=("amount",))
+
+USER = FieldSpec("id", "first_name", "last_name", "email", "created_at")
+
+# Same fields as SavedAddressSchema dumps
+SAVED_ADDRESS = FieldSpec(
+    "id", "nickname", "name", "address_street", "address_city", "address_state", "address_pincode",
+    "address_country", "phone", "address_type",
+)
+
+BALANCE_CODE = FieldSpec("id", "code", "amount", "is_redeemed", "created_at", "redeemed_at", money=("amount",))
@@ -0,0 +1,186 @@
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import BigInteger, Date, case, cast, delete, func, literal, or_, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert
+
+from app.extensions import db
+from app.models import (
+    ROLLUP_TIMEZONE, SHIPMENT_ROLLUP_TRIGGERS, USER_ROLLUP_TRIGGERS,
+    Shipment, ShipmentDailyRollup, ShipmentRollupDelta, User, UserDailyRollup, UserRollupDelta,
+)
+
+# Dimensions the shipment rollups can be grouped by
+SHIPMENT_DIMENSIONS = ("day", "service_type", "status", "user_type")
+
+def parse_day_range(args, default=None):
+    """
+    The (start, end) days of a request's ?from= and ?to= (YYYY-MM-DD), each
+    `default` when absent. Raises ValueError for a malformed date or a range
+    that ends before it starts.
+    """
+    try:
+        start = datetime.strptime(args["from"], "%Y-%m-%d").date() if args.get("from") else default
+        end = datetime.strptime(args["to"], "%Y-%m-%d").date() if args.get("to") else default
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format")
+    if start is not None and end is not None and end < start:
+        raise ValueError("'to' must not be before 'from'")
+    return start, end
+
+def local_today():
+    return datetime.now(ZoneInfo(ROLLUP_TIMEZONE)).date()
+
+def utc_bounds(start, end):
+    """
+    The naive UTC datetimes [lower, upper) spanning the ROLLUP_TIMEZONE days
+    `start` to `end`, to compare with UTC timestamp columns.
+    """
+    zone = ZoneInfo(ROLLUP_TIMEZONE)
+
+    def _utc(day):
+        return datetime.combine(day, time.min, zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    return _utc(start), _utc(end + timedelta(days=1))
+
+def _local_day(utc_column):
+    return cast(func.timezone(ROLLUP_TIMEZONE, func.timezone("UTC", utc_column)), Date)
+
+def _shipment_user_type():
+    return case((User.is_employee, "Employee"), else_="Customer")
+
+def _user_type():
+    return case((User.is_admin, "Admin"), (User.is_employee, "Employee"), else_="Customer")
+
+def _fold(delta_model, rollup_model, dimensions, measures):
+    # DELETE ... RETURNING hands each delta to exactly one compaction; the
+    # per-key sums are then added to the rollups with an upsert
+    folded = (
+        delete(delta_model)
+        .returning(*[getattr(delta_model, c) for c in dimensions + measures])
+        .cte("folded")
+    )
+    totals = select(
+        *[folded.c[c] for c in dimensions],
+        *[func.sum(folded.c[c]).label(c) for c in measures],
+    ).group_by(*[folded.c[c] for c in dimensions])
+    upsert = insert(rollup_model).from_select(dimensions + measures, totals)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=list(dimensions),
+        set_={c: getattr(rollup_model, c) + getattr(upsert.excluded, c) for c in measures},
+    ).add_cte(folded)
+    return db.session.execute(upsert, execution_options={"synchronize_session": False}).rowcount
+
+def compact_rollups():
+    """
+    Folds the pending deltas into the daily rollups. Concurrent compactions
+    never fold a delta twice. Returns the number of rollup rows updated.
+    The caller commits.
+    """
+    return (
+        _fold(ShipmentRollupDelta, ShipmentDailyRollup, SHIPMENT_DIMENSIONS, ("shipment_count", "revenue"))
+        + _fold(UserRollupDelta, UserDailyRollup, ("day", "user_type"), ("user_count",))
+    )
+
+def rebuild_rollups():
+    """
+    Recomputes the rollups from the shipments and users tables, e.g. after
+    a backfill or an import that bypassed the triggers, and (re)installs the
+    triggers. Writes to both tables wait until the caller commits, so no
+    change is missed or counted twice.
+    """
+    connection = db.session.connection()
+    connection.execute(SHIPMENT_ROLLUP_TRIGGERS)
+    connection.execute(USER_ROLLUP_TRIGGERS)
+    db.session.execute(text("LOCK TABLE shipments, users IN SHARE MODE"))
+    for model in (ShipmentRollupDelta, ShipmentDailyRollup, UserRollupDelta, UserDailyRollup):
+        db.session.execute(delete(model), execution_options={"synchronize_session": False})
+
+    day = _local_day(Shipment.booking_date)
+    user_type = _shipment_user_type()
+    db.session.execute(insert(ShipmentDailyRollup).from_select(
+        SHIPMENT_DIMENSIONS + ("shipment_count", "revenue"),
+        select(day, Shipment.service_type, Shipment.status, user_type,
+               func.count(), func.sum(Shipment.total_with_tax_18_percent))
+        .select_from(Shipment)
+        .outerjoin(User, User.id == Shipment.user_id)
+        .group_by(day, Shipment.service_type, Shipment.status, user_type),
+    ))
+
+    day = _local_day(func.coalesce(User.created_at, func.timezone("UTC", func.now())))
+    user_type = _user_type()
+    db.session.execute(insert(UserDailyRollup).from_select(
+        ("day", "user_type", "user_count"),
+        select(day, user_type, func.count()).select_from(User).group_by(day, user_type),
+    ))
+
+def _utc_range(column, start, end):
+    # Bounds a UTC timestamp column to the ROLLUP_TIMEZONE days start to end
+    conditions = []
+    if start is not None:
+        conditions.append(column >= utc_bounds(start, start)[0])
+    if end is not None:
+        conditions.append(column < utc_bounds(end, end)[1])
+    return conditions
+
+def _shipment_rows(start, end):
+    # One row per shipment, in the shape of the shipment rollups
+    return select(
+        _local_day(Shipment.booking_date), Shipment.service_type, Shipment.status, _shipment_user_type(),
+        literal(1), Shipment.total_with_tax_18_percent,
+    ).select_from(Shipment).outerjoin(User, User.id == Shipment.user_id).where(
+        *_utc_range(Shipment.booking_date, start, end)
+    )
+
+def _user_rows(start, end):
+    # One row per user, in the shape of the user rollups
+    return select(_local_day(User.created_at), _user_type(), literal(1)).where(
+        *_utc_range(User.created_at, start, end)
+    )
+
+def _combined(rollup_model, delta_model, base_rows, columns, start, end):
+    # Compacted rollups plus the deltas not folded in yet. Until the rollups
+    # are built (see rebuild_rollups.py) both are empty, and the base table
+    # rows stand in for them, so the totals are never silently zero
+    parts = []
+    for model in (rollup_model, delta_model):
+        part = select(*[getattr(model, c) for c in columns])
+        if start is not None:
+            part = part.where(model.day >= start)
+        if end is not None:
+            part = part.where(model.day <= end)
+        parts.append(part)
+    built = or_(*[select(literal(1)).select_from(model).exists() for model in (rollup_model, delta_model)])
+    parts.append(base_rows.where(~built))
+    return union_all(*parts).subquery()
+
+def shipment_totals(start=None, end=None, group_by=()):
+    """
+    Shipment count and revenue booked between the `start` and `end` days
+    (inclusive, in ROLLUP_TIMEZONE; None leaves that side open), one row per
+    combination of the `group_by` dimensions, or a single row without them.
+    """
+    rows = _combined(
+        ShipmentDailyRollup, ShipmentRollupDelta, _shipment_rows(start, end),
+        SHIPMENT_DIMENSIONS + ("shipment_count", "revenue"), start, end,
+    )
+    keys = [rows.c[c] for c in group_by]
+    query = select(
+        *keys,
+        cast(func.coalesce(func.sum(rows.c.shipment_count), 0), BigInteger).label("orders"),
+        func.coalesce(func.sum(rows.c.revenue), 0).label("revenue"),
+    )
+    if keys:
+        query = query.group_by(*keys).having(func.sum(rows.c.shipment_count) != 0).order_by(*keys)
+    return db.session.execute(query).all()
+
+def user_count(start=None, end=None, user_type="Customer"):
+    """Users of `user_type` who signed up between the `start` and `end` days."""
+    rows = _combined(
+        UserDailyRollup, UserRollupDelta, _user_rows(start, end),
+        ("day", "user_type", "user_count"), start, end,
+    )
+    return db.session.execute(
+        select(cast(func.coalesce(func.sum(rows.c.user_count), 0), BigInteger))
+        .where(rows.c.user_type == literal(user_type))
+    ).scalar()
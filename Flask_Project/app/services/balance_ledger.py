@@ -0,0 +1,135 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import func, insert, literal, select, update
+
+from app.extensions import db
+from app.models import BalanceLedgerEntry, User
+
+class InsufficientBalance(ValueError):
+    """Raised when a debit would take an employee's balance below zero."""
+
+def _pending_filter(user_ids):
+    conditions = [~BalanceLedgerEntry.applied]
+    if user_ids is not None:
+        conditions.append(BalanceLedgerEntry.user_id.in_(user_ids))
+    return conditions
+
+def compact_balances(user_ids=None):
+    """
+    Folds unapplied ledger entries into User.balance, for the given users or
+    for everyone, in a single statement: the entries are marked applied and
+    their per-user sums added to the cached balances atomically. Concurrent
+    compactions never fold an entry twice. Returns the number of users updated.
+    The caller commits.
+    """
+    folded = (
+        update(BalanceLedgerEntry)
+        .where(*_pending_filter(user_ids))
+        .values(applied=True)
+        .returning(BalanceLedgerEntry.user_id, BalanceLedgerEntry.amount)
+        .cte("folded")
+    )
+    totals = (
+        select(folded.c.user_id, func.sum(folded.c.amount).label("amount"))
+        .group_by(folded.c.user_id)
+        .cte("totals")
+    )
+    result = db.session.execute(
+        update(User)
+        .where(User.id == totals.c.user_id)
+        .values(balance=User.balance + totals.c.amount),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount
+
+def credit_balance(user_id, amount, reference=None):
+    """
+    Records a top-up. It only appends to the ledger, so it never contends
+    with debits on the user's row; available_balance() includes it at once
+    and compaction later folds it into User.balance. The caller commits.
+    """
+    db.session.add(BalanceLedgerEntry(
+        user_id=user_id,
+        amount=Decimal(amount),
+        entry_type="top_up",
+        reference=reference,
+        applied=False,
+    ))
+
+def debit_balance(user_id, amount, reference=None):
+    """
+    Debits `amount` with one conditional UPDATE ... WHERE balance >= amount
+    RETURNING balance, so concurrent debits can neither overdraw nor lose an
+    update. The debit's ledger entry is inserted by the same statement:
+
+        WITH debited AS (UPDATE users ... RETURNING id, balance),
+             entry AS (INSERT INTO balance_ledger ... SELECT ... FROM debited)
+        SELECT balance FROM debited
+
+    If the cached balance falls short, the user's pending top-ups are
+    compacted and the debit retried once. Returns the new cached balance or
+    raises InsufficientBalance. Call it last before committing: the user's
+    row stays locked until the transaction ends.
+    """
+    amount = Decimal(amount)
+    debited = (
+        update(User)
+        .where(User.id == user_id, User.balance >= amount)
+        .values(balance=User.balance - amount)
+        .returning(User.id, User.balance)
+        .cte("debited")
+    )
+    # Selected from `debited`, so no entry is written when the debit falls short
+    entry = select(
+        debited.c.id,
+        literal(-amount, BalanceLedgerEntry.amount.type),
+        literal("debit"),
+        literal(reference, BalanceLedgerEntry.reference.type),
+        literal(True),
+        literal(datetime.utcnow()),
+    )
+    inserted = (
+        insert(BalanceLedgerEntry)
+        .from_select(["user_id", "amount", "entry_type", "reference", "applied", "created_at"], entry)
+        .cte("entry")
+    )
+    debit = select(debited.c.balance).add_cte(inserted)
+
+    new_balance = db.session.execute(debit).scalar_one_or_none()
+    if new_balance is None and compact_balances([user_id]):
+        new_balance = db.session.execute(debit).scalar_one_or_none()
+    if new_balance is None:
+        raise InsufficientBalance("Insufficient balance to book shipment.")
+    return new_balance
+
+def available_balances(user_ids):
+    """Returns {user_id: cached balance + pending top-ups} in one query."""
+    pending = (
+        select(BalanceLedgerEntry.user_id, func.sum(BalanceLedgerEntry.amount).label("amount"))
+        .where(*_pending_filter(user_ids))
+        .group_by(BalanceLedgerEntry.user_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(User.id, User.balance + func.coalesce(pending.c.amount, 0))
+        .outerjoin(pending, pending.c.user_id == User.id)
+        .where(User.id.in_(user_ids))
+    )
+    return {user_id: balance for user_id, balance in rows}
+
+def available_balance_column():
+    """
+    Cached balance + pending top-ups as a column of a query over users, so a
+    listing gets its balances from the same statement as its rows.
+    """
+    pending = (
+        select(func.coalesce(func.sum(BalanceLedgerEntry.amount), 0))
+        .where(~BalanceLedgerEntry.applied, BalanceLedgerEntry.user_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    return User.balance + pending
+
+def available_balance(user_id):
+    return available_balances([user_id]).get(user_id, Decimal("0"))
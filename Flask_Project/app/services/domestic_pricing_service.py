@@ -1,7 +1,14 @@
 
+import hashlib
 import json
 import math
 import os
+from bisect import bisect_right
+
+import numpy as np
+
+from app.services.quote_cache import quote_cache
+from app.services.rate_card_snapshot import load_snapshot_section
 
 # --- Load Data ---
 def _load_json_data(filename):
@@ -14,8 +21,163 @@ def _load_json_data(filename):
         # In a real app, you'd log this error
         return None
 
-DOMESTIC_ZONES = _load_json_data('domestic.json')
-DOMESTIC_PRICES = _load_json_data('dom_prices.json')
+def domestic_rate_version(zones, prices):
+    # Identifies a set of domestic rate data; quote tokens are only honoured
+    # for the version they were issued against
+    return hashlib.sha256(json.dumps([zones, prices], sort_keys=True).encode()).hexdigest()[:12]
+
+# Prefer the compiled snapshot (see compile_rate_cards.py); it is empty when
+# missing or older than the JSON, and everything below is then built from the JSON
+_compiled = load_snapshot_section("domestic")
+
+DOMESTIC_ZONES = _compiled.get("zones") or _load_json_data('domestic.json')
+DOMESTIC_PRICES = _compiled.get("prices") or _load_json_data('dom_prices.json')
+DOMESTIC_RATE_VERSION = _compiled.get("rate_version") or domestic_rate_version(DOMESTIC_ZONES, DOMESTIC_PRICES)
+
+# Common alternate spellings, mapped to the name used in domestic.json.
+# Keys and values are in normalized form (see _normalize_destination).
+DESTINATION_ALIASES = {
+    "bengaluru": "bangalore",
+    "bombay": "mumbai",
+    "calcutta": "kolkata",
+    "madras": "chennai",
+    "poona": "pune",
+    "new delhi": "delhi",
+    "nct of delhi": "delhi",
+    "j&k": "jammu & kashmir",
+    "j & k": "jammu & kashmir",
+    "jammu and kashmir": "jammu & kashmir",
+    "orissa": "odisha",
+    "pondicherry": "puducherry",
+    "uttaranchal": "uttarakhand",
+    "andaman and nicobar": "port blair",
+    "andaman & nicobar": "port blair",
+    "andaman and nicobar islands": "port blair",
+    "dadra & nagar haveli": "dadra and nagar haveli",
+    "daman & diu": "daman and diu",
+}
+
+def _normalize_destination(name: str) -> str:
+    # Collapse stray/duplicate whitespace and case-fold for lookups
+    return " ".join(name.split()).casefold()
+
+def _build_destination_index(zones):
+    """
+    Builds a normalized destination -> zone column index from domestic.json,
+    including the aliases above. The first column listing a destination wins.
+    """
+    index = {}
+    if not zones:
+        return index
+    for column, locations in zones.items():
+        for location in locations:
+            index.setdefault(_normalize_destination(location), column)
+    for alias, canonical in DESTINATION_ALIASES.items():
+        column = index.get(canonical)
+        if column:
+            index.setdefault(alias, column)
+    return index
+
+DESTINATION_INDEX = _compiled.get("destination_index") or _build_destination_index(DOMESTIC_ZONES)
+
+def find_domestic_zone(state_name: str, city_name: str):
+    """
+    Returns the zone column for a destination, checking the city first and
+    then the state, or None if neither is serviced.
+    """
+    if city_name:
+        column = DESTINATION_INDEX.get(_normalize_destination(city_name))
+        if column:
+            return column
+    if state_name:
+        return DESTINATION_INDEX.get(_normalize_destination(state_name))
+    return None
+
+# --- Compiled Rate Matrix ---
+DOMESTIC_MODES = ("express", "air", "surface")
+MODE_ROWS = {mode: i for i, mode in enumerate(DOMESTIC_MODES)}
+
+# Express is priced flat per ceil(kg) slab, air/surface per kg within a band
+FLAT_RATE_MODES = ("express",)
+EXPRESS_BANDS = ("1", "2", "3", "4", "5")
+PER_KG_BANDS = ("<5", "<10", "<25", "<50", ">50")
+PER_KG_BAND_LIMITS = (5, 10, 25, 50)
+
+# Minimum chargeable weight per mode
+MODE_MIN_WEIGHT = {"express": 0, "air": 3, "surface": 5}
+
+# The same rules as arrays in DOMESTIC_MODES order, for batch pricing
+MODE_MIN_WEIGHTS = np.array([MODE_MIN_WEIGHT[mode] for mode in DOMESTIC_MODES], dtype=float)
+MODE_IS_FLAT_RATE = np.array([mode in FLAT_RATE_MODES for mode in DOMESTIC_MODES])
+_PER_KG_BAND_LIMITS_ARRAY = np.array(PER_KG_BAND_LIMITS, dtype=float)
+
+def _compile_rate_matrix(prices):
+    """
+    Compiles dom_prices.json into a dense rate matrix indexed by
+    [zone_row, mode_row, band] (NaN where a band is missing) and an
+    available[zone_row, mode_row] mask. zone_rows maps a zone column to its row.
+    """
+    zone_rows = {column: i for i, column in enumerate(prices or {})}
+    matrix = np.full((len(zone_rows), len(DOMESTIC_MODES), len(PER_KG_BANDS)), np.nan)
+    available = np.zeros((len(zone_rows), len(DOMESTIC_MODES)), dtype=bool)
+    for column, zone_row in zone_rows.items():
+        for mode, table in prices[column].items():
+            mode_row = MODE_ROWS.get(mode)
+            if mode_row is None:
+                continue
+            available[zone_row, mode_row] = True
+            bands = EXPRESS_BANDS if mode in FLAT_RATE_MODES else PER_KG_BANDS
+            for band_index, band in enumerate(bands):
+                if table.get(band) is not None:
+                    matrix[zone_row, mode_row, band_index] = table[band]
+    return zone_rows, matrix, available
+
+def compile_domestic_rates(zones, prices):
+    """
+    Builds everything the domestic pricer derives from domestic.json and
+    dom_prices.json, in the layout stored in the compiled snapshot.
+    """
+    zone_rows, matrix, available = _compile_rate_matrix(prices)
+    return {
+        "zones": zones,
+        "prices": prices,
+        "rate_version": domestic_rate_version(zones, prices),
+        "destination_index": _build_destination_index(zones),
+        "zone_rows": zone_rows,
+        "rate_matrix": matrix,
+        "mode_available": available,
+    }
+
+if "rate_matrix" in _compiled:
+    ZONE_ROWS = _compiled["zone_rows"]
+    DOMESTIC_RATE_MATRIX = _compiled["rate_matrix"]
+    DOMESTIC_MODE_AVAILABLE = _compiled["mode_available"]
+else:
+    ZONE_ROWS, DOMESTIC_RATE_MATRIX, DOMESTIC_MODE_AVAILABLE = _compile_rate_matrix(DOMESTIC_PRICES)
+
+# Plain-Python copies for the single-quote path, where numpy scalar access costs more than it saves
+_RATE_ROWS = DOMESTIC_RATE_MATRIX.tolist()
+_MODE_AVAILABLE_ROWS = DOMESTIC_MODE_AVAILABLE.tolist()
+
+def _price_parcel(zone_row: int, mode: str, weight_kg: float):
+    """
+    Prices one parcel from the compiled matrix. Returns (price, chargeable_weight),
+    where price is None if the zone has no rate for the resulting band.
+    """
+    mode_row = MODE_ROWS[mode]
+    if mode in FLAT_RATE_MODES:
+        chargeable_weight = math.ceil(weight_kg)
+        band = min(max(chargeable_weight, 1), len(EXPRESS_BANDS)) - 1
+    else:
+        chargeable_weight = max(weight_kg, MODE_MIN_WEIGHT[mode])
+        band = bisect_right(PER_KG_BAND_LIMITS, chargeable_weight)
+
+    rate = _RATE_ROWS[zone_row][mode_row][band]
+    if math.isnan(rate):
+        return None, chargeable_weight
+    if mode in FLAT_RATE_MODES:
+        return rate, chargeable_weight
+    return rate * chargeable_weight, chargeable_weight
 
 def calculate_domestic_price(state_name: str, city_name: str, mode: str, weight_kg: float):
     """
@@ -26,77 +188,161 @@ def calculate_domestic_price(state_name: str, city_name: str, mode: str, weight_
         return {"error": "Pricing data could not be loaded."}
 
     # 1. FIND COLUMN NUMBER (ZONE) - City first, then State
-    selected_column = None
-    destination_lower = city_name.lower()
-
-    # Check city first
-    for column, locations in DOMESTIC_ZONES.items():
-        if any(loc.lower() == destination_lower for loc in locations):
-            selected_column = column
-            break
-    
-    # If city not found, check state
-    if not selected_column:
-        destination_lower = state_name.lower()
-        for column, locations in DOMESTIC_ZONES.items():
-            if any(loc.lower() == destination_lower for loc in locations):
-                selected_column = column
-                break
-            
+    selected_column = find_domestic_zone(state_name, city_name)
+
     if not selected_column:
         return {"error": f"The destination '{city_name}, {state_name}' is not currently serviced."}
 
-    # 2. SELECT PRICING RULES
-    rules = DOMESTIC_PRICES.get(selected_column)
-    if not rules or mode not in rules:
+    # 2. CHECK THE MODE IS OFFERED IN THIS ZONE
+    zone_row = ZONE_ROWS.get(selected_column)
+    if zone_row is None or mode not in MODE_ROWS or not _MODE_AVAILABLE_ROWS[zone_row][MODE_ROWS[mode]]:
         return {"error": f"The '{mode}' service is not available for '{state_name}'."}
 
-    pricing_table = rules[mode]
-    original_weight = weight_kg
-
-    # 3. NORMALIZE WEIGHT
-    if mode == "air" and weight_kg < 3:
-        weight_kg = 3
-    elif mode == "surface" and weight_kg < 5:
-        weight_kg = 5
-    
-    # 4. DETERMINE PRICING BAND and CALCULATE PRICE
-    band = None
-    price = 0
-    rounded_weight_for_display = original_weight
-
-    if mode == "express":
-        rounded_weight = math.ceil(original_weight)
-        if rounded_weight <= 1: band = "1"
-        elif rounded_weight <= 2: band = "2"
-        elif rounded_weight <= 3: band = "3"
-        elif rounded_weight <= 4: band = "4"
-        else: band = "5"
-        
-        price = pricing_table.get(band)
-        rounded_weight_for_display = rounded_weight
-
-    elif mode in ["air", "surface"]:
-        # For air/surface, weight is already normalized for calculation
-        if weight_kg < 5: band = "<5"
-        elif weight_kg < 10: band = "<10"
-        elif weight_kg < 25: band = "<25"
-        elif weight_kg < 50: band = "<50"
-        else: band = ">50"
-        
-        rate_per_kg = pricing_table.get(band)
-        if rate_per_kg is not None:
-            price = rate_per_kg * weight_kg
-        else:
-            price = None
-        rounded_weight_for_display = weight_kg
-    
+    # 3. SERVE REPEAT QUOTES FROM THE CACHE
+    # Express is priced per whole kg; air/surface prices scale with the exact weight
+    cache_weight = math.ceil(weight_kg) if mode in FLAT_RATE_MODES else weight_kg
+    cache_key = ("domestic", selected_column, mode, cache_weight)
+    cached = quote_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    # 4. NORMALIZE WEIGHT, PICK THE BAND AND CALCULATE PRICE
+    price, rounded_weight_for_display = _price_parcel(zone_row, mode, weight_kg)
+
     if price is None:
         return {"error": f"Pricing not available for the calculated weight band in {state_name}."}
 
     # 5. RETURN PRICE
-    return {
+    result = {
         "price": price,
         "zone": selected_column,
         "rounded_weight": rounded_weight_for_display
     }
+    quote_cache.put(cache_key, result)
+    return dict(result)
+
+def calculate_domestic_quote_all(state_name: str, city_name: str, weight_kg: float):
+    """
+    Prices every mode offered for a destination in one call.
+    Returns the zone, a per-mode result (price and rounded_weight, or an error)
+    and the cheapest available mode, or an error if the destination is unknown.
+    """
+    if not DOMESTIC_ZONES or not DOMESTIC_PRICES:
+        return {"error": "Pricing data could not be loaded."}
+
+    selected_column = find_domestic_zone(state_name, city_name)
+    zone_row = ZONE_ROWS.get(selected_column) if selected_column else None
+    if zone_row is None:
+        return {"error": f"The destination '{city_name}, {state_name}' is not currently serviced."}
+
+    quotes = {}
+    cheapest = None
+    for mode, mode_row in MODE_ROWS.items():
+        if not _MODE_AVAILABLE_ROWS[zone_row][mode_row]:
+            quotes[mode] = {"error": f"The '{mode}' service is not available for '{state_name}'."}
+            continue
+        price, rounded_weight = _price_parcel(zone_row, mode, weight_kg)
+        if price is None:
+            quotes[mode] = {"error": f"Pricing not available for the calculated weight band in {state_name}."}
+            continue
+        quotes[mode] = {"price": price, "rounded_weight": rounded_weight}
+        if cheapest is None or price < quotes[cheapest]["price"]:
+            cheapest = mode
+
+    return {
+        "zone": selected_column,
+        "quotes": quotes,
+        "cheapest": cheapest
+    }
+
+# --- Vectorized Batch Pricing ---
+def _price_domestic_arrays(zone_rows, mode_rows, weights):
+    """
+    Prices parallel arrays of zone rows, mode rows and weights in one pass.
+    Returns (prices, chargeable_weights); prices are NaN where no band rate exists.
+    """
+    is_flat = MODE_IS_FLAT_RATE[mode_rows]
+    ceil_weights = np.ceil(weights)
+    chargeable = np.where(is_flat, ceil_weights, np.maximum(weights, MODE_MIN_WEIGHTS[mode_rows]))
+    bands = np.where(
+        is_flat,
+        np.clip(ceil_weights, 1, len(EXPRESS_BANDS)) - 1,
+        np.searchsorted(_PER_KG_BAND_LIMITS_ARRAY, chargeable, side="right"),
+    ).astype(np.intp)
+    rates = DOMESTIC_RATE_MATRIX[zone_rows, mode_rows, bands]
+    prices = np.where(is_flat, rates, rates * chargeable)
+    return prices, chargeable
+
+def calculate_domestic_price_batch(rows):
+    """
+    Batch version of calculate_domestic_price. rows is a sequence of
+    (state_name, city_name, mode, weight_kg) tuples; returns one result dict
+    per row, in order, each shaped like calculate_domestic_price's result.
+    """
+    if not DOMESTIC_ZONES or not DOMESTIC_PRICES:
+        return [{"error": "Pricing data could not be loaded."} for _ in rows]
+
+    results = [None] * len(rows)
+    resolved = []
+
+    # Zone resolution is a dict hit per row; everything after is vectorized
+    for position, (state_name, city_name, mode, weight_kg) in enumerate(rows):
+        column = find_domestic_zone(state_name, city_name)
+        if not column:
+            results[position] = {"error": f"The destination '{city_name}, {state_name}' is not currently serviced."}
+            continue
+        resolved.append((position, column, mode, weight_kg, state_name))
+
+    return _price_resolved_rows(results, resolved)
+
+def calculate_domestic_zone_price_batch(rows):
+    """
+    As calculate_domestic_price_batch, for (zone_column, mode, weight_kg)
+    rows whose zone is already known, e.g. when pricing every zone.
+    """
+    if not DOMESTIC_ZONES or not DOMESTIC_PRICES:
+        return [{"error": "Pricing data could not be loaded."} for _ in rows]
+
+    resolved = [(position, column, mode, weight_kg, column) for position, (column, mode, weight_kg) in enumerate(rows)]
+    return _price_resolved_rows([None] * len(rows), resolved)
+
+def _price_resolved_rows(results, resolved):
+    # resolved holds (position, zone_column, mode, weight_kg, label) rows;
+    # label names the destination in error messages
+    positions, columns, labels, zone_rows, mode_rows, weights = [], [], [], [], [], []
+    for position, column, mode, weight_kg, label in resolved:
+        zone_row = ZONE_ROWS.get(column)
+        mode_row = MODE_ROWS.get(mode)
+        if zone_row is None or mode_row is None or not DOMESTIC_MODE_AVAILABLE[zone_row, mode_row]:
+            results[position] = {"error": f"The '{mode}' service is not available for '{label}'."}
+            continue
+        if not (weight_kg > 0 and math.isfinite(weight_kg)):
+            # The band lookup would clip it into the first band
+            results[position] = {"error": "Weight must be a positive number."}
+            continue
+        positions.append(position)
+        columns.append(column)
+        labels.append(label)
+        zone_rows.append(zone_row)
+        mode_rows.append(mode_row)
+        weights.append(weight_kg)
+
+    if not positions:
+        return results
+
+    mode_rows = np.array(mode_rows, dtype=np.intp)
+    prices, chargeable = _price_domestic_arrays(
+        np.array(zone_rows, dtype=np.intp), mode_rows, np.array(weights, dtype=float)
+    )
+    is_flat = MODE_IS_FLAT_RATE[mode_rows]
+
+    for i, position in enumerate(positions):
+        if np.isnan(prices[i]):
+            results[position] = {"error": f"Pricing not available for the calculated weight band in {labels[i]}."}
+            continue
+        results[position] = {
+            "price": float(prices[i]),
+            "zone": columns[i],
+            "rounded_weight": int(chargeable[i]) if is_flat[i] else float(chargeable[i]),
+        }
+    return results
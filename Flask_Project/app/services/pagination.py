@@ -0,0 +1,166 @@
+import base64
+import json
+import math
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, tuple_
+
+from app.extensions import db
+
+DEFAULT_PAGE_SIZE = 10
+MAX_CURSOR_PAGE_SIZE = 100
+
+# Exact totals are reused for this long per listing and filter combination
+COUNT_CACHE_TTL = 60.0
+COUNT_CACHE_MAXSIZE = 1024
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor this server did not issue."""
+
+def encode_cursor(sort_value, row_id, direction):
+    sort_value = sort_value.isoformat() if sort_value is not None else None
+    raw = json.dumps([sort_value, row_id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id, direction = json.loads(raw)
+        if direction not in ("next", "prev") or not isinstance(row_id, int):
+            raise ValueError(direction)
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, row_id, direction
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+def _after(sort_column, id_column, sort_value, row_id):
+    # The rows after (sort_value, row_id), newest first with NULLs first
+    if sort_value is None:
+        return or_(and_(sort_column.is_(None), id_column < row_id), sort_column.is_not(None))
+    return tuple_(sort_column, id_column) < tuple_(sort_value, row_id)
+
+def _before(sort_column, id_column, sort_value, row_id):
+    if sort_value is None:
+        return and_(sort_column.is_(None), id_column > row_id)
+    return or_(tuple_(sort_column, id_column) > tuple_(sort_value, row_id), sort_column.is_(None))
+
+def keyset_page(query, sort_column, id_column, cursor, limit):
+    """
+    Returns (rows, next_cursor, prev_cursor) for one page of `query`, newest
+    first by (sort_column, id_column). Each page is a range scan that starts
+    at the cursor's key, so deep pages cost the same as the first. Rows whose
+    sort_column is NULL (legacy rows) come first, as in the page-number
+    listings, ordered by id.
+    """
+    direction = "next"
+    if cursor:
+        sort_value, row_id, direction = decode_cursor(cursor)
+        if direction == "next":
+            query = query.filter(_after(sort_column, id_column, sort_value, row_id))
+        else:
+            query = query.filter(_before(sort_column, id_column, sort_value, row_id))
+
+    if direction == "next":
+        rows = query.order_by(sort_column.desc().nulls_first(), id_column.desc()).limit(limit + 1).all()
+        more_after, more_before = len(rows) > limit, bool(cursor)
+        rows = rows[:limit]
+    else:
+        rows = query.order_by(sort_column.asc().nulls_last(), id_column.asc()).limit(limit + 1).all()
+        more_after, more_before = True, len(rows) > limit
+        rows = rows[:limit][::-1]
+
+    if not rows:
+        return rows, None, None
+
+    def _cursor(row, to):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key), to)
+
+    next_cursor = _cursor(rows[-1], "next") if more_after else None
+    prev_cursor = _cursor(rows[0], "prev") if more_before else None
+    return rows, next_cursor, prev_cursor
+
+_counts = {}
+_counts_lock = threading.Lock()
+
+def cached_count(count_key, query):
+    """
+    The exact number of rows of `query`, reused for COUNT_CACHE_TTL seconds
+    per count_key (the listing and its filters).
+    """
+    now = time.monotonic()
+    with _counts_lock:
+        entry = _counts.get(count_key)
+        if entry and now - entry[1] < COUNT_CACHE_TTL:
+            return entry[0]
+
+    total = query.order_by(None).count()
+    with _counts_lock:
+        if len(_counts) >= COUNT_CACHE_MAXSIZE:
+            _counts.clear()
+        _counts[count_key] = (total, now)
+    return total
+
+def estimated_count(query):
+    """The planner's row estimate for `query`: no scan, but approximate."""
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def paginated_listing(query, sort_column, id_column, args, items_key, dump_page, count_key, rank=None):
+    """
+    Builds a list endpoint's response in one of two modes:
+
+    - ?cursor= (empty for the first page): keyset pagination, returning
+      nextCursor/prevCursor and, with ?count=exact or ?count=estimate, a totalCount.
+    - ?page=: page numbers, as before, with totalPages and totalCount from
+      an exact count on every request, so they are never stale. A search
+      `rank` orders the pages by relevance first.
+
+    dump_page turns a page of rows into the list sent under items_key.
+    """
+    limit = max(1, int(args.get("limit", DEFAULT_PAGE_SIZE)))
+
+    if "cursor" in args:
+        limit = min(limit, MAX_CURSOR_PAGE_SIZE)
+        rows, next_cursor, prev_cursor = keyset_page(query, sort_column, id_column, args.get("cursor"), limit)
+        body = {items_key: dump_page(rows), "nextCursor": next_cursor, "prevCursor": prev_cursor}
+        count_mode = args.get("count")
+        if count_mode == "exact":
+            body["totalCount"] = cached_count(count_key, query)
+        elif count_mode == "estimate":
+            body["totalCount"] = estimated_count(query)
+        return body
+
+    page = int(args.get("page", 1))
+    order = [sort_column.desc().nulls_first(), id_column.desc()]
+    if rank is not None:
+        order.insert(0, rank.desc())
+    # The total rides along on every row as a window count, so a page costs
+    # one statement; an empty first page has none, and only a page past the
+    # end needs a separate count
+    rows = (
+        query.add_columns(func.count().over().label("total_count"))
+        .order_by(*order)
+        .limit(limit)
+        .offset(max(page - 1, 0) * limit)
+        .all()
+    )
+    if rows:
+        total_count = rows[0].total_count
+    else:
+        total_count = query.order_by(None).count() if page > 1 else 0
+    if len(query.column_descriptions) == 1:
+        rows = [row[0] for row in rows]
+    return {
+        items_key: dump_page(rows),
+        "totalPages": math.ceil(total_count / limit) or 1,
+        "currentPage": page,
+        "totalCount": total_count,
+    }
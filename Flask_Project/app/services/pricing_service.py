@@ -1,7 +1,114 @@
 
+import hashlib
 import json
 import math
 import os
+import threading
+import time
+
+import numpy as np
+
+from app.services.quote_cache import quote_cache
+from app.services.rate_card_snapshot import load_snapshot_section, snapshot_mtime
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRICING_JSON_PATH = os.path.join(_BASE_DIR, '..', 'Data', 'pricing.json')
+
+# Flat-rate slabs are published for 1..11 kg, heavier parcels use per_kg
+MAX_SLAB_WEIGHT = 11
+
+# How often (in seconds) a worker checks pricing.json for a newer version
+RATE_CARD_CHECK_INTERVAL = 5.0
+
+# Parsed rate card, shared by every request served by this worker.
+# "data" holds the country index plus the numpy tables used for batches.
+_rate_card = {"mtime": None, "checked_at": 0.0, "data": None}
+_rate_card_lock = threading.Lock()
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _index_rate_card(pricing_list, version=None):
+    """
+    Converts the raw pricing.json list into a country-keyed index with the
+    weight slabs pre-converted to floats. slabs[i] is the price for i+1 kg.
+    The first entry for a country wins, matching the old linear scan.
+
+    Each country also gets a "row" into the slab_table/per_kg_table arrays,
+    where missing prices are NaN.
+    """
+    countries = {}
+    for item in pricing_list:
+        name = item.get("country")
+        key = name.strip().lower() if name else None
+        if not key or key in countries:
+            continue
+        countries[key] = {
+            "country": name,
+            "row": len(countries),
+            "slabs": tuple(_to_float(item.get(str(w))) for w in range(1, MAX_SLAB_WEIGHT + 1)),
+            "per_kg": _to_float(item.get("per_kg")),
+        }
+
+    slab_table = np.array(
+        [[np.nan if p is None else p for p in c["slabs"]] for c in countries.values()], dtype=float
+    ).reshape(len(countries), MAX_SLAB_WEIGHT)
+    per_kg_table = np.array(
+        [np.nan if c["per_kg"] is None else c["per_kg"] for c in countries.values()], dtype=float
+    )
+    return {
+        "version": version,
+        "countries": countries,
+        "slab_table": slab_table,
+        "per_kg_table": per_kg_table,
+    }
+
+def compile_international_rates(raw):
+    """Indexes the raw bytes of pricing.json, versioned by their content hash."""
+    version = hashlib.sha256(raw).hexdigest()[:12]
+    return _index_rate_card(json.loads(raw), version)
+
+def get_rate_card():
+    """
+    Returns the indexed international rate card. It comes from the compiled
+    snapshot when that is current, otherwise from pricing.json, and is reloaded
+    only when the mtime of either file changes. If a reload fails, the last
+    good rate card stays in service.
+    """
+    now = time.monotonic()
+    if _rate_card["data"] is not None and now - _rate_card["checked_at"] < RATE_CARD_CHECK_INTERVAL:
+        return _rate_card["data"]
+
+    with _rate_card_lock:
+        try:
+            mtime = (os.stat(PRICING_JSON_PATH).st_mtime_ns, snapshot_mtime())
+        except OSError:
+            return _rate_card["data"]
+
+        if mtime != _rate_card["mtime"]:
+            data = load_snapshot_section("international")
+            if not data:
+                try:
+                    with open(PRICING_JSON_PATH, 'rb') as f:
+                        data = compile_international_rates(f.read())
+                except (IOError, ValueError):
+                    # In a real app, you'd log this error
+                    return _rate_card["data"]
+            _rate_card["data"] = data
+            _rate_card["mtime"] = mtime
+            # Cached quotes may have been priced from the previous rate card
+            quote_cache.clear()
+
+        _rate_card["checked_at"] = now
+    return _rate_card["data"]
+
+def international_rate_card_version():
+    """Returns the version of the rate card currently in service, or None."""
+    rate_card = get_rate_card()
+    return rate_card["version"] if rate_card else None
 
 def calculate_international_price(target_country: str, weight_in_kg: float):
     """
@@ -14,22 +121,12 @@ def calculate_international_price(target_country: str, weight_in_kg: float):
     Returns:
         A dictionary with pricing details or an error message.
     """
-    # Construct the full path to the JSON file
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    json_path = os.path.join(base_dir, '..', 'Data', 'pricing.json')
-
-    try:
-        with open(json_path, 'r') as f:
-            pricing_list = json.load(f)
-    except (IOError, json.JSONDecodeError):
+    rate_card = get_rate_card()
+    if rate_card is None:
         return {"error": "Could not load pricing data."}
 
-    country_data = None
-    for item in pricing_list:
-        if item.get("country", "").lower() == target_country.lower():
-            country_data = item
-            break
-    
+    country_key = target_country.strip().lower()
+    country_data = rate_card["countries"].get(country_key)
     if not country_data:
         return {"error": f"We do not offer services to {target_country.title()} at the moment."}
 
@@ -38,33 +135,94 @@ def calculate_international_price(target_country: str, weight_in_kg: float):
         return {"error": "Weight must be a positive number."}
     integer_weight = math.ceil(weight_in_kg)
 
-    base_price = 0.0
-    
+    cache_key = ("international", country_key, integer_weight)
+    cached = quote_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    slabs = country_data["slabs"]
+
     # Calculate price based on weight
-    if 1 <= integer_weight <= 11:
-        weight_key = str(integer_weight)
-        if weight_key in country_data:
-            base_price = country_data[weight_key]
-        else:
+    if integer_weight <= MAX_SLAB_WEIGHT:
+        base_price = slabs[integer_weight - 1]
+        if base_price is None:
             return {"error": f"Pricing not available for {integer_weight}kg to {target_country.title()}."}
-    elif integer_weight > 11:
-        price_at_11kg = country_data.get("11")
-        rate_per_extra_kg = country_data.get("per_kg")
+    else:
+        price_at_max_slab = slabs[MAX_SLAB_WEIGHT - 1]
+        rate_per_extra_kg = country_data["per_kg"]
 
-        if price_at_11kg is None or rate_per_extra_kg is None:
+        if price_at_max_slab is None or rate_per_extra_kg is None:
             return {"error": f"Extended pricing not available for {target_country.title()}."}
-            
-        extra_kgs = integer_weight - 11
-        extra_cost = extra_kgs * rate_per_extra_kg
-        base_price = price_at_11kg + extra_cost
-    else: # This covers weights between 0 and 1 (e.g., 0.5kg)
-        base_price = country_data.get("1", 0)
 
+        extra_kgs = integer_weight - MAX_SLAB_WEIGHT
+        base_price = price_at_max_slab + extra_kgs * rate_per_extra_kg
 
-    return {
+    result = {
         "country_name": country_data["country"],
         "zone": "N/A", # Zone info is not in the new JSON structure
         "base_price": base_price,
         "rounded_weight": integer_weight,
-        "per_kg_rate": country_data.get("per_kg", 0)
+        "per_kg_rate": country_data["per_kg"] or 0
     }
+    quote_cache.put(cache_key, result)
+    return dict(result)
+
+def calculate_international_price_batch(rows):
+    """
+    Batch version of calculate_international_price. rows is a sequence of
+    (target_country, weight_in_kg) tuples; returns one result dict per row,
+    in order, each shaped like calculate_international_price's result.
+    """
+    rate_card = get_rate_card()
+    if rate_card is None:
+        return [{"error": "Could not load pricing data."} for _ in rows]
+
+    countries = rate_card["countries"]
+    results = [None] * len(rows)
+    positions, matched, weights = [], [], []
+
+    for position, (target_country, weight_in_kg) in enumerate(rows):
+        country_data = countries.get(target_country.strip().lower())
+        if not country_data:
+            results[position] = {"error": f"We do not offer services to {target_country.title()} at the moment."}
+            continue
+        if weight_in_kg <= 0:
+            results[position] = {"error": "Weight must be a positive number."}
+            continue
+        positions.append(position)
+        matched.append(country_data)
+        weights.append(weight_in_kg)
+
+    if not positions:
+        return results
+
+    country_rows = np.array([c["row"] for c in matched], dtype=np.intp)
+    integer_weights = np.ceil(np.array(weights, dtype=float))
+    slab_index = (np.minimum(integer_weights, MAX_SLAB_WEIGHT) - 1).astype(np.intp)
+
+    slab_prices = rate_card["slab_table"][country_rows, slab_index]
+    extended_prices = (
+        rate_card["slab_table"][country_rows, MAX_SLAB_WEIGHT - 1]
+        + (integer_weights - MAX_SLAB_WEIGHT) * rate_card["per_kg_table"][country_rows]
+    )
+    is_slab = integer_weights <= MAX_SLAB_WEIGHT
+    base_prices = np.where(is_slab, slab_prices, extended_prices)
+
+    for i, position in enumerate(positions):
+        country_data = matched[i]
+        integer_weight = int(integer_weights[i])
+        if np.isnan(base_prices[i]):
+            target_country = rows[position][0].title()
+            if is_slab[i]:
+                results[position] = {"error": f"Pricing not available for {integer_weight}kg to {target_country}."}
+            else:
+                results[position] = {"error": f"Extended pricing not available for {target_country}."}
+            continue
+        results[position] = {
+            "country_name": country_data["country"],
+            "zone": "N/A",
+            "base_price": float(base_prices[i]),
+            "rounded_weight": integer_weight,
+            "per_kg_rate": country_data["per_kg"] or 0
+        }
+    return results
@@ -0,0 +1,232 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Blueprints whose every endpoint must have an entry in QUERY_BUDGETS
+BUDGETED_BLUEPRINTS = ("auth", "shipments", "admin")
+
+# The most SQL statements each endpoint may issue per request, counted on
+# its most expensive path. Admin endpoints include the admin_required lookup.
+# Endpoints whose work is split into chunks (one transaction per chunk) have a
+# (per_request, per_chunk) pair instead, and report their chunks with
+# count_query_chunks(); a streamed response is checked once its body is read.
+QUERY_BUDGETS = {
+    "auth.signup": 2,
+    "auth.login": 1,
+
+    # The user, the shipment with its first tracking event, and an employee's
+    # debit with its ledger entry. Worst case +3: claiming a new shipment ID
+    # block, then compacting pending top-ups and retrying a refused debit.
+    "shipments.create_domestic_shipment": 6,
+    "shipments.create_international_shipment": 6,
+    # Per request: the user and the debit (+ compaction and retry); per chunk:
+    # an ID block and the shipment and tracking event inserts
+    "shipments.create_bulk_shipments": (4, 3),
+    "shipments.submit_payment": 3,
+    "shipments.get_user_shipments": 1,
+    # +1 for a shipment whose legacy JSONB history is not migrated yet
+    "shipments.get_shipment_detail": 4,
+    "shipments.get_user_payments": 2,
+    # The user, claiming the code, the top-up and the new balance
+    "shipments.redeem_balance_code": 4,
+    # The user, the day's totals, the page and the balance
+    "shipments.get_day_end_stats": 4,
+    "shipments.add_employee_saved_address": 3,
+    "shipments.get_employee_saved_addresses": 2,
+    "shipments.delete_employee_saved_address": 3,
+    "shipments.handle_customer_addresses": 3,
+    "shipments.handle_customer_address_item": 4,
+    "shipments.stream_user_shipment_events": 1,
+    "shipments.stream_shipment_events": 1,
+
+    "admin.create_invoice_from_payment": 3,
+    # Per request: the admin, the invoice owner and one ID block; per chunk:
+    # approving the matched payments and their shipments (5), the invoices
+    # (4) and reloading the owner after the previous chunk's commit
+    "admin.reconcile_bank_statement": (3, 10),
+    "admin.create_balance_code": 3,
+    "admin.get_balance_codes": 2,
+    "admin.delete_balance_code": 3,
+    # The admin and the page with its total. +1 for the total of a cursor page
+    # (?count=exact or ?count=estimate) or of a page past the end.
+    "admin.get_all_shipments": 3,
+    "admin.stream_all_shipment_events": 1,
+    # Per request: the admin and the query that finds no more ids; per chunk:
+    # the chunk's ids and the status update with its tracking events
+    "admin.bulk_update_shipment_status": (2, 2),
+    # The admin, the shipment, the status update with its tracking event and
+    # the history. +1 for a legacy JSONB history that is not migrated yet.
+    "admin.update_shipment_status": 5,
+    "admin.web_analytics": 3,
+    "admin.quote_cache_stats": 1,
+    "admin.shipment_cache_stats": 1,
+    "admin.get_payments": 2,
+    # The admin, the payment with its shipment, and the two updates and the
+    # tracking event of an approval
+    "admin.update_payment_status": 5,
+    # As admin.get_all_shipments; each user's totals come with the page
+    "admin.get_all_users": 3,
+    # The admin, the user, their shipments and their payments
+    "admin.get_user_details": 4,
+    "admin.create_employee": 4,
+    # As admin.get_all_users, with the balances
+    "admin.get_all_employees": 3,
+    "admin.update_employee": 4,
+    # The admin, the employee, the shipments the ORM deletes with them and the delete
+    "admin.delete_employee": 4,
+}
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when an endpoint or block issues more statements than its budget."""
+
+class QueryStats:
+    """
+    Statement count and database time of a request or query_budget() block.
+    Statements also count towards the enclosing stats (`parent`), so a test's
+    budget sees the statements of the requests it makes.
+    """
+
+    def __init__(self, parent=None):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.started = time.perf_counter()
+        self.parent = parent
+
+    def record(self, seconds):
+        stats = self
+        while stats is not None:
+            stats.statements += 1
+            stats.db_seconds += seconds
+            stats = stats.parent
+
+    def server_timing(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.statements} queries", '
+            f'total;dur={total_ms:.1f}'
+        )
+
+_current = ContextVar("query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(time.perf_counter() - started)
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+@contextmanager
+def query_budget(max_statements):
+    """
+    Counts the statements issued inside the block and raises
+    QueryBudgetExceeded if there were more than max_statements:
+
+        with query_budget(2):
+            client.get("/api/admin/shipments", headers=admin)
+    """
+    stats = QueryStats(parent=_current.get())
+    _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.set(stats.parent)
+    if stats.statements > max_statements:
+        raise QueryBudgetExceeded(f"{stats.statements} statements issued, budget is {max_statements}")
+
+def unbudgeted_endpoints(app):
+    """Endpoints of BUDGETED_BLUEPRINTS that have no QUERY_BUDGETS entry."""
+    return sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint.split(".")[0] in BUDGETED_BLUEPRINTS and rule.endpoint not in QUERY_BUDGETS
+    )
+
+def _start_request():
+    g.query_stats = QueryStats(parent=_current.get())
+    g.query_chunks = 0
+    _current.set(g.query_stats)
+
+def count_query_chunks(chunks=1):
+    """
+    Records that the current request worked through `chunks` more chunks, for
+    endpoints whose QUERY_BUDGETS entry is a (per_request, per_chunk) pair.
+    Does nothing outside a request.
+    """
+    if has_request_context() and "query_chunks" in g:
+        g.query_chunks += chunks
+
+def _request_budget(endpoint, chunks):
+    budget = QUERY_BUDGETS.get(endpoint)
+    if isinstance(budget, tuple):
+        per_request, per_chunk = budget
+        return per_request + per_chunk * chunks
+    return budget
+
+def _check_budget(app, endpoint, stats, chunks):
+    budget = _request_budget(endpoint, chunks)
+    if budget is not None and stats.statements > budget:
+        message = f"{endpoint} issued {stats.statements} SQL statements, budget is {budget}"
+        if app.config.get("QUERY_BUDGET_MODE") == "raise":
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+
+def _counted_stream(body, stats, finished):
+    # Counts the statements a streamed body issues as it is read, which is
+    # after the request has been torn down, and calls finished() at its end
+    body = iter(body)
+    try:
+        while True:
+            token = _current.set(stats)
+            try:
+                chunk = next(body)
+            except StopIteration:
+                break
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+    finished()
+
+def _finish_request(response):
+    stats = g.get("query_stats")
+    if stats is None:
+        return response
+    if current_app.config.get("SERVER_TIMING"):
+        response.headers["Server-Timing"] = stats.server_timing()
+
+    app, endpoint, request_g = current_app._get_current_object(), request.endpoint, g._get_current_object()
+    if response.is_streamed:
+        response.response = _counted_stream(
+            response.response, stats,
+            lambda: _check_budget(app, endpoint, stats, request_g.query_chunks),
+        )
+    else:
+        _check_budget(app, endpoint, stats, g.query_chunks)
+    return response
+
+def _end_request(exc=None):
+    stats = g.pop("query_stats", None)
+    if stats is not None:
+        _current.set(stats.parent)
+
+def init_query_stats(app):
+    """Counts each request's SQL statements and database time."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,60 @@
+
+import threading
+from collections import OrderedDict
+
+# Quotes are keyed on a small normalized tuple, so a few thousand entries
+# comfortably hold the hot (destination, mode, weight) combinations.
+QUOTE_CACHE_MAXSIZE = 4096
+
+class QuoteCache:
+    """
+    A bounded, thread-safe LRU cache for price quotes with hit/miss/eviction
+    counters. Keys are tuples like ("domestic", zone, mode, weight); values
+    are the pricing service's result dicts.
+    """
+
+    def __init__(self, maxsize=QUOTE_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        # Called when rate data changes; counters are kept for monitoring
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+# Shared by the domestic and international pricing services
+quote_cache = QuoteCache()
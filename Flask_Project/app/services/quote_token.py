@@ -0,0 +1,83 @@
+
+import hashlib
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from app.services.domestic_pricing_service import DOMESTIC_RATE_VERSION
+from app.services.pricing_service import international_rate_card_version
+
+QUOTE_TOKEN_SALT = "price-quote"
+
+# A quote must be booked within this many seconds of being issued
+QUOTE_TOKEN_MAX_AGE = 30 * 60
+
+class QuoteTokenError(ValueError):
+    """Raised when a quote token is invalid, expired or does not match the booking."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _serializer():
+    return URLSafeTimedSerializer(
+        current_app.config["SECRET_KEY"],
+        salt=QUOTE_TOKEN_SALT,
+        signer_kwargs={"digest_method": hashlib.sha256},
+    )
+
+def _rate_card_version(kind):
+    if kind == "domestic":
+        return DOMESTIC_RATE_VERSION
+    return international_rate_card_version()
+
+def _normalize(value):
+    return " ".join((value or "").split()).casefold()
+
+def _quote_inputs(kind, destination, mode, weight_kg):
+    # destination is a (state, city) pair for domestic quotes, a country name otherwise
+    if kind == "domestic":
+        destination = [_normalize(destination[0]), _normalize(destination[1])]
+    else:
+        destination = _normalize(destination)
+    return {"d": destination, "m": mode, "w": round(float(weight_kg), 3)}
+
+def issue_quote_token(kind, destination, mode, weight_kg, total_price):
+    """
+    Returns a signed, timestamped token recording the rate-card version,
+    the quote inputs and the GST-inclusive total that was quoted.
+    """
+    payload = {
+        "k": kind,
+        "v": _rate_card_version(kind),
+        "p": total_price,
+        **_quote_inputs(kind, destination, mode, weight_kg),
+    }
+    return _serializer().dumps(payload)
+
+def verify_quote_token(token, kind, destination, mode, weight_kg):
+    """
+    Checks a quote token against a booking and returns the quoted total.
+    Only the HMAC and the recorded inputs are checked; the price is not recomputed.
+    Raises QuoteTokenError if the token cannot be honoured.
+    """
+    if not token or not isinstance(token, str):
+        raise QuoteTokenError("A valid quote_token is required. Please calculate the price before booking.")
+
+    try:
+        payload = _serializer().loads(token, max_age=QUOTE_TOKEN_MAX_AGE)
+    except SignatureExpired:
+        raise QuoteTokenError("This quote has expired. Please re-calculate the price.")
+    except BadSignature:
+        raise QuoteTokenError("Invalid quote token.")
+
+    if payload.get("k") != kind:
+        raise QuoteTokenError("This quote was issued for a different shipment type.")
+    if payload.get("v") != _rate_card_version(kind):
+        raise QuoteTokenError("Rates have changed since this quote was issued. Please re-calculate the price.", 409)
+
+    expected = _quote_inputs(kind, destination, mode, weight_kg)
+    if any(payload.get(key) != value for key, value in expected.items()):
+        raise QuoteTokenError("Shipment details do not match the quoted destination, service or weight.")
+
+    return payload["p"]
@@ -0,0 +1,87 @@
+
+import os
+import pickle
+import threading
+from datetime import datetime
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.normpath(os.path.join(_BASE_DIR, '..', 'Data'))
+
+# The editable rate cards; the snapshot is compiled from these
+SOURCE_FILES = ("domestic.json", "dom_prices.json", "pricing.json")
+
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "rate_cards.snapshot")
+
+# Bump when the layout of the pickled snapshot changes
+SNAPSHOT_FORMAT = 1
+
+_loaded = {"mtime": None, "snapshot": None}
+_loaded_lock = threading.Lock()
+
+def source_path(filename):
+    return os.path.join(DATA_DIR, filename)
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def write_snapshot(domestic, international, path=SNAPSHOT_PATH):
+    """
+    Pickles the compiled domestic and international rate data, along with the
+    mtimes of the source files it was built from, and atomically replaces the
+    snapshot at `path`. Returns the snapshot dict that was written.
+    """
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "version": f"{domestic['rate_version']}-{international['version']}",
+        "created_at": datetime.utcnow().isoformat(),
+        "sources": {name: _mtime_ns(source_path(name)) for name in SOURCE_FILES},
+        "domestic": domestic,
+        "international": international,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return snapshot
+
+def _read_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (IOError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return snapshot
+
+def _is_stale(snapshot):
+    # A source edited after compiling makes the snapshot stale; the JSON wins
+    return any(
+        _mtime_ns(source_path(name)) != mtime
+        for name, mtime in snapshot.get("sources", {}).items()
+    )
+
+def snapshot_mtime():
+    return _mtime_ns(SNAPSHOT_PATH)
+
+def load_snapshot_section(name):
+    """
+    Returns the "domestic" or "international" section of the compiled
+    snapshot, or {} if there is no snapshot or it is older than its sources.
+    The file is unpickled once per snapshot mtime, so both pricing services
+    share one load.
+    """
+    mtime = snapshot_mtime()
+    if mtime is None:
+        return {}
+    with _loaded_lock:
+        if _loaded["mtime"] != mtime:
+            _loaded["snapshot"] = _read_snapshot(SNAPSHOT_PATH)
+            _loaded["mtime"] = mtime
+        snapshot = _loaded["snapshot"]
+    if not snapshot or _is_stale(snapshot):
+        return {}
+    return snapshot[name]
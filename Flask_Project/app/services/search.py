@@ -0,0 +1,54 @@
+import re
+
+from sqlalchemy import func
+
+from app.models import SHIPMENT_SEARCH_TEXT, USER_EMAIL_LOWER, USER_SEARCH_TEXT, Shipment
+
+# pg_trgm indexes can only serve patterns of at least one trigram; shorter
+# terms match the start of the email instead of becoming a sequential scan
+MIN_SEARCH_LENGTH = 3
+
+SHIPMENT_ID_PATTERN = re.compile(r"^SBC[0-9A-Z]{12}$", re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def _escape_like(q):
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _contains(document, q):
+    return document.ilike(f"%{_escape_like(q)}%", escape="\\")
+
+def _email_is(q):
+    return USER_EMAIL_LOWER == q.lower()
+
+def _email_starts_with(q):
+    return USER_EMAIL_LOWER.like(f"{_escape_like(q.lower())}%", escape="\\")
+
+def search_shipments(query, q):
+    """
+    Narrows an admin shipment query (joined to User) to the shipments matching
+    `q`. Returns (query, rank): rank orders the matches by relevance, or is
+    None when `q` was empty, an exact shipment ID or email lookup, or shorter
+    than MIN_SEARCH_LENGTH, in which case it matches the start of the
+    booker's email.
+    """
+    q = (q or "").strip()
+    if not q:
+        return query, None
+    if SHIPMENT_ID_PATTERN.match(q):
+        return query.filter(Shipment.shipment_id_str == q.upper()), None
+    if EMAIL_PATTERN.match(q):
+        return query.filter(_email_is(q)), None
+    if len(q) < MIN_SEARCH_LENGTH:
+        return query.filter(_email_starts_with(q)), None
+    return query.filter(_contains(SHIPMENT_SEARCH_TEXT, q)), func.word_similarity(q, SHIPMENT_SEARCH_TEXT)
+
+def search_users(query, q):
+    """As search_shipments, over users' names and emails."""
+    q = (q or "").strip()
+    if not q:
+        return query, None
+    if EMAIL_PATTERN.match(q):
+        return query.filter(_email_is(q)), None
+    if len(q) < MIN_SEARCH_LENGTH:
+        return query.filter(_email_starts_with(q)), None
+    return query.filter(_contains(USER_SEARCH_TEXT, q)), func.word_similarity(q, USER_SEARCH_TEXT)
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.status_events import status_broker
+
+# Public tracking links concentrate on recent shipments, so a couple of
+# thousand serialized details cover the hot set.
+SHIPMENT_DETAIL_CACHE_MAXSIZE = 2048
+
+# Entries are dropped after this long even if no invalidation arrives
+# (e.g. the "local" status events backend on a multi-worker deployment)
+SHIPMENT_DETAIL_CACHE_TTL = 300.0
+
+# How many recent invalidations are remembered to reject stale write-backs
+RECENT_INVALIDATIONS = 4096
+
+def detail_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+class ShipmentDetailCache:
+    """
+    A bounded, thread-safe LRU of serialized shipment details, keyed by
+    shipment_id_str. Values are (JSON bytes, strong ETag) pairs.
+
+    A reader takes epoch() before querying and passes it to put(); if the
+    shipment was invalidated in between, the now-stale body is not stored.
+    """
+
+    def __init__(self, maxsize=SHIPMENT_DETAIL_CACHE_MAXSIZE, ttl=SHIPMENT_DETAIL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._invalidated = OrderedDict()
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def epoch(self):
+        with self._lock:
+            return self._epoch
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[2] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, body, read_epoch):
+        """Stores `body` unless `key` was invalidated after `read_epoch`. Returns its ETag."""
+        etag = detail_etag(body)
+        with self._lock:
+            if self._invalidated.get(key, -1) > read_epoch:
+                return etag
+            self._entries[key] = (body, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, key):
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(key, None)
+            self._invalidated[key] = self._epoch
+            self._invalidated.move_to_end(key)
+            if len(self._invalidated) > RECENT_INVALIDATIONS:
+                self._invalidated.popitem(last=False)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+shipment_detail_cache = ShipmentDetailCache()
+
+def _invalidate_on_change(change):
+    # Status and payment changes arrive once they commit, from this worker
+    # directly and from the others through the status listener
+    shipment_detail_cache.invalidate(change["shipment_id_str"])
+
+status_broker.add_listener(_invalidate_on_change)
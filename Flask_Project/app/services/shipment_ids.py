@@ -0,0 +1,88 @@
+import hashlib
+import os
+import string
+import threading
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.models import SHIPMENT_ID_BLOCK_SEQ
+
+SHIPMENT_ID_PREFIX = "SBC"
+SHIPMENT_ID_ALPHABET = string.digits + string.ascii_uppercase
+SHIPMENT_ID_LENGTH = 12
+
+# Each process reserves this many IDs per round trip to the block sequence
+SHIPMENT_ID_BLOCK_SIZE = 1000
+
+# Serial numbers are permuted within 62 bits, which fits in 12 base-36 characters
+_HALF_BITS = 31
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_FEISTEL_ROUNDS = 4
+
+# The block currently being handed out by this process. "pid" catches a
+# block inherited across fork (gunicorn --preload), which the child must not reuse.
+_block = {"pid": None, "next": 0, "end": 0}
+_block_lock = threading.Lock()
+
+def _round_value(key, round_number, half):
+    digest = hashlib.blake2b(
+        half.to_bytes(4, "big"), digest_size=4, key=key, person=bytes([round_number]) * 16
+    ).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+def _permute(serial, key):
+    # A keyed Feistel network is a bijection on 62-bit integers, so distinct
+    # serials always give distinct IDs, while consecutive serials look unrelated
+    left, right = serial >> _HALF_BITS, serial & _HALF_MASK
+    for round_number in range(_FEISTEL_ROUNDS):
+        left, right = right, left ^ _round_value(key, round_number, right)
+    return (left << _HALF_BITS) | right
+
+def _encode(value):
+    chars = []
+    for _ in range(SHIPMENT_ID_LENGTH):
+        value, digit = divmod(value, len(SHIPMENT_ID_ALPHABET))
+        chars.append(SHIPMENT_ID_ALPHABET[digit])
+    return SHIPMENT_ID_PREFIX + "".join(reversed(chars))
+
+@lru_cache(maxsize=4)
+def _derive_key(id_key):
+    return hashlib.blake2b(id_key.encode(), digest_size=32, person=b"shipment-id".ljust(16, b"\0")).digest()
+
+def _id_key():
+    # Not SECRET_KEY, which may be rotated; SHIPMENT_ID_KEY never changes
+    return _derive_key(current_app.config["SHIPMENT_ID_KEY"])
+
+def _reserve_serials(session, count):
+    """
+    Returns `count` serial numbers no other process will ever receive. Serials
+    come from blocks of SHIPMENT_ID_BLOCK_SIZE claimed with nextval(), so most
+    calls need no database round trip at all.
+    """
+    serials = []
+    with _block_lock:
+        if _block["pid"] != os.getpid():
+            _block.update(pid=os.getpid(), next=0, end=0)
+        while len(serials) < count:
+            if _block["next"] >= _block["end"]:
+                block_number = session.execute(select(SHIPMENT_ID_BLOCK_SEQ.next_value())).scalar()
+                _block["next"] = block_number * SHIPMENT_ID_BLOCK_SIZE
+                _block["end"] = _block["next"] + SHIPMENT_ID_BLOCK_SIZE
+            take = min(count - len(serials), _block["end"] - _block["next"])
+            serials.extend(range(_block["next"], _block["next"] + take))
+            _block["next"] += take
+    return serials
+
+def allocate_shipment_id_strs(session, count):
+    """
+    Allocates `count` shipment IDs like SBC1A2B3C4D5E6. IDs are unique by
+    construction across workers and hosts, so they are not checked against
+    the shipments table; its unique index remains the safety net.
+    """
+    key = _id_key()
+    return [_encode(_permute(serial, key)) for serial in _reserve_serials(session, count)]
+
+def allocate_shipment_id_str(session):
+    return allocate_shipment_id_strs(session, 1)[0]
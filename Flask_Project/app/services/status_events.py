@@ -0,0 +1,240 @@
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import event, text
+
+from app.extensions import db
+
+# Postgres NOTIFY channel that carries status changes between workers
+STATUS_CHANNEL = "shipment_status"
+
+# "postgres" fans events out to every worker through LISTEN/NOTIFY;
+# "local" delivers them in-process only (a single worker)
+DEFAULT_STATUS_EVENTS_BACKEND = "postgres"
+
+# Events a slow subscriber may fall behind by before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Seconds between listener reconnect attempts after the connection drops
+LISTENER_RETRY_DELAY = 5.0
+
+# A comment line is sent this often so proxies don't drop an idle stream
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Streams end after this long, freeing the worker thread; EventSource reconnects
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+
+_SESSION_KEY = "status_events"
+
+class Subscription:
+    """
+    One stream's view of the status events: everything, one user's
+    shipments, or a single shipment.
+    """
+
+    def __init__(self, shipment_id_str=None, user_id=None):
+        self.shipment_id_str = shipment_id_str
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, change):
+        if self.shipment_id_str is not None and change.get("shipment_id_str") != self.shipment_id_str:
+            return False
+        if self.user_id is not None and change.get("user_id") != self.user_id:
+            return False
+        return True
+
+    def offer(self, change):
+        try:
+            self.events.put_nowait(change)
+        except queue.Full:
+            # Dropped events can't be replayed; the stream tells the client to refetch
+            self.overflowed = True
+
+class StatusBroker:
+    """
+    In-process pub/sub of shipment status changes, shared by every stream of
+    this worker. Listeners are callbacks (e.g. cache invalidation) run for
+    every change; subscriptions are the filtered queues behind the streams.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def notify_listeners(self, change):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(change)
+
+    def subscribe(self, shipment_id_str=None, user_id=None):
+        subscription = Subscription(shipment_id_str, user_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, change):
+        self.notify_listeners(change)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(change):
+                subscription.offer(change)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+status_broker = StatusBroker()
+
+def stream_status_events(subscription):
+    """
+    Yields a subscription's events in text/event-stream format until
+    STREAM_MAX_SECONDS pass or the client disconnects, then unsubscribes.
+    A "resync" event tells the client it missed events and should refetch.
+    """
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield "event: resync\ndata: {}\n\n"
+            try:
+                change = subscription.events.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {change.get('type', 'status')}\ndata: {json.dumps(change)}\n\n"
+    finally:
+        status_broker.unsubscribe(subscription)
+
+def status_event(shipment_id_str, user_id, status, location, activity, date):
+    return {
+        "type": "status",
+        "shipment_id_str": shipment_id_str,
+        "user_id": user_id,
+        "status": status,
+        "location": location or "",
+        "activity": activity or "",
+        "date": date.isoformat() if hasattr(date, "isoformat") else date,
+    }
+
+def payment_event(shipment_id_str, user_id, payment_status):
+    return {
+        "type": "payment",
+        "shipment_id_str": shipment_id_str,
+        "user_id": user_id,
+        "payment_status": payment_status,
+    }
+
+def publish_status_change(change):
+    """
+    Queues a status change on the current session. It is only published once
+    the session commits, so subscribers never see a change that was rolled back.
+    """
+    db.session.info.setdefault(_SESSION_KEY, []).append(change)
+
+def _backend(app):
+    return app.config.get("STATUS_EVENTS_BACKEND", DEFAULT_STATUS_EVENTS_BACKEND)
+
+def _notify_pending(session):
+    # One round trip NOTIFYs every change of the transaction; Postgres delivers
+    # them to the listeners (this worker's included) only if it commits
+    pending = session.info.get(_SESSION_KEY)
+    if pending:
+        session.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": STATUS_CHANNEL, "payloads": [json.dumps(e) for e in pending]},
+        )
+
+def _publish_pending(session):
+    for change in session.info.pop(_SESSION_KEY, []):
+        status_broker.publish(change)
+
+def _apply_pending_locally(session):
+    # The NOTIFY loops back to this worker's streams through its listener; local
+    # callbacks (cache invalidation) run now so this worker is never stale
+    for change in session.info.pop(_SESSION_KEY, []):
+        status_broker.notify_listeners(change)
+
+def _discard_pending(session, *args):
+    session.info.pop(_SESSION_KEY, None)
+
+_listener = {"pid": None, "thread": None}
+_listener_lock = threading.Lock()
+
+def _drain_notifications(connection):
+    # psycopg2 exposes notifications as a list filled by poll(); psycopg 3 as a generator
+    if isinstance(getattr(connection, "notifies", None), list):
+        if select.select([connection], [], [], LISTENER_RETRY_DELAY) != ([], [], []):
+            connection.poll()
+            while connection.notifies:
+                yield connection.notifies.pop(0).payload
+    else:
+        for notification in connection.notifies(timeout=LISTENER_RETRY_DELAY, stop_after=SUBSCRIBER_QUEUE_SIZE):
+            yield notification.payload
+
+def _listen_forever(app):
+    while True:
+        connection = None
+        try:
+            with app.app_context():
+                raw = db.engine.raw_connection()
+            raw.detach()  # LISTEN holds the connection for good; keep it out of the pool
+            connection = raw.driver_connection
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {STATUS_CHANNEL}")
+            while True:
+                for payload in _drain_notifications(connection):
+                    status_broker.publish(json.loads(payload))
+        except Exception as e:
+            app.logger.warning("Shipment status listener disconnected: %s", e)
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            time.sleep(LISTENER_RETRY_DELAY)
+
+def ensure_status_listener(app):
+    """
+    Starts this worker's LISTEN thread the first time a stream subscribes
+    (and again after a fork), when the postgres backend is in use.
+    """
+    if _backend(app) != "postgres":
+        return
+    with _listener_lock:
+        if _listener["pid"] == os.getpid() and _listener["thread"].is_alive():
+            return
+        thread = threading.Thread(target=_listen_forever, args=(app,), name="shipment-status-listener", daemon=True)
+        thread.start()
+        _listener.update(pid=os.getpid(), thread=thread)
+
+def init_status_events(app):
+    """Hooks status publishing into the session's commit and rollback."""
+    backend = _backend(app)
+    if backend == "postgres":
+        event.listen(db.session, "before_commit", _notify_pending)
+        event.listen(db.session, "after_commit", _apply_pending_locally)
+    else:
+        event.listen(db.session, "after_commit", _publish_pending)
+    event.listen(db.session, "after_rollback", _discard_pending)
+    event.listen(db.session, "after_soft_rollback", _discard_pending)
@@ -0,0 +1,150 @@
+from datetime import datetime
+
+from sqlalchemy import Integer, any_, bindparam, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.extensions import db
+from app.models import Shipment, TrackingEvent
+from app.services.status_events import publish_status_change, status_event
+
+def tracking_entry(event):
+    # The same shape as the entries of the legacy tracking_history JSONB
+    return {
+        "stage": event.stage,
+        "date": event.created_at.isoformat(),
+        "location": event.location,
+        "activity": event.activity,
+    }
+
+def add_tracking_event(shipment, stage, location, activity, created_at=None):
+    """
+    Appends one event to a shipment's history as a single-row insert and
+    publishes the status change. Works for shipments that are not flushed
+    yet, without loading their history.
+    """
+    event = TrackingEvent(
+        stage=stage,
+        location=location or "",
+        activity=activity or "",
+        created_at=created_at or datetime.utcnow(),
+    )
+    if shipment.id is None:
+        event.shipment = shipment
+    else:
+        event.shipment_id = shipment.id
+    db.session.add(event)
+    publish_status_change(status_event(
+        shipment.shipment_id_str, shipment.user_id, event.stage, event.location, event.activity, event.created_at
+    ))
+    return event
+
+def add_tracking_events(rows):
+    """
+    Inserts many events with one executemany. Each row is a dict with
+    shipment_id, shipment_id_str, user_id, stage, location, activity and
+    optionally created_at; shipment_id_str and user_id address the
+    published status change.
+    """
+    if not rows:
+        return
+    now = datetime.utcnow()
+    values = [
+        {
+            "shipment_id": row["shipment_id"],
+            "stage": row["stage"],
+            "location": row.get("location") or "",
+            "activity": row.get("activity") or "",
+            "created_at": row.get("created_at") or now,
+        }
+        for row in rows
+    ]
+    db.session.execute(insert(TrackingEvent), values)
+    for row, value in zip(rows, values):
+        publish_status_change(status_event(
+            row["shipment_id_str"], row["user_id"], value["stage"], value["location"], value["activity"], value["created_at"]
+        ))
+
+def insert_shipment_with_event(values, stage, location, activity, created_at=None):
+    """
+    Inserts a shipment from its column values and the first event of its
+    history in one statement:
+
+        WITH shipment AS (INSERT INTO shipments ... RETURNING id),
+             event AS (INSERT INTO tracking_events ... SELECT ... FROM shipment)
+        SELECT id FROM shipment
+
+    then publishes the status change. Returns the new shipment's id and the
+    event as a history entry. The caller commits.
+    """
+    created_at = created_at or datetime.utcnow()
+    location = location or ""
+    shipment = insert(Shipment).values(**values).returning(Shipment.id).cte("shipment")
+    events = select(shipment.c.id, literal(stage), literal(location), literal(activity or ""), literal(created_at))
+    inserted = (
+        insert(TrackingEvent)
+        .from_select(["shipment_id", "stage", "location", "activity", "created_at"], events)
+        .returning(TrackingEvent.id)
+        .cte("event")
+    )
+    shipment_id = db.session.execute(select(shipment.c.id).add_cte(inserted)).scalar_one()
+    publish_status_change(status_event(values["shipment_id_str"], values["user_id"], stage, location, activity, created_at))
+    return shipment_id, tracking_entry(TrackingEvent(stage=stage, location=location, activity=activity or "", created_at=created_at))
+
+def shipment_tracking_history(shipment):
+    """
+    Returns a shipment's history, oldest first, from one indexed range scan of
+    tracking_events. Shipments whose legacy JSONB history has not been
+    migrated yet list those entries first; the JSONB column is deferred and
+    only loaded then.
+    """
+    history = [tracking_entry(event) for event in shipment.tracking_events]
+    if shipment.tracking_history_migrated:
+        return history
+    legacy = shipment.tracking_history if isinstance(shipment.tracking_history, list) else []
+    # Entries an earlier backfill already copied into tracking_events are not repeated
+    copied = {(entry["stage"], entry["date"], entry["activity"]) for entry in history}
+    legacy = [
+        entry for entry in legacy
+        if isinstance(entry, dict) and (entry.get("stage"), entry.get("date"), entry.get("activity")) not in copied
+    ]
+    return legacy + history
+
+def set_status_with_event(shipment_ids, status, location, activity, created_at=None):
+    """
+    Sets the status of a set of shipments and records the matching tracking
+    event for each, in one set-based statement:
+
+        WITH updated AS (UPDATE shipments ... WHERE id = ANY(:ids) RETURNING ...),
+             inserted AS (INSERT INTO tracking_events ... SELECT ... FROM updated)
+        SELECT shipment_id_str, user_id FROM updated
+
+    then publishes the status changes. Returns the number of shipments
+    updated. The caller commits.
+    """
+    created_at = created_at or datetime.utcnow()
+    updated = (
+        update(Shipment)
+        .where(Shipment.id == any_(bindparam("ids", list(shipment_ids), type_=ARRAY(Integer))))
+        .values(status=status)
+        .returning(Shipment.id, Shipment.shipment_id_str, Shipment.user_id)
+        .cte("updated")
+    )
+    events = select(
+        updated.c.id,
+        literal(status),
+        literal(location or ""),
+        literal(activity or ""),
+        literal(created_at),
+    )
+    inserted = (
+        insert(TrackingEvent)
+        .from_select(["shipment_id", "stage", "location", "activity", "created_at"], events)
+        .returning(TrackingEvent.id)
+        .cte("inserted")
+    )
+    rows = db.session.execute(
+        select(updated.c.shipment_id_str, updated.c.user_id).add_cte(inserted)
+    ).all()
+    for shipment_id_str, user_id in rows:
+        publish_status_change(status_event(shipment_id_str, user_id, status, location, activity, created_at))
+    return len(rows)
@@ -1,39 +1,71 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from app.models import Shipment, User, PaymentRequest, BalanceCode, SavedAddress
 from app.extensions import db
-from app.schemas import ShipmentCreateSchema, PaymentSubmitSchema, SavedAddressSchema
-from app.utils import generate_shipment_id_str
+from app.schemas import ShipmentCreateSchema, BulkShipmentRowSchema, PaymentSubmitSchema, SavedAddressSchema
+from app.serializers import EMPLOYEE_SHIPMENT, PAYMENT, SAVED_ADDRESS, SHIPMENT_DETAIL, SHIPMENT_SUMMARY
+from app.services.shipment_ids import SHIPMENT_ID_BLOCK_SIZE, allocate_shipment_id_str, allocate_shipment_id_strs
+from app.services.quote_token import QuoteTokenError, verify_quote_token
+from app.services.tracking import add_tracking_events, insert_shipment_with_event, shipment_tracking_history
+from app.services.status_events import (
+    ensure_status_listener, payment_event, publish_status_change, status_broker, stream_status_events
+)
+from app.services.shipment_detail_cache import shipment_detail_cache
+from app.services.balance_ledger import InsufficientBalance, available_balance, credit_balance, debit_balance
+from app.services.analytics_rollups import local_today, parse_day_range, utc_bounds
+from app.services.pagination import DEFAULT_PAGE_SIZE, MAX_CURSOR_PAGE_SIZE, InvalidCursor, keyset_page
+from app.services.query_stats import count_query_chunks
+from app.services.domestic_pricing_service import calculate_domestic_price_batch
+from app.services.pricing_service import calculate_international_price_batch
+from app.domestic.routes import MODE_MAP
 from datetime import datetime
-from sqlalchemy import func, exc
+from sqlalchemy import func, exc, insert, update
 from decimal import Decimal
+import math
 
 shipments_bp = Blueprint("shipments", __name__, url_prefix="/api")
 
-def _create_shipment_record(user, shipment_data, final_total_price):
+MAX_BULK_BOOKING_ROWS = 5000
+
+# A bulk booking's query budget grows per chunk of this many rows: each chunk
+# may claim a shipment ID block and adds a page to each multi-row INSERT
+BULK_BOOKING_CHUNK_SIZE = SHIPMENT_ID_BLOCK_SIZE
+
+# Longest window the employee day-end stats aggregate over
+MAX_DAY_END_RANGE_DAYS = 366
+
+def _verify_quoted_price(shipment_data, kind, final_total_price):
+    """
+    Checks the booking against the signed quote from the price endpoint, so the
+    client-supplied total can be trusted without re-running the pricing path.
+    Returns an error response tuple, or None if the quote is valid.
+    """
+    if kind == "domestic":
+        destination = (shipment_data["receiver_address_state"], shipment_data["receiver_address_city"])
+        mode = shipment_data.get("service_type")
+    else:
+        destination = shipment_data["receiver_address_country"]
+        mode = None
+
+    try:
+        quoted_total = verify_quote_token(
+            shipment_data["quote_token"], kind, destination, mode, shipment_data["package_weight_kg"]
+        )
+    except QuoteTokenError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    if abs(quoted_total - final_total_price) > 0.005:
+        return jsonify({"error": "final_total_price_with_tax does not match the quoted price."}), 400
+    return None
+
+def _shipment_values(user, shipment_data, final_total_price, status, shipment_id_str):
+    """
+    Returns the Shipment column values for a validated booking. Pops "goods"
+    from shipment_data, so the remaining fields can be echoed back.
+    """
     price_without_tax = round(Decimal(str(final_total_price)) / Decimal('1.18'), 2)
     tax_amount = Decimal(str(final_total_price)) - price_without_tax
-    
-    status = "Pending Payment"
-    tracking_activity = "Shipment created. Awaiting payment confirmation."
 
-    if user.is_employee:
-        final_price_decimal = Decimal(str(final_total_price))
-        if user.balance >= final_price_decimal:
-            user.balance -= final_price_decimal
-            status = "Booked"
-            tracking_activity = "Shipment booked and paid with employee balance."
-        else:
-            return {"error": "Insufficient balance to book shipment."}, 402
-
-    now_iso = datetime.utcnow().isoformat()
-    tracking_history = [{
-        "stage": status,
-        "date": now_iso,
-        "location": shipment_data["sender_address_city"],
-        "activity": tracking_activity
-    }]
-    
     # Extract goods details before sanitizing the rest of the data
     goods_details = shipment_data.pop('goods', [])
 
@@ -44,38 +76,57 @@ def _create_shipment_record(user, shipment_data, final_total_price):
     if 'user_email' in model_data:
         del model_data['user_email']
 
-    new_shipment = Shipment(
-        user_id=user.id,
-        user_email=user.email,
-        shipment_id_str=generate_shipment_id_str(db.session, Shipment),
-        status=status,
-        tracking_history=tracking_history,
-        price_without_tax=price_without_tax,
-        tax_amount_18_percent=tax_amount,
-        total_with_tax_18_percent=final_total_price,
-        goods_details=goods_details, # Correctly assign goods_details
+    return {
+        "user_id": user.id,
+        "user_email": user.email,
+        "shipment_id_str": shipment_id_str,
+        "status": status,
+        "price_without_tax": price_without_tax,
+        "tax_amount_18_percent": tax_amount,
+        "total_with_tax_18_percent": final_total_price,
+        "goods_details": goods_details, # Correctly assign goods_details
         **model_data
+    }
+
+def _create_shipment_record(user, shipment_data, final_total_price):
+    status = "Pending Payment"
+    tracking_activity = "Shipment created. Awaiting payment confirmation."
+
+    if user.is_employee:
+        status = "Booked"
+        tracking_activity = "Shipment booked and paid with employee balance."
+
+    values = _shipment_values(user, shipment_data, final_total_price, status, allocate_shipment_id_str(db.session))
+    shipment_id, first_event = insert_shipment_with_event(
+        values, status, shipment_data["sender_address_city"], tracking_activity
     )
-    db.session.add(new_shipment)
-    db.session.commit()
-    
-    shipment_data['pickup_date'] = shipment_data['pickup_date'].isoformat()
 
-    return {
+    if user.is_employee:
+        try:
+            debit_balance(user.id, Decimal(str(final_total_price)), reference=values["shipment_id_str"])
+        except InsufficientBalance as e:
+            db.session.rollback()
+            return {"error": str(e)}, 402
+
+    shipment_data['pickup_date'] = shipment_data['pickup_date'].isoformat()
+    response = {
         "message": "Shipment initiated successfully." if status == "Booked" else "Shipment initiated successfully. Please complete payment.",
         "data": {
             **shipment_data,
-            "id": new_shipment.id,
-            "user_email": new_shipment.user_email,
-            "shipment_id_str": new_shipment.shipment_id_str,
-            "price_without_tax": float(new_shipment.price_without_tax),
-            "tax_amount_18_percent": float(new_shipment.tax_amount_18_percent),
-            "total_with_tax_18_percent": float(new_shipment.total_with_tax_18_percent),
-            "status": new_shipment.status,
-            "tracking_history": new_shipment.tracking_history,
-            "goods_details": new_shipment.goods_details,
+            "id": shipment_id,
+            "user_email": values["user_email"],
+            "shipment_id_str": values["shipment_id_str"],
+            "price_without_tax": float(values["price_without_tax"]),
+            "tax_amount_18_percent": float(values["tax_amount_18_percent"]),
+            "total_with_tax_18_percent": float(values["total_with_tax_18_percent"]),
+            "status": status,
+            "tracking_history": [first_event],
+            "goods_details": values["goods_details"],
         }
-    }, 201
+    }
+
+    db.session.commit()
+    return response, 201
 
 
 @shipments_bp.route("/shipments/domestic", methods=["POST"])
@@ -101,6 +152,10 @@ def create_domestic_shipment():
         shipment_data = schema.load(data)
     except Exception as e:
         return jsonify({"error": "Invalid shipment details", "details": e.messages}), 400
+
+    quote_error = _verify_quoted_price(shipment_data, "domestic", final_total_price)
+    if quote_error:
+        return quote_error
     
     response, status_code = _create_shipment_record(user, shipment_data, final_total_price)
     return jsonify(response), status_code
@@ -128,10 +183,188 @@ def create_international_shipment():
     except Exception as e:
         return jsonify({"error": "Invalid shipment details", "details": e.messages}), 400
 
+    quote_error = _verify_quoted_price(shipment_data, "international", final_total_price)
+    if quote_error:
+        return quote_error
+
     response, status_code = _create_shipment_record(user, shipment_data, final_total_price)
     return jsonify(response), status_code
 
 
+def _load_bulk_row(schema, row, user):
+    """
+    Validates one manifest row. Returns (kind, shipment_data) or raises
+    ValueError with a message (and marshmallow messages, if any) as its args.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Each shipment must be an object.")
+
+    kind = row.get("shipmentType")
+    if kind not in ("domestic", "international"):
+        raise ValueError("shipmentType must be 'domestic' or 'international'.")
+
+    row = {**row, "user_email": user.email}
+    if kind == "domestic":
+        row["receiver_address_country"] = "India"
+
+    try:
+        shipment_data = schema.load(row)
+    except Exception as e:
+        raise ValueError("Invalid shipment details", e.messages)
+
+    # The batch pricers must never see a weight they would clip into a band
+    if not math.isfinite(shipment_data["package_weight_kg"]):
+        raise ValueError("Weight must be a positive number.")
+
+    if kind == "domestic" and shipment_data.get("service_type") not in MODE_MAP:
+        raise ValueError(f"service_type must be one of: {', '.join(MODE_MAP)}.")
+    if not shipment_data.get("service_type"):
+        # One NULL would fail the whole multi-row insert
+        raise ValueError("service_type is required.")
+    return kind, shipment_data
+
+def _price_bulk_rows(loaded):
+    """
+    Prices the valid (index, kind, shipment_data) rows with the batch pricers
+    and returns {index: GST-inclusive total or {"error": ...}}.
+    """
+    domestic = [(i, d) for i, kind, d in loaded if kind == "domestic"]
+    international = [(i, d) for i, kind, d in loaded if kind == "international"]
+    totals = {}
+
+    domestic_results = calculate_domestic_price_batch([
+        (d["receiver_address_state"], d["receiver_address_city"], MODE_MAP[d["service_type"]], d["package_weight_kg"])
+        for _, d in domestic
+    ])
+    for (i, _), result in zip(domestic, domestic_results):
+        totals[i] = result if "error" in result else round(result["price"] * 1.18, 2)
+
+    international_results = calculate_international_price_batch([
+        (d["receiver_address_country"].strip().lower(), d["package_weight_kg"])
+        for _, d in international
+    ])
+    for (i, _), result in zip(international, international_results):
+        totals[i] = result if "error" in result else round(result["base_price"] * 1.18, 2)
+
+    return totals
+
+@shipments_bp.route("/shipments/bulk", methods=["POST"])
+def create_bulk_shipments():
+    """
+    Books a manifest of shipments for one user in a single transaction.
+    Every row is validated and re-priced on the server; valid rows are
+    inserted together and employees are debited once for the batch total.
+    Rows that fail are reported by index and not booked.
+    """
+    data = request.get_json(silent=True) or {}
+
+    user_email_from_payload = data.get("user_email")
+    if not user_email_from_payload:
+        return jsonify({"error": "user_email is a required field"}), 400
+
+    rows = data.get("shipments")
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "A non-empty array of shipments is required."}), 400
+    if len(rows) > MAX_BULK_BOOKING_ROWS:
+        return jsonify({"error": f"A batch may contain at most {MAX_BULK_BOOKING_ROWS} shipments."}), 400
+
+    user = User.query.filter_by(email=user_email_from_payload).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    schema = BulkShipmentRowSchema()
+    results = [None] * len(rows)
+    loaded = []
+    for index, row in enumerate(rows):
+        try:
+            kind, shipment_data = _load_bulk_row(schema, row, user)
+        except ValueError as e:
+            results[index] = {"index": index, "error": e.args[0]}
+            if len(e.args) > 1:
+                results[index]["details"] = e.args[1]
+            continue
+        loaded.append((index, kind, shipment_data))
+
+    totals = _price_bulk_rows(loaded)
+    bookable = []
+    for index, kind, shipment_data in loaded:
+        total = totals[index]
+        if isinstance(total, dict):
+            results[index] = {"index": index, **total}
+            continue
+        claimed_total = shipment_data.get("final_total_price_with_tax")
+        if claimed_total is not None and abs(claimed_total - total) > 0.005:
+            results[index] = {"index": index, "error": "final_total_price_with_tax does not match the current price."}
+            continue
+        bookable.append((index, shipment_data, total))
+
+    error_count = len(rows) - len(bookable)
+    if not bookable:
+        return jsonify({"results": results, "count": len(rows), "booked_count": 0, "error_count": error_count}), 400
+
+    batch_total = sum(Decimal(str(total)) for _, _, total in bookable)
+    status = "Pending Payment"
+    tracking_activity = "Shipment created. Awaiting payment confirmation."
+
+    try:
+        if user.is_employee:
+            status = "Booked"
+            tracking_activity = "Shipment booked and paid with employee balance."
+
+        count_query_chunks(math.ceil(len(bookable) / BULK_BOOKING_CHUNK_SIZE))
+        shipment_ids = allocate_shipment_id_strs(db.session, len(bookable))
+        values = [
+            _shipment_values(user, shipment_data, total, status, shipment_id_str)
+            for (_, shipment_data, total), shipment_id_str in zip(bookable, shipment_ids)
+        ]
+        inserted = db.session.execute(
+            insert(Shipment).returning(Shipment.id, Shipment.shipment_id_str, sort_by_parameter_order=True),
+            values,
+        ).all()
+        add_tracking_events([
+            {
+                "shipment_id": shipment_id,
+                "shipment_id_str": shipment_id_str,
+                "user_id": user.id,
+                "stage": status,
+                "location": shipment_data["sender_address_city"],
+                "activity": tracking_activity,
+            }
+            for (_, shipment_data, _), (shipment_id, shipment_id_str) in zip(bookable, inserted)
+        ])
+        if user.is_employee:
+            debit_balance(user.id, batch_total, reference=f"{shipment_ids[0]} (+{len(shipment_ids) - 1})")
+        db.session.commit()
+    except InsufficientBalance as e:
+        db.session.rollback()
+        return jsonify({
+            "error": str(e),
+            "batch_total": float(batch_total),
+            "results": results,
+        }), 402
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+    for (index, _, total), (shipment_id, shipment_id_str) in zip(bookable, inserted):
+        results[index] = {
+            "index": index,
+            "id": shipment_id,
+            "shipment_id_str": shipment_id_str,
+            "total_with_tax_18_percent": total,
+            "status": status,
+        }
+
+    return jsonify({
+        "message": "Shipments booked successfully." if status == "Booked" else "Shipments initiated successfully. Please complete payment.",
+        "results": results,
+        "count": len(rows),
+        "booked_count": len(bookable),
+        "error_count": error_count,
+        "batch_total": float(batch_total),
+    }), 201
+
+
 @shipments_bp.route("/payments", methods=["POST"])
 def submit_payment():
     schema = PaymentSubmitSchema()
@@ -161,12 +394,15 @@ def submit_payment():
         status='Pending'
     )
     db.session.add(new_payment_request)
+    publish_status_change(payment_event(shipment.shipment_id_str, shipment.user_id, new_payment_request.status))
+    db.session.flush()
+    payment_id, payment_status = new_payment_request.id, new_payment_request.status
     db.session.commit()
 
     return jsonify({
         "message": "Payment submitted for review successfully.",
-        "payment_id": new_payment_request.id,
-        "status": new_payment_request.status
+        "payment_id": payment_id,
+        "status": payment_status
     }), 201
 
 @shipments_bp.route("/shipments", methods=["GET"])
@@ -198,64 +434,84 @@ def get_user_shipments():
     if status and status.lower() != 'all':
         query = query.filter(Shipment.status == status)
 
-    shipments = query.order_by(Shipment.booking_date.desc()).all()
-
-    result = []
-    for s in shipments:
-        result.append({
-            "id": s.id,
-            "shipment_id_str": s.shipment_id_str,
-            "sender_name": s.sender_name,
-            "receiver_name": s.receiver_name,
-            "service_type": s.service_type,
-            "booking_date": s.booking_date.isoformat(),
-            "status": s.status,
-            "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
-        })
-    return jsonify(result), 200
+    shipments = query.with_entities(*SHIPMENT_SUMMARY.columns(Shipment)).order_by(Shipment.booking_date.desc()).all()
+    return jsonify(SHIPMENT_SUMMARY.dump_many(shipments)), 200
+
+def _status_stream_response(subscription):
+    ensure_status_listener(current_app._get_current_object())
+    return Response(
+        stream_status_events(subscription),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@shipments_bp.route("/shipments/events", methods=["GET"])
+def stream_user_shipment_events():
+    """Server-sent status changes for every shipment of the user in ?email=."""
+    user_email = request.args.get("email")
+    if not user_email:
+        return jsonify({"error": "Missing email parameter"}), 400
+
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    user_id = user.id
+    db.session.remove()  # Don't hold a pooled connection for the life of the stream
+
+    return _status_stream_response(status_broker.subscribe(user_id=user_id))
+
+@shipments_bp.route("/shipments/<shipment_id_str>/events", methods=["GET"])
+def stream_shipment_events(shipment_id_str):
+    """Server-sent status changes for one shipment, replacing polling of its detail."""
+    exists = db.session.query(Shipment.id).filter_by(shipment_id_str=shipment_id_str).first()
+    if not exists:
+        return jsonify({"error": "Shipment not found"}), 404
+    db.session.remove()
+
+    return _status_stream_response(status_broker.subscribe(shipment_id_str=shipment_id_str))
 
 @shipments_bp.route("/shipments/<shipment_id_str>", methods=["GET"])
 def get_shipment_detail(shipment_id_str):
-    shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).first()
+    """
+    Serves the shipment from the detail cache when possible, with a strong
+    ETag; a matching If-None-Match is answered 304 without touching the database.
+    """
+    # Other workers' changes reach this worker's cache through the status listener
+    ensure_status_listener(current_app._get_current_object())
+
+    cached = shipment_detail_cache.get(shipment_id_str)
+    if cached is None:
+        read_epoch = shipment_detail_cache.epoch()
+        detail = _shipment_detail(shipment_id_str)
+        if detail is None:
+            return jsonify({"error": "Shipment not found"}), 404
+        body = current_app.json.dumps_bytes(detail)
+        etag = shipment_detail_cache.put(shipment_id_str, body, read_epoch)
+    else:
+        body, etag = cached
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def _shipment_detail(shipment_id_str):
+    shipment = Shipment.query.options(db.undefer(Shipment.goods_details)).filter_by(shipment_id_str=shipment_id_str).first()
     if not shipment:
-        return jsonify({"error": "Shipment not found"}), 404
+        return None
 
     # Check for an associated payment request
     payment_request = PaymentRequest.query.filter_by(shipment_id=shipment.id).first()
     payment_status = payment_request.status if payment_request else None
 
-    return jsonify({
-        "id": shipment.id,
-        "shipment_id_str": shipment.shipment_id_str,
-        "sender_name": shipment.sender_name,
-        "sender_address_street": shipment.sender_address_street,
-        "sender_address_city": shipment.sender_address_city,
-        "sender_address_state": shipment.sender_address_state,
-        "sender_address_pincode": shipment.sender_address_pincode,
-        "sender_address_country": shipment.sender_address_country,
-        "sender_phone": shipment.sender_phone,
-        "user_email": shipment.user_email,
-        "receiver_name": shipment.receiver_name,
-        "receiver_address_street": shipment.receiver_address_street,
-        "receiver_address_city": shipment.receiver_address_city,
-        "receiver_address_state": shipment.receiver_address_state,
-        "receiver_address_pincode": shipment.receiver_address_pincode,
-        "receiver_address_country": shipment.receiver_address_country,
-        "receiver_phone": shipment.receiver_phone,
-        "package_weight_kg": float(shipment.package_weight_kg),
-        "package_length_cm": float(shipment.package_length_cm),
-        "package_width_cm": float(shipment.package_width_cm),
-        "package_height_cm": float(shipment.package_height_cm),
-        "booking_date": shipment.booking_date.isoformat(),
-        "service_type": shipment.service_type,
-        "status": shipment.status,
-        "price_without_tax": float(shipment.price_without_tax),
-        "tax_amount_18_percent": float(shipment.tax_amount_18_percent),
-        "total_with_tax_18_percent": float(shipment.total_with_tax_18_percent),
-        "tracking_history": shipment.tracking_history,
-        "payment_status": payment_status,
-        "goods_details": shipment.goods_details,
-    }), 200
+    return SHIPMENT_DETAIL.dump(
+        shipment,
+        tracking_history=shipment_tracking_history(shipment),
+        payment_status=payment_status,
+    )
 
 @shipments_bp.route("/user/payments", methods=["GET"])
 def get_user_payments():
@@ -276,16 +532,7 @@ def get_user_payments():
         PaymentRequest.user_id == user.id
     ).order_by(PaymentRequest.created_at.desc()).all()
 
-    result = []
-    for payment, shipment_id_str in payments:
-        result.append({
-            "id": payment.id,
-            "shipment_id_str": shipment_id_str,
-            "amount": float(payment.amount),
-            "utr": payment.utr,
-            "status": payment.status,
-            "created_at": payment.created_at.isoformat()
-        })
+    result = [PAYMENT.dump(payment, shipment_id_str=shipment_id_str) for payment, shipment_id_str in payments]
     return jsonify(result), 200
 
 @shipments_bp.route("/employee/redeem-code", methods=["POST"])
@@ -301,22 +548,29 @@ def redeem_balance_code():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    balance_code = BalanceCode.query.filter_by(code=code).first()
-    if not balance_code:
-        return jsonify({"error": "Invalid code"}), 404
-    if balance_code.is_redeemed:
+    # Claim the code atomically, so two terminals can't both redeem it. The
+    # UPDATE also reads the amount; only a failed claim looks up why
+    amount = db.session.execute(
+        update(BalanceCode)
+        .where(BalanceCode.code == code, BalanceCode.is_redeemed == False)
+        .values(is_redeemed=True, redeemed_at=datetime.utcnow(), redeemed_by_user_id=user.id)
+        .returning(BalanceCode.amount),
+        execution_options={"synchronize_session": False},
+    ).scalar_one_or_none()
+    if amount is None:
+        db.session.rollback()
+        if not db.session.query(BalanceCode.query.filter_by(code=code).exists()).scalar():
+            return jsonify({"error": "Invalid code"}), 404
         return jsonify({"error": "This code has already been redeemed"}), 409
 
-    user.balance = (user.balance or 0) + balance_code.amount
-    balance_code.is_redeemed = True
-    balance_code.redeemed_at = datetime.utcnow()
-    balance_code.redeemed_by_user_id = user.id
-
+    # Read before committing, which would expire it
+    user_id = user.id
+    credit_balance(user_id, amount, reference=code)
     db.session.commit()
 
     return jsonify({
-        "message": f"Successfully redeemed code. Amount added: ₹{float(balance_code.amount)}",
-        "new_balance": float(user.balance)
+        "message": f"Successfully redeemed code. Amount added: ₹{float(amount)}",
+        "new_balance": float(available_balance(user_id))
     }), 200
 
 @shipments_bp.route('/employee/day-end-stats', methods=['GET'])
@@ -329,33 +583,45 @@ def get_day_end_stats():
     if not user or not user.is_employee:
         return jsonify({"error": "Employee not found or not authorized"}), 403
 
-    # Base query for all shipments by the user
-    all_shipments_query = Shipment.query.filter(
-        Shipment.user_id == user.id
-    )
-    
-    # Calculate stats
-    total_shipments_count = all_shipments_query.count()
-    total_shipments_value = all_shipments_query.with_entities(
-        func.sum(Shipment.total_with_tax_18_percent)
-    ).scalar() or 0
-    
-    # Get shipments for the table
-    all_shipments_list = all_shipments_query.order_by(Shipment.booking_date.desc()).all()
-    shipments_result = [{
-        "id": s.id,
-        "shipment_id_str": s.shipment_id_str,
-        "receiver_name": s.receiver_name,
-        "status": s.status,
-        "total_with_tax_18_percent": float(s.total_with_tax_18_percent)
-    } for s in all_shipments_list]
-
+    # Shipments booked between ?from= and ?to= (IST days, default today)
+    try:
+        start, end = parse_day_range(request.args, default=local_today())
+        if (end - start).days >= MAX_DAY_END_RANGE_DAYS:
+            raise ValueError(f"The date range may span at most {MAX_DAY_END_RANGE_DAYS} days")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    limit = min(max(1, limit), MAX_CURSOR_PAGE_SIZE)
+    lower, upper = utc_bounds(start, end)
+    in_range = (Shipment.user_id == user.id, Shipment.booking_date >= lower, Shipment.booking_date < upper)
+
+    # Count, value and per-status breakdown in one pass
+    by_status = {
+        status: {"count": count, "value": float(value)}
+        for status, count, value in db.session.query(
+            Shipment.status, func.count(), func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0)
+        ).filter(*in_range).group_by(Shipment.status)
+    }
+
+    # The shipment table, newest first, a page at a time (?cursor=, ?limit=)
+    try:
+        rows, next_cursor, prev_cursor = keyset_page(
+            Shipment.query.filter(*in_range).with_entities(*EMPLOYEE_SHIPMENT.columns(Shipment)),
+            Shipment.booking_date, Shipment.id, request.args.get("cursor"), limit,
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
 
     return jsonify({
-        "current_balance": float(user.balance),
-        "total_shipments_count": total_shipments_count,
-        "total_shipments_value": float(total_shipments_value),
-        "all_shipments": shipments_result,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "current_balance": float(available_balance(user.id)),
+        "total_shipments_count": sum(s["count"] for s in by_status.values()),
+        "total_shipments_value": sum(s["value"] for s in by_status.values()),
+        "by_status": by_status,
+        "all_shipments": EMPLOYEE_SHIPMENT.dump_many(rows),
+        "nextCursor": next_cursor,
+        "prevCursor": prev_cursor,
     }), 200
 
 
@@ -387,7 +653,7 @@ def add_employee_saved_address():
         db.session.rollback()
         return jsonify({"error": "Could not save address.", "details": str(e)}), 500
 
-    return jsonify(schema.dump(new_address)), 201
+    return jsonify(SAVED_ADDRESS.dump(new_address)), 201
 
 @shipments_bp.route("/employee/addresses", methods=["GET"])
 def get_employee_saved_addresses():
@@ -406,8 +672,7 @@ def get_employee_saved_addresses():
         query = query.filter_by(address_type=address_type)
     
     addresses = query.order_by(SavedAddress.nickname).all()
-    schema = SavedAddressSchema(many=True)
-    return jsonify(schema.dump(addresses)), 200
+    return jsonify(SAVED_ADDRESS.dump_many(addresses)), 200
 
 @shipments_bp.route("/employee/addresses/<int:address_id>", methods=["DELETE"])
 def delete_employee_saved_address(address_id):
@@ -451,7 +716,7 @@ def handle_customer_addresses():
         except exc.IntegrityError:
             db.session.rollback()
             return jsonify({"error": f"An address with the nickname '{address_data['nickname']}' already exists."}), 409
-        return jsonify(schema.dump(new_address)), 201
+        return jsonify(SAVED_ADDRESS.dump(new_address)), 201
     
     if request.method == 'GET':
         address_type = request.args.get('type')
@@ -459,8 +724,7 @@ def handle_customer_addresses():
         if address_type in ['sender', 'receiver']:
             query = query.filter_by(address_type=address_type)
         addresses = query.order_by(SavedAddress.nickname).all()
-        schema = SavedAddressSchema(many=True)
-        return jsonify(schema.dump(addresses)), 200
+        return jsonify(SAVED_ADDRESS.dump_many(addresses)), 200
 
 @shipments_bp.route("/customer/addresses/<int:address_id>", methods=["PUT", "DELETE"])
 def handle_customer_address_item(address_id):
@@ -488,7 +752,7 @@ def handle_customer_address_item(address_id):
         except exc.IntegrityError:
             db.session.rollback()
             return jsonify({"error": f"An address with the nickname '{address_data['nickname']}' already exists."}), 409
-        return jsonify(schema.dump(address)), 200
+        return jsonify(SAVED_ADDRESS.dump(address)), 200
 
     if request.method == 'DELETE':
         db.session.delete(address)
@@ -1,18 +1,30 @@
 
-import random
-import string
+import json
 
-def generate_shipment_id_str(session, ShipmentModel):
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+def load_batch_rows(req, max_rows):
     """
-    Generates a unique random shipment ID like SBC1A2B3C4D5E6,
-    ensuring it doesn't already exist in the database.
+    Reads the rows of a batch request. Accepts a JSON array, a JSON object
+    with a "rows" array, or NDJSON (one row per line). Raises ValueError
+    with a client-facing message if the payload is malformed or too large.
     """
-    while True:
-        shipment_id = "SBC" + "".join(random.choices(string.ascii_uppercase + string.digits, k=12))
-        exists = session.query(ShipmentModel).filter_by(shipment_id_str=shipment_id).first()
-        if not exists:
-            return shipment_id
-
-    
+    if req.mimetype in NDJSON_MIMETYPES:
+        rows = []
+        for line_number, line in enumerate(req.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                raise ValueError(f"Invalid JSON on line {line_number}.")
+    else:
+        rows = req.get_json(silent=True)
+        if isinstance(rows, dict):
+            rows = rows.get("rows")
 
-    
\ No newline at end of file
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("A non-empty array of rows is required.")
+    if len(rows) > max_rows:
+        raise ValueError(f"A batch may contain at most {max_rows} rows.")
+    return rows
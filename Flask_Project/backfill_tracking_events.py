@@ -0,0 +1,106 @@
+# Copies the legacy Shipment.tracking_history JSONB arrays into the
+# tracking_events table, one chunk of shipments per transaction, and marks
+# each shipment's history as migrated. Entries already present as events
+# (e.g. from an earlier run) are not copied again, so the script is safe to re-run.
+#
+#   python backfill_tracking_events.py                # backfill
+#   python backfill_tracking_events.py --clear-jsonb  # backfill, then empty the migrated JSONB copies
+#
+# Run it when deploying this version: it first adds the
+# shipments.tracking_history_migrated column the app reads. Create the
+# tracking_events table first (db.create_all() leaves existing tables alone).
+
+import argparse
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from sqlalchemy import text
+
+from app import create_app, db
+
+BACKFILL_CHUNK_SIZE = 5000
+
+# Existing shipments start out unmigrated; rows inserted by the app default to migrated
+ADD_MIGRATED_COLUMN_SQL = text("""
+    ALTER TABLE shipments ADD COLUMN IF NOT EXISTS tracking_history_migrated boolean NOT NULL DEFAULT false
+""")
+
+# Marks the chunk's unmigrated shipments migrated and copies their entries in
+# array order. Shipments that already have events (recorded since the switch
+# to tracking_events) are included: history is ordered by date, so the copied
+# entries sort before those events. An entry without a parseable date takes
+# the booking date.
+BACKFILL_SQL = text("""
+    WITH migrated AS (
+        UPDATE shipments s SET tracking_history_migrated = true
+        WHERE s.id >= :first_id AND s.id < :end_id
+          AND NOT s.tracking_history_migrated
+        RETURNING s.id, s.status, s.booking_date, s.tracking_history
+    )
+    INSERT INTO tracking_events (shipment_id, stage, location, activity, created_at)
+    SELECT v.shipment_id, v.stage, v.location, v.activity, v.created_at
+    FROM migrated m
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(m.tracking_history) = 'array' THEN m.tracking_history ELSE '[]'::jsonb END
+    ) WITH ORDINALITY AS e(entry, position)
+    CROSS JOIN LATERAL (
+        SELECT m.id AS shipment_id,
+               COALESCE(e.entry->>'stage', m.status) AS stage,
+               COALESCE(e.entry->>'location', '') AS location,
+               COALESCE(e.entry->>'activity', '') AS activity,
+               CASE WHEN e.entry->>'date' ~ '^\\d{4}-\\d{2}-\\d{2}'
+                    THEN (e.entry->>'date')::timestamp
+                    ELSE m.booking_date END AS created_at
+    ) AS v
+    WHERE jsonb_typeof(e.entry) = 'object'
+      AND NOT EXISTS (
+        SELECT 1 FROM tracking_events t
+        WHERE t.shipment_id = v.shipment_id AND t.stage = v.stage
+          AND t.activity = v.activity AND t.created_at = v.created_at
+      )
+    ORDER BY m.id, e.position
+""")
+
+CLEAR_JSONB_SQL = text("""
+    UPDATE shipments s SET tracking_history = '[]'::jsonb
+    WHERE s.id >= :first_id AND s.id < :end_id
+      AND s.tracking_history_migrated
+      AND s.tracking_history <> '[]'::jsonb
+""")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill tracking_events from Shipment.tracking_history.")
+    parser.add_argument("--clear-jsonb", action="store_true", help="Empty the JSONB history of migrated shipments.")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE, help="Shipments per transaction.")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.session.execute(ADD_MIGRATED_COLUMN_SQL)
+        db.session.commit()
+
+        max_id = db.session.execute(text("SELECT COALESCE(MAX(id), 0) FROM shipments")).scalar()
+        inserted = 0
+        for first_id in range(1, max_id + 1, args.chunk_size):
+            params = {"first_id": first_id, "end_id": first_id + args.chunk_size}
+            try:
+                inserted += db.session.execute(BACKFILL_SQL, params).rowcount
+                if args.clear_jsonb:
+                    db.session.execute(CLEAR_JSONB_SQL, params)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"An error occurred backfilling shipments {first_id}-{first_id + args.chunk_size - 1}: {e}")
+                return 1
+            print(f"Backfilled shipments up to id {min(first_id + args.chunk_size - 1, max_id)} ({inserted} events so far)")
+
+        print(f"Done. {inserted} tracking events inserted.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# Benchmarks calculate_domestic_price / calculate_international_price, both as
+# direct calls and through the Flask request path, and fails (exit code 1) when
+# p50/p99 latency or allocations regress past a threshold against a baseline.
+#
+#   python benchmark_pricing.py --save-baseline   # record a baseline on this machine
+#   python benchmark_pricing.py                   # compare against it
+#
+# Baselines are machine-specific: record one on the machine that runs the gate.
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app
+from app.services.domestic_pricing_service import DOMESTIC_ZONES, DOMESTIC_MODES, calculate_domestic_price
+from app.services.pricing_service import get_rate_card, calculate_international_price
+from app.services.quote_cache import quote_cache, QUOTE_CACHE_MAXSIZE
+
+DEFAULT_BASELINE_PATH = os.path.join(project_home, "benchmarks", "pricing_baseline.json")
+
+# The frontend labels for each domestic mode, as sent to /api/domestic/price
+FRONTEND_MODES = {"express": "Express", "air": "Air Cargo", "surface": "Surface Cargo"}
+
+# Every 0.1 kg step from 0.1 to 100 kg
+DOMESTIC_WEIGHTS = [round(w * 0.1, 1) for w in range(1, 1001)]
+INTERNATIONAL_WEIGHTS = [round(w * 0.5, 1) for w in range(1, 61)]
+
+# The HTTP sweeps cover a coarser grid, since each request costs far more than a direct call
+HTTP_DOMESTIC_WEIGHTS = DOMESTIC_WEIGHTS[::50]
+HTTP_INTERNATIONAL_WEIGHTS = INTERNATIONAL_WEIGHTS[::10]
+
+# Allocation tracing is slow, so it samples every Nth call of a sweep
+ALLOCATION_SAMPLE_EVERY = 25
+
+def _domestic_cases(weights):
+    # One destination per zone column; the city lookup resolves straight to that zone
+    for column, locations in DOMESTIC_ZONES.items():
+        for mode in DOMESTIC_MODES:
+            for weight in weights:
+                yield locations[0], mode, weight
+
+def _international_cases(weights):
+    for country_data in get_rate_card()["countries"].values():
+        for weight in weights:
+            yield country_data["country"], weight
+
+def _hot_subset(calls):
+    # An evenly spread subset small enough to stay resident in the quote cache
+    step = math.ceil(len(calls) / (QUOTE_CACHE_MAXSIZE // 2))
+    return calls[::step]
+
+def _build_sweeps(client):
+    """
+    Returns {case name: (calls, clear_cache)}. Each call is a zero-argument
+    function; clear_cache empties the quote cache before each call so the
+    full pricing path is measured rather than a cache hit.
+    """
+    domestic = list(_domestic_cases(DOMESTIC_WEIGHTS))
+    international = list(_international_cases(INTERNATIONAL_WEIGHTS))
+    domestic_http = list(_domestic_cases(HTTP_DOMESTIC_WEIGHTS))
+    international_http = list(_international_cases(HTTP_INTERNATIONAL_WEIGHTS))
+
+    def domestic_call(city, mode, weight):
+        return lambda: calculate_domestic_price("", city, mode, weight)
+
+    def international_call(country, weight):
+        return lambda: calculate_international_price(country, weight)
+
+    def domestic_request(city, mode, weight):
+        body = {"city": city, "mode": FRONTEND_MODES[mode], "weight": weight}
+        return lambda: client.post("/api/domestic/price", json=body)
+
+    def international_request(country, weight):
+        body = {"country": country, "weight": weight}
+        return lambda: client.post("/api/international/price", json=body)
+
+    return {
+        "domestic_direct": ([domestic_call(*c) for c in domestic], True),
+        "domestic_direct_cached": (_hot_subset([domestic_call(*c) for c in domestic]), False),
+        "international_direct": ([international_call(*c) for c in international], True),
+        "international_direct_cached": (_hot_subset([international_call(*c) for c in international]), False),
+        "domestic_http": ([domestic_request(*c) for c in domestic_http], True),
+        "international_http": ([international_request(*c) for c in international_http], True),
+    }
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _time_sweep(calls, clear_cache):
+    timings = []
+    for call in calls:
+        if clear_cache:
+            quote_cache.clear()
+        start = time.perf_counter_ns()
+        call()
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return {
+        "p50_us": _percentile(timings, 0.50) / 1000,
+        "p99_us": _percentile(timings, 0.99) / 1000,
+        "mean_us": statistics.fmean(timings) / 1000,
+    }
+
+def _measure_allocations(calls, clear_cache):
+    # Median of the peak traced memory per call, in bytes
+    peaks = []
+    tracemalloc.start()
+    try:
+        for call in calls[::ALLOCATION_SAMPLE_EVERY]:
+            if clear_cache:
+                quote_cache.clear()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+def run_benchmarks(rounds):
+    """
+    Runs every sweep `rounds` times and keeps the best p50/p99/mean of each,
+    which filters out one-off scheduler and GC noise.
+    """
+    app = create_app()
+    client = app.test_client()
+    sweeps = _build_sweeps(client)
+
+    results = {}
+    for name, (calls, clear_cache) in sweeps.items():
+        # Warm-up pass: loads the rate card and, for cached cases, fills the cache
+        for call in calls:
+            call()
+
+        rounds_stats = [_time_sweep(calls, clear_cache) for _ in range(rounds)]
+        results[name] = {
+            "calls": len(calls),
+            "p50_us": round(min(r["p50_us"] for r in rounds_stats), 3),
+            "p99_us": round(min(r["p99_us"] for r in rounds_stats), 3),
+            "mean_us": round(min(r["mean_us"] for r in rounds_stats), 3),
+            "alloc_peak_bytes": _measure_allocations(calls, clear_cache),
+        }
+        print(f"{name:<30} calls={len(calls):<6} p50={results[name]['p50_us']:>9.2f}us "
+              f"p99={results[name]['p99_us']:>9.2f}us alloc={results[name]['alloc_peak_bytes']}B")
+    return results
+
+def compare_to_baseline(results, baseline, thresholds):
+    """
+    Returns a list of regression messages for metrics that grew by more than
+    their threshold (a fraction, e.g. 0.25 for +25%) over the baseline.
+    """
+    regressions = []
+    for name, baseline_stats in baseline["cases"].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric, threshold in thresholds.items():
+            before, after = baseline_stats.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > threshold:
+                regressions.append(
+                    f"{name}.{metric}: {before} -> {after} (+{change:.0%}, allowed +{threshold:.0%})"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pricing services and gate on regressions.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Path of the baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's results as the new baseline.")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed rounds per sweep; the best round is kept.")
+    parser.add_argument("--p50-threshold", type=float, default=0.25, help="Allowed p50 growth (fraction).")
+    parser.add_argument("--p99-threshold", type=float, default=0.50, help="Allowed p99 growth (fraction).")
+    parser.add_argument("--alloc-threshold", type=float, default=0.10, help="Allowed allocation growth (fraction).")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rounds)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "meta": {
+                    "created_at": datetime.utcnow().isoformat(),
+                    "python": platform.python_version(),
+                    "machine": platform.platform(),
+                    "rounds": args.rounds,
+                },
+                "cases": results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}. Run with --save-baseline first.")
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline, {
+        "p50_us": args.p50_threshold,
+        "p99_us": args.p99_threshold,
+        "alloc_peak_bytes": args.alloc_threshold,
+    })
+    if regressions:
+        print("Performance regressions against the baseline:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+
+    print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
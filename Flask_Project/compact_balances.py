@@ -0,0 +1,29 @@
+# Folds pending top-ups from the balance ledger into the cached User.balance.
+# Top-ups are appended to the ledger without touching the user's row, so they
+# never wait on a booking's debit; this job (or a debit that falls short) later
+# applies them. Run it periodically, e.g. from cron every few minutes:
+#
+#   python compact_balances.py
+
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app, db
+from app.services.balance_ledger import compact_balances
+
+app = create_app()
+
+with app.app_context():
+    try:
+        updated = compact_balances()
+        db.session.commit()
+        print(f"Compacted pending top-ups for {updated} user(s).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"An error occurred while compacting balances: {e}")
+        sys.exit(1)
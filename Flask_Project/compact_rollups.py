@@ -0,0 +1,30 @@
+# Folds the pending analytics deltas into the daily rollup tables. Triggers on
+# shipments and users append a delta row per change instead of updating a
+# shared total, so bookings never queue on the same rollup row; this job
+# applies them. Reads add up the pending deltas, so without it analytics stay
+# correct but get slower as the deltas pile up. Schedule it every 5 minutes:
+#
+#   */5 * * * * cd /path/to/Flask_Project && python compact_rollups.py
+
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app, db
+from app.services.analytics_rollups import compact_rollups
+
+app = create_app()
+
+with app.app_context():
+    try:
+        updated = compact_rollups()
+        db.session.commit()
+        print(f"Compacted pending analytics deltas into {updated} rollup row(s).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"An error occurred while compacting rollups: {e}")
+        sys.exit(1)
@@ -0,0 +1,173 @@
+# Validates the rate cards in Data/ and compiles them into the binary snapshot
+# the pricing services load at startup (Data/rate_cards.snapshot).
+#
+#   python compile_rate_cards.py           # validate and compile
+#   python compile_rate_cards.py --check   # validate only
+#   python compile_rate_cards.py --strict  # treat warnings as errors
+#
+# Run it after every edit to domestic.json, dom_prices.json or pricing.json.
+# Until then the services ignore the stale snapshot and read the JSON directly.
+# Running gunicorn with --preload loads the snapshot once in the master, so the
+# workers share its pages copy-on-write.
+
+import argparse
+import json
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app.services.domestic_pricing_service import (
+    DOMESTIC_MODES,
+    EXPRESS_BANDS,
+    FLAT_RATE_MODES,
+    PER_KG_BANDS,
+    compile_domestic_rates,
+)
+from app.services.pricing_service import MAX_SLAB_WEIGHT, compile_international_rates
+from app.services.rate_card_snapshot import SNAPSHOT_PATH, source_path, write_snapshot
+
+INTERNATIONAL_SLABS = tuple(str(w) for w in range(1, MAX_SLAB_WEIGHT + 1))
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_rate_cards(zones, domestic_prices, pricing_list):
+    """
+    Checks the three rate cards for problems that would break or skew pricing.
+    Returns (errors, warnings), each a list of messages. Errors are missing or
+    non-numeric rates and zones that cannot be priced; warnings are unusual but
+    priceable data such as non-monotonic slabs or duplicate entries.
+    """
+    errors, warnings = [], []
+
+    if not isinstance(zones, dict) or not zones:
+        errors.append("domestic.json must map zone columns to lists of destinations.")
+        zones = {}
+    if not isinstance(domestic_prices, dict) or not domestic_prices:
+        errors.append("dom_prices.json must map zone columns to per-mode rate tables.")
+        domestic_prices = {}
+    if not isinstance(pricing_list, list) or not pricing_list:
+        errors.append("pricing.json must be a list of country rate entries.")
+        pricing_list = []
+
+    # domestic.json
+    seen_destinations = {}
+    for column, locations in zones.items():
+        if column not in domestic_prices:
+            errors.append(f"domestic.json zone {column} has no rates in dom_prices.json.")
+        for location in locations or []:
+            key = " ".join(str(location).split()).casefold()
+            if key in seen_destinations:
+                warnings.append(
+                    f"'{location}' is listed in zones {seen_destinations[key]} and {column}; zone {seen_destinations[key]} wins."
+                )
+            else:
+                seen_destinations[key] = column
+
+    # dom_prices.json
+    for column, rules in domestic_prices.items():
+        if column not in zones:
+            warnings.append(f"dom_prices.json zone {column} is not used by any destination in domestic.json.")
+        for mode, table in (rules or {}).items():
+            if mode not in DOMESTIC_MODES:
+                errors.append(f"dom_prices.json zone {column} has unknown mode '{mode}'.")
+                continue
+            bands = EXPRESS_BANDS if mode in FLAT_RATE_MODES else PER_KG_BANDS
+            rates = []
+            for band in bands:
+                rate = table.get(band)
+                if rate is None:
+                    errors.append(f"dom_prices.json zone {column} {mode} is missing the '{band}' slab.")
+                elif not _is_number(rate) or rate <= 0:
+                    errors.append(f"dom_prices.json zone {column} {mode} '{band}' rate must be a positive number.")
+                else:
+                    rates.append(rate)
+            if len(rates) != len(bands):
+                continue
+            if mode in FLAT_RATE_MODES and any(a > b for a, b in zip(rates, rates[1:])):
+                warnings.append(f"dom_prices.json zone {column} express slabs decrease with weight: {rates}.")
+            if mode not in FLAT_RATE_MODES and any(a < b for a, b in zip(rates, rates[1:])):
+                warnings.append(f"dom_prices.json zone {column} {mode} per-kg rates increase with weight: {rates}.")
+
+    # pricing.json
+    seen_countries = set()
+    for position, item in enumerate(pricing_list, start=1):
+        name = item.get("country") if isinstance(item, dict) else None
+        if not name:
+            errors.append(f"pricing.json entry {position} has no country.")
+            continue
+        key = name.strip().lower()
+        if key in seen_countries:
+            warnings.append(f"pricing.json lists '{name}' more than once; the first entry wins.")
+            continue
+        seen_countries.add(key)
+
+        slabs = []
+        for slab in INTERNATIONAL_SLABS:
+            price = item.get(slab)
+            if price is None:
+                errors.append(f"pricing.json '{name}' is missing the {slab}kg slab.")
+            elif not _is_number(price) or price <= 0:
+                errors.append(f"pricing.json '{name}' {slab}kg price must be a positive number.")
+            else:
+                slabs.append(price)
+        per_kg = item.get("per_kg")
+        if not _is_number(per_kg) or per_kg <= 0:
+            errors.append(f"pricing.json '{name}' per_kg must be a positive number.")
+        if len(slabs) == len(INTERNATIONAL_SLABS) and any(a > b for a, b in zip(slabs, slabs[1:])):
+            warnings.append(f"pricing.json '{name}' slab prices decrease with weight: {slabs}.")
+
+        unknown = set(item) - {"country", "per_kg", *INTERNATIONAL_SLABS}
+        if unknown:
+            warnings.append(f"pricing.json '{name}' has unknown fields: {', '.join(sorted(unknown))}.")
+
+    return errors, warnings
+
+def _read_source(filename):
+    with open(source_path(filename), 'rb') as f:
+        return f.read()
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the rate cards and compile the pricing snapshot.")
+    parser.add_argument("--check", action="store_true", help="Validate only; do not write the snapshot.")
+    parser.add_argument("--strict", action="store_true", help="Fail on warnings as well as errors.")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="Where to write the snapshot.")
+    args = parser.parse_args()
+
+    try:
+        raw = {name: _read_source(name) for name in ("domestic.json", "dom_prices.json", "pricing.json")}
+        zones = json.loads(raw["domestic.json"])
+        domestic_prices = json.loads(raw["dom_prices.json"])
+        pricing_list = json.loads(raw["pricing.json"])
+    except (IOError, ValueError) as e:
+        print(f"Could not read the rate cards: {e}")
+        return 1
+
+    errors, warnings = validate_rate_cards(zones, domestic_prices, pricing_list)
+    for message in warnings:
+        print(f"WARNING: {message}")
+    for message in errors:
+        print(f"ERROR: {message}")
+
+    if errors or (args.strict and warnings):
+        print(f"Validation failed with {len(errors)} error(s) and {len(warnings)} warning(s).")
+        return 1
+    print(f"Validation passed with {len(warnings)} warning(s).")
+
+    if args.check:
+        return 0
+
+    snapshot = write_snapshot(
+        compile_domestic_rates(zones, domestic_prices),
+        compile_international_rates(raw["pricing.json"]),
+        path=args.output,
+    )
+    print(f"Snapshot {snapshot['version']} written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
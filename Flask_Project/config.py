@@ -1,6 +1,14 @@
+import os
+
 class Config:
     # Hardcoded configuration variables
     SECRET_KEY = "thisisahighsecret"
+
+    # Keys the permutation that turns serial numbers into shipment IDs (see
+    # app/services/shipment_ids.py). Never change it, even when SECRET_KEY is
+    # rotated: a new key maps new serials onto IDs that are already in use.
+    # It is the SECRET_KEY the first block-allocated IDs were issued under.
+    SHIPMENT_ID_KEY = "thisisahighsecret"
     DEBUG_MODE = True  # Corresponds to FLASK_DEBUG=1
 
     # Database connection details
@@ -17,6 +25,18 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # How shipment status changes reach the SSE streams: "postgres" (LISTEN/NOTIFY,
+    # works across workers and hosts) or "local" (in-process, single worker only)
+    STATUS_EVENTS_BACKEND = "postgres"
+
+    # Each response carries a Server-Timing header with its SQL statement
+    # count and database time (see app/services/query_stats.py)
+    SERVER_TIMING = True
+
+    # An endpoint exceeding its query budget is logged ("log"), or fails the
+    # request with QueryBudgetExceeded ("raise", for tests and CI)
+    QUERY_BUDGET_MODE = "log"
+
     # CORS Configuration
     CORS_ORIGINS = [
         "https://www.hkspeedcouriers.com",
@@ -30,6 +50,16 @@ class DevelopmentConfig(Config):
     DEBUG = True
 
 
+class TestingConfig(Config):
+    TESTING = True
+    # Never the production database: the tests drop and recreate every table.
+    # Without TEST_DATABASE_URL (a scratch PostgreSQL database) the database
+    # tests are skipped.
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL", "sqlite://")
+    STATUS_EVENTS_BACKEND = "local"
+    QUERY_BUDGET_MODE = "raise"
+
+
 class ProductionConfig(Config):
     # Set to True based on user request (FLASK_DEBUG=1) for debugging in production
     DEBUG = True
@@ -38,5 +68,6 @@ class ProductionConfig(Config):
 config = {
     "development": DevelopmentConfig,
     "production": ProductionConfig,
+    "testing": TestingConfig,
     "default": DevelopmentConfig,
 }
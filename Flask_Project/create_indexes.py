@@ -0,0 +1,44 @@
+# Creates the indexes and sequences declared on the models that an existing
+# database is missing. create_tables.py builds them for a fresh database; this
+# script adds them to a live one without locking writes (CREATE INDEX
+# CONCURRENTLY), and is safe to re-run:
+#
+#   python create_indexes.py
+
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from sqlalchemy import inspect
+
+from app import create_app, db
+from app.models import PG_TRGM, SHIPMENT_ID_BLOCK_SEQ
+
+app = create_app()
+
+with app.app_context():
+    # CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(PG_TRGM)  # the search indexes use gin_trgm_ops
+        SHIPMENT_ID_BLOCK_SEQ.create(connection, checkfirst=True)  # shipment IDs are allocated from it
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                print(f"Skipping {table.name}: table does not exist (run create_tables.py).")
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing:
+                    continue
+                print(f"Creating {index.name} on {table.name}...")
+                try:
+                    index.dialect_options["postgresql"]["concurrently"] = True
+                    index.create(connection)
+                except Exception as e:
+                    print(f"An error occurred while creating {index.name}: {e}")
+                    sys.exit(1)
+    print("Indexes and sequences are up to date.")
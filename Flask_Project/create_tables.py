@@ -30,6 +30,6 @@ with app.app_context():
     try:
         db.create_all()
         print("Tables created successfully!")
-        print("You should now see 'users', 'shipments', 'payment_requests', 'balance_codes', and 'saved_addresses' tables in your database.")
+        print("You should now see 'users', 'shipments', 'payment_requests', 'balance_codes', 'balance_ledger', 'tracking_events', 'saved_addresses', 'shipment_daily_rollups', 'shipment_rollup_deltas', 'user_daily_rollups' and 'user_rollup_deltas' tables in your database.")
     except Exception as e:
         print(f"An error occurred while creating tables: {e}")
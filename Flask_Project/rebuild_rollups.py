@@ -0,0 +1,32 @@
+# Recomputes the analytics rollups from the shipments and users tables and
+# (re)installs the triggers that keep them current. Run it once on an
+# existing database, and again after a backfill or an import that bypassed
+# the triggers. Writes to shipments and users wait while it runs:
+#
+#   python rebuild_rollups.py
+
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app, db
+from app.models import ShipmentDailyRollup, ShipmentRollupDelta, UserDailyRollup, UserRollupDelta
+from app.services.analytics_rollups import rebuild_rollups
+
+app = create_app()
+
+with app.app_context():
+    try:
+        tables = [m.__table__ for m in (ShipmentDailyRollup, ShipmentRollupDelta, UserDailyRollup, UserRollupDelta)]
+        db.metadata.create_all(db.engine, tables=tables)
+        rebuild_rollups()
+        db.session.commit()
+        print("Analytics rollups rebuilt.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"An error occurred while rebuilding rollups: {e}")
+        sys.exit(1)
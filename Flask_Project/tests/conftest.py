@@ -0,0 +1,114 @@
+# Database tests run against the scratch PostgreSQL database named by
+# TEST_DATABASE_URL; all of its tables are dropped and recreated:
+#
+#   TEST_DATABASE_URL=postgresql://localhost/logistix_test python -m pytest
+#
+# Without it only the tests that need no database run.
+
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import count
+
+import pytest
+from flask.testing import FlaskClient
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.extensions import db as _db
+from app.models import Shipment, User
+from app.services import pagination
+from app.services.shipment_detail_cache import shipment_detail_cache
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app("testing")
+
+@pytest.fixture(scope="session")
+def database(app):
+    if not os.environ.get("TEST_DATABASE_URL"):
+        pytest.skip("TEST_DATABASE_URL is not set")
+    with app.app_context():
+        _db.drop_all()
+        _db.create_all()
+    yield _db
+    with app.app_context():
+        _db.session.remove()
+        _db.drop_all()
+
+@pytest.fixture
+def db(app, database):
+    """The database, emptied (and the app's caches cleared) after each test."""
+    with app.app_context():
+        yield database
+        database.session.remove()
+        tables = ", ".join(table.name for table in database.metadata.sorted_tables)
+        with database.engine.begin() as connection:
+            connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    shipment_detail_cache.clear()
+    pagination._counts.clear()
+
+class _Client(FlaskClient):
+    # Requests run in the test's app context, so they share its session.
+    # Expiring it first makes each request load what it reads, as it would
+    # with a fresh session in production.
+    def open(self, *args, **kwargs):
+        _db.session.expire_all()
+        return super().open(*args, **kwargs)
+
+@pytest.fixture
+def client(app, db):
+    app.test_client_class = _Client
+    return app.test_client()
+
+_serials = count(1)
+
+@pytest.fixture
+def make_user(db):
+    def make_user(email=None, **fields):
+        user = User(
+            email=email or f"user{next(_serials)}@example.com",
+            password=generate_password_hash("secret"),
+            first_name=fields.pop("first_name", "Test"),
+            last_name=fields.pop("last_name", "User"),
+            **fields,
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+@pytest.fixture
+def make_shipment(db):
+    def make_shipment(user, **fields):
+        party = {"street": "1 Test Road", "city": "Delhi", "state": "Delhi", "pincode": "110001", "country": "India"}
+        values = {
+            "user_id": user.id,
+            "user_email": user.email,
+            "shipment_id_str": f"SBCTEST{next(_serials):08d}",
+            "sender_name": "Sender",
+            "sender_phone": "9000000000",
+            "receiver_name": "Receiver",
+            "receiver_phone": "9000000001",
+            **{f"sender_address_{k}": v for k, v in party.items()},
+            **{f"receiver_address_{k}": v for k, v in party.items()},
+            "package_weight_kg": Decimal("1.00"),
+            "package_length_cm": Decimal("10.00"),
+            "package_width_cm": Decimal("10.00"),
+            "package_height_cm": Decimal("10.00"),
+            "goods_details": [{"description": "Documents", "quantity": 1, "value": 100}],
+            "pickup_date": date.today(),
+            "service_type": "Express",
+            "booking_date": datetime.utcnow(),
+            "status": "Booked",
+            "price_without_tax": Decimal("100.00"),
+            "tax_amount_18_percent": Decimal("18.00"),
+            "total_with_tax_18_percent": Decimal("118.00"),
+            **fields,
+        }
+        shipment = Shipment(**values)
+        db.session.add(shipment)
+        db.session.commit()
+        return shipment
+    return make_shipment
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+import pytest
+
+from app.models import BalanceCode, BalanceLedgerEntry, User
+from app.services.balance_ledger import InsufficientBalance, available_balance, credit_balance, debit_balance
+from app.services.query_stats import query_budget
+
+def _ledger(db, user):
+    return [
+        (entry.amount, entry.entry_type, entry.reference, entry.applied)
+        for entry in db.session.query(BalanceLedgerEntry).filter_by(user_id=user.id).order_by(BalanceLedgerEntry.id)
+    ]
+
+def test_a_debit_and_its_ledger_entry_are_one_statement(db, make_user):
+    employee = make_user(is_employee=True, balance=Decimal("500.00"))
+    user_id = employee.id
+
+    with query_budget(1):
+        assert debit_balance(user_id, Decimal("118.00"), reference="SBC000000000001") == Decimal("382.00")
+    db.session.commit()
+
+    assert _ledger(db, employee) == [(Decimal("-118.00"), "debit", "SBC000000000001", True)]
+    assert db.session.get(User, employee.id).balance == Decimal("382.00")
+
+def test_a_short_balance_is_topped_up_from_pending_credits(db, make_user):
+    employee = make_user(is_employee=True, balance=Decimal("100.00"))
+    credit_balance(employee.id, Decimal("50.00"), reference="TOPUP-TEST0001")
+    db.session.commit()
+
+    assert debit_balance(employee.id, Decimal("118.00")) == Decimal("32.00")
+    db.session.commit()
+    assert _ledger(db, employee) == [
+        (Decimal("50.00"), "top_up", "TOPUP-TEST0001", True),
+        (Decimal("-118.00"), "debit", None, True),
+    ]
+
+def test_a_refused_debit_writes_nothing(db, make_user):
+    employee = make_user(is_employee=True, balance=Decimal("100.00"))
+
+    with pytest.raises(InsufficientBalance):
+        debit_balance(employee.id, Decimal("118.00"))
+    db.session.commit()
+
+    assert _ledger(db, employee) == []
+    assert available_balance(employee.id) == Decimal("100.00")
+
+def test_a_balance_code_is_redeemed_once(client, db, make_user):
+    employee = make_user(is_employee=True, balance=Decimal("100.00"))
+    db.session.add(BalanceCode(code="TOPUP-TEST0001", amount=Decimal("500.00")))
+    db.session.commit()
+    payload = {"code": "TOPUP-TEST0001", "email": employee.email}
+
+    response = client.post("/api/employee/redeem-code", json=payload)
+    assert response.status_code == 200
+    assert response.get_json()["new_balance"] == 600.0
+
+    assert client.post("/api/employee/redeem-code", json=payload).status_code == 409
+    assert client.post("/api/employee/redeem-code", json={**payload, "code": "TOPUP-NOSUCH01"}).status_code == 404
+    assert _ledger(db, employee) == [(Decimal("500.00"), "top_up", "TOPUP-TEST0001", False)]
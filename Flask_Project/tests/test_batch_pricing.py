@@ -0,0 +1,39 @@
+import pytest
+
+from app.services.domestic_pricing_service import (
+    DOMESTIC_MODES, DOMESTIC_ZONES, calculate_domestic_price, calculate_domestic_price_batch,
+    calculate_domestic_zone_price_batch,
+)
+from app.services.pricing_service import (
+    calculate_international_price, calculate_international_price_batch, get_rate_card,
+)
+
+# Either side of every slab and band edge, plus fractional weights
+WEIGHTS = (0.4, 1, 1.01, 2.5, 3, 4.99, 5, 5.5, 9.99, 10, 11, 11.2, 24.9, 25, 49, 50, 50.5, 120)
+
+DESTINATIONS = [(locations[0], "") for locations in DOMESTIC_ZONES.values()] + [
+    ("Karnataka", "Bengaluru"), ("Maharashtra", "Mumbai"), ("Atlantis", "Nowhere"),
+]
+
+@pytest.mark.parametrize("mode", DOMESTIC_MODES + ("rocket",))
+def test_domestic_batch_matches_single_quotes(mode):
+    rows = [(state, city, mode, weight) for state, city in DESTINATIONS for weight in WEIGHTS]
+
+    assert calculate_domestic_price_batch(rows) == [calculate_domestic_price(*row) for row in rows]
+
+def test_zone_batch_matches_single_quotes():
+    rows = [(column, mode, weight) for column in DOMESTIC_ZONES for mode in DOMESTIC_MODES for weight in WEIGHTS]
+    singles = [calculate_domestic_price(DOMESTIC_ZONES[column][0], "", mode, weight) for column, mode, weight in rows]
+
+    for batch, single in zip(calculate_domestic_zone_price_batch(rows), singles):
+        # The zone batch names the zone, not the state, in its errors
+        if "error" in single:
+            assert "error" in batch
+        else:
+            assert batch == single
+
+def test_international_batch_matches_single_quotes():
+    countries = [entry["country"] for entry in get_rate_card()["countries"].values()] + ["Atlantis", " kenya "]
+    rows = [(country, weight) for country in countries for weight in WEIGHTS + (0, -1)]
+
+    assert calculate_international_price_batch(rows) == [calculate_international_price(*row) for row in rows]
@@ -0,0 +1,44 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.models import Shipment, User
+from app.services.domestic_pricing_service import calculate_domestic_price_batch
+
+def _row(service_type, weight):
+    party = {"street": "1 Test Road", "city": "Mumbai", "state": "Maharashtra", "pincode": "400001"}
+    return {
+        "shipmentType": "domestic",
+        "sender_name": "Sender", "sender_phone": "9000000000", "sender_address_country": "India",
+        "receiver_name": "Receiver", "receiver_phone": "9000000001",
+        **{f"sender_address_{k}": v for k, v in party.items()},
+        **{f"receiver_address_{k}": v for k, v in party.items()},
+        "package_weight_kg": weight, "package_length_cm": 10.0, "package_width_cm": 10.0, "package_height_cm": 10.0,
+        "pickup_date": date.today().isoformat(),
+        "service_type": service_type,
+        "goods": [{"description": "Documents", "quantity": 1, "value": 100}],
+    }
+
+@pytest.mark.parametrize("weight", [0, -3, float("inf"), float("nan")])
+def test_batch_pricer_rejects_weights_outside_the_bands(weight):
+    assert calculate_domestic_price_batch([("Maharashtra", "Mumbai", "express", weight)]) == [
+        {"error": "Weight must be a positive number."}
+    ]
+
+def test_bulk_booking_rejects_non_positive_weights(client, db, make_user):
+    employee = make_user(is_employee=True, balance=Decimal("10000.00"))
+    rows = [_row("Express", -3), _row("Surface Cargo", 0), _row("Express", 1)]
+
+    response = client.post("/api/shipments/bulk", json={"user_email": employee.email, "shipments": rows})
+
+    body = response.get_json()
+    assert response.status_code == 201
+    assert body["booked_count"] == 1
+    assert body["error_count"] == 2
+    for result in body["results"][:2]:
+        assert result["details"] == {"package_weight_kg": ["Weight must be a positive number."]}
+    price = round(calculate_domestic_price_batch([("Maharashtra", "Mumbai", "express", 1)])[0]["price"] * 1.18, 2)
+    assert body["batch_total"] == price
+    assert db.session.query(Shipment).count() == 1
+    assert db.session.get(User, employee.id).balance == Decimal("10000.00") - Decimal(str(price))
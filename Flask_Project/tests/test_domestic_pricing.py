@@ -0,0 +1,59 @@
+import pytest
+
+from app.services.domestic_pricing_service import (
+    DESTINATION_ALIASES, DESTINATION_INDEX, DOMESTIC_MODES, DOMESTIC_PRICES, MODE_ROWS, _build_destination_index,
+    _compile_rate_matrix, calculate_domestic_price, calculate_domestic_quote_all, find_domestic_zone,
+)
+
+@pytest.mark.parametrize("city", ["Bangalore", "Bengaluru", "  bengaluru ", "BANGALORE"])
+def test_alias_and_canonical_names_share_a_zone(city):
+    assert find_domestic_zone("Karnataka", city) == "7"
+
+def test_city_wins_over_state_and_state_is_the_fallback():
+    assert find_domestic_zone("Karnataka", "Mysuru") == "8"
+    assert find_domestic_zone("Orissa", "") == find_domestic_zone("Odisha", None) == "8"
+    assert find_domestic_zone("Atlantis", "Nowhere") is None
+
+def test_every_alias_resolves_to_its_canonical_zone():
+    for alias, canonical in DESTINATION_ALIASES.items():
+        assert DESTINATION_INDEX.get(alias) == DESTINATION_INDEX.get(canonical)
+
+def test_first_zone_listing_a_destination_wins():
+    index = _build_destination_index({"1": ["Goa", "New  Delhi"], "2": ["goa", "Delhi"]})
+
+    assert index["goa"] == "1"
+    assert index["new delhi"] == "1"
+    assert index["delhi"] == "2"
+
+def test_aliased_quote_matches_the_canonical_quote():
+    assert calculate_domestic_price("Karnataka", "Bengaluru", "express", 2) == \
+        calculate_domestic_price("Karnataka", "Bangalore", "express", 2)
+
+@pytest.mark.parametrize("weight", [0.5, 3, 4.2, 7, 30, 75])
+def test_quote_all_matches_the_single_quotes(weight):
+    quote = calculate_domestic_quote_all("West Bengal", "Kolkata", weight)
+
+    assert quote["zone"] == "7"
+    for mode in DOMESTIC_MODES:
+        single = calculate_domestic_price("West Bengal", "Kolkata", mode, weight)
+        single.pop("zone", None)
+        assert quote["quotes"][mode] == single
+    priced = {mode: result["price"] for mode, result in quote["quotes"].items() if "price" in result}
+    assert quote["cheapest"] == min(priced, key=priced.get)
+
+def test_quote_all_marks_modes_the_zone_does_not_offer():
+    quote = calculate_domestic_quote_all("Haryana", "", 2)
+
+    assert quote["quotes"]["air"] == {"error": "The 'air' service is not available for 'Haryana'."}
+    assert calculate_domestic_quote_all("Atlantis", "", 2) == {
+        "error": "The destination ', Atlantis' is not currently serviced."
+    }
+
+def test_compiled_matrix_matches_the_rate_tables():
+    zone_rows, matrix, available = _compile_rate_matrix(DOMESTIC_PRICES)
+
+    for column, rules in DOMESTIC_PRICES.items():
+        for mode in DOMESTIC_MODES:
+            assert available[zone_rows[column], MODE_ROWS[mode]] == (mode in rules)
+        for mode, table in rules.items():
+            assert list(matrix[zone_rows[column], MODE_ROWS[mode], :len(table)]) == list(table.values())
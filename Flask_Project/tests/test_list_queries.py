@@ -0,0 +1,63 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+JSONB_COLUMNS = re.compile(r"\b(goods_details|tracking_history)\b")
+
+@pytest.fixture
+def statements(db):
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+@pytest.fixture
+def accounts(make_user, make_shipment):
+    admin = make_user("admin@example.com", is_admin=True)
+    customer = make_user("customer@example.com")
+    employee = make_user("employee@example.com", is_employee=True)
+    for owner in (customer, customer, employee):
+        make_shipment(owner)
+    return {"admin": admin, "customer": customer, "employee": employee}
+
+def _as(user):
+    return {"X-User-Email": user.email}
+
+def _list_requests(accounts):
+    admin, customer, employee = accounts["admin"], accounts["customer"], accounts["employee"]
+    return [
+        (f"/api/shipments?email={customer.email}", customer),
+        ("/api/employee/day-end-stats", employee),
+        ("/api/admin/shipments", admin),
+        ("/api/admin/shipments?cursor=&count=exact", admin),
+        ("/api/admin/shipments?q=Receiver", admin),
+        ("/api/admin/users", admin),
+        ("/api/admin/users?cursor=", admin),
+        (f"/api/admin/users/{customer.id}", admin),
+        ("/api/admin/employees", admin),
+    ]
+
+def test_list_queries_do_not_select_jsonb_columns(client, accounts, statements):
+    for url, user in _list_requests(accounts):
+        del statements[:]
+        response = client.get(url, headers=_as(user))
+        assert response.status_code == 200, url
+
+        selects = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+        assert any("shipments" in s for s in selects), url
+        for statement in selects:
+            assert not JSONB_COLUMNS.search(statement), f"{url} selected a JSONB column:\n{statement}"
+
+def test_shipment_detail_still_includes_goods_details(client, accounts):
+    customer = accounts["customer"]
+    shipments = client.get(f"/api/shipments?email={customer.email}", headers=_as(customer)).get_json()
+    shipment_id_str = shipments[0]["shipment_id_str"]
+
+    body = client.get(f"/api/shipments/{shipment_id_str}", headers=_as(customer)).get_json()
+
+    assert body["goods_details"] == [{"description": "Documents", "quantity": 1, "value": 100}]
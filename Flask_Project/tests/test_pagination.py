@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from app.models import BalanceLedgerEntry, User
+
+def test_page_mode_total_is_never_stale(client, make_user, make_shipment):
+    admin = make_user("admin@example.com", is_admin=True)
+    customer = make_user()
+    make_shipment(customer)
+    headers = {"X-User-Email": admin.email}
+
+    assert client.get("/api/admin/shipments?page=1&limit=1", headers=headers).get_json()["totalCount"] == 1
+
+    make_shipment(customer)
+    body = client.get("/api/admin/shipments?page=1&limit=1", headers=headers).get_json()
+    assert body["totalCount"] == 2
+    assert body["totalPages"] == 2
+
+def test_cursor_mode_walks_every_row_once(client, make_user, make_shipment):
+    admin = make_user("admin@example.com", is_admin=True)
+    customer = make_user()
+    created = {make_shipment(customer).id for _ in range(7)}
+    headers = {"X-User-Email": admin.email}
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        body = client.get(f"/api/admin/shipments?limit=3&cursor={cursor}", headers=headers).get_json()
+        seen += [shipment["id"] for shipment in body["shipments"]]
+        cursor = body["nextCursor"]
+
+    assert sorted(seen) == sorted(created)
+
+def test_cursor_mode_pages_through_rows_without_a_sort_value(client, db, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    customers = [make_user() for _ in range(5)]
+    # Legacy rows from before created_at was filled in
+    legacy = [customer.id for customer in customers[:3]]
+    db.session.execute(update(User).where(User.id.in_(legacy)).values(created_at=None))
+    db.session.commit()
+    headers = {"X-User-Email": admin.email}
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        body = client.get(f"/api/admin/users?limit=2&cursor={cursor}", headers=headers).get_json()
+        seen += [user["id"] for user in body["users"]]
+        last_page, cursor = body, body["nextCursor"]
+    page_mode = client.get("/api/admin/users?page=1&limit=10", headers=headers).get_json()["users"]
+    assert seen == [user["id"] for user in page_mode]
+    assert sorted(seen) == sorted(customer.id for customer in customers)
+    assert seen[:3] == sorted(legacy, reverse=True)
+
+    cursor, backwards = last_page["prevCursor"], []
+    while cursor is not None:
+        body = client.get(f"/api/admin/users?limit=2&cursor={cursor}", headers=headers).get_json()
+        backwards = [user["id"] for user in body["users"]] + backwards
+        cursor = body["prevCursor"]
+    assert backwards + [user["id"] for user in last_page["users"]] == seen
+
+def test_listed_users_carry_their_totals_and_balances(client, db, make_user, make_shipment):
+    admin = make_user("admin@example.com", is_admin=True)
+    customer, idle = make_user(first_name="Asha"), make_user(first_name="Ira")
+    employee = make_user(first_name="Ravi", is_employee=True, balance=Decimal("100.00"))
+    make_shipment(customer)
+    make_shipment(customer)
+    db.session.add(BalanceLedgerEntry(user_id=employee.id, amount=Decimal("50.00"), entry_type="top_up", applied=False))
+    db.session.commit()
+    headers = {"X-User-Email": admin.email}
+
+    for url in ("/api/admin/users?page=1", "/api/admin/users?cursor="):
+        users = {user["id"]: user for user in client.get(url, headers=headers).get_json()["users"]}
+        assert (users[customer.id]["shipment_count"], users[customer.id]["total_spent"]) == (2, 236.0)
+        assert (users[idle.id]["shipment_count"], users[idle.id]["total_spent"]) == (0, 0.0)
+
+    [listed] = client.get("/api/admin/employees?page=1", headers=headers).get_json()["users"]
+    assert (listed["shipment_count"], listed["balance"]) == (0, 150.0)
+    assert client.get(f"/api/admin/users/{employee.id}", headers=headers).get_json()["user"]["balance"] == 150.0
+
+def test_an_empty_page_mode_search_has_a_zero_total(client, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    make_user(first_name="Asha")
+    headers = {"X-User-Email": admin.email}
+
+    body = client.get("/api/admin/users?page=1&q=nobody", headers=headers).get_json()
+    assert (body["users"], body["totalCount"], body["totalPages"]) == ([], 0, 1)
+    assert client.get("/api/admin/users?page=3&limit=1", headers=headers).get_json()["totalCount"] == 1
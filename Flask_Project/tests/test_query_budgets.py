@@ -0,0 +1,409 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.admin import routes as admin_routes
+from app.models import BalanceCode, BalanceLedgerEntry, PaymentRequest, SavedAddress
+from app.reconciliation import statement
+from app.reconciliation.statement import INVOICE_OWNER_EMAIL
+from app.services import shipment_ids
+from app.services.query_stats import QUERY_BUDGETS, QueryBudgetExceeded, query_budget, unbudgeted_endpoints
+from app.services.quote_token import issue_quote_token
+
+def test_every_endpoint_has_a_budget(app):
+    assert unbudgeted_endpoints(app) == []
+
+# One request per budgeted endpoint, on its most expensive path: each
+# function sets up the database and returns (method, url, keyword arguments
+# for the test client). Endpoints budgeted per chunk set f.chunks to the
+# number of chunks their request works through.
+REQUESTS = {}
+
+def budgeted(endpoint):
+    def register(setup):
+        REQUESTS[endpoint] = setup
+        return setup
+    return register
+
+class Fixtures:
+    def __init__(self, db, make_user, make_shipment, monkeypatch):
+        self.db = db
+        self.make_user = make_user
+        self.make_shipment = make_shipment
+        self.monkeypatch = monkeypatch
+        self.chunks = 0
+
+    def budget(self, endpoint):
+        budget = QUERY_BUDGETS[endpoint]
+        if isinstance(budget, tuple):
+            per_request, per_chunk = budget
+            return per_request + per_chunk * self.chunks
+        return budget
+
+    def admin(self):
+        return {"X-User-Email": self.make_user("admin@example.com", is_admin=True).email}
+
+    def add(self, row):
+        self.db.session.add(row)
+        self.db.session.commit()
+        return row
+
+    def address(self, user, **fields):
+        return self.add(SavedAddress(
+            user_id=user.id, address_type="sender", nickname="Home", name="Sender",
+            address_street="1 Test Road", address_city="Delhi", address_state="Delhi",
+            address_pincode="110001", address_country="India", phone="9000000000", **fields,
+        ))
+
+    def employee_with_pending_top_up(self):
+        """An employee who has to compact a pending top-up to afford a booking,
+        with the next shipment ID needing a new block."""
+        employee = self.make_user(is_employee=True)
+        self.add(BalanceLedgerEntry(user_id=employee.id, amount=Decimal("5000.00"), entry_type="top_up", applied=False))
+        self.monkeypatch.setitem(shipment_ids._block, "pid", None)
+        return employee
+
+    def booking(self, kind):
+        """A booking on the most expensive path, see employee_with_pending_top_up()."""
+        employee = self.employee_with_pending_top_up()
+        payload = {"user_email": employee.email, **booking_row(), "final_total_price_with_tax": 118.0}
+        if kind == "domestic":
+            payload["service_type"] = mode = "Express"
+            destination = (payload["receiver_address_state"], payload["receiver_address_city"])
+        else:
+            payload.update(service_type="International", receiver_address_country="United Kingdom")
+            mode, destination = None, payload["receiver_address_country"]
+        payload["quote_token"] = issue_quote_token(kind, destination, mode, 1.0, 118.0)
+        return "POST", f"/api/shipments/{kind}", {"json": payload}
+
+def booking_row():
+    party = {"street": "1 Test Road", "city": "Mumbai", "state": "Maharashtra", "pincode": "400001"}
+    return {
+        "sender_name": "Sender", "sender_phone": "9000000000", "sender_address_country": "India",
+        "receiver_name": "Receiver", "receiver_phone": "9000000001",
+        **{f"sender_address_{k}": v for k, v in party.items()},
+        **{f"receiver_address_{k}": v for k, v in party.items()},
+        "package_weight_kg": 1.0, "package_length_cm": 10.0, "package_width_cm": 10.0, "package_height_cm": 10.0,
+        "pickup_date": date.today().isoformat(),
+        "goods": [{"description": "Documents", "quantity": 1, "value": 100}],
+    }
+
+@budgeted("auth.signup")
+def _(f):
+    return "POST", "/api/auth/signup", {"json": {
+        "first_name": "New", "last_name": "User", "email": "new@example.com", "password": "secret1",
+    }}
+
+@budgeted("auth.login")
+def _(f):
+    user = f.make_user()
+    return "POST", "/api/auth/login", {"json": {"email": user.email, "password": "secret"}}
+
+@budgeted("shipments.create_domestic_shipment")
+def _(f):
+    return f.booking("domestic")
+
+@budgeted("shipments.create_international_shipment")
+def _(f):
+    return f.booking("international")
+
+@budgeted("shipments.create_bulk_shipments")
+def _(f):
+    employee = f.employee_with_pending_top_up()
+    f.chunks = 1
+    rows = [{"shipmentType": "domestic", **booking_row(), "service_type": "Express"} for _ in range(3)]
+    return "POST", "/api/shipments/bulk", {"json": {"user_email": employee.email, "shipments": rows}}
+
+@budgeted("shipments.submit_payment")
+def _(f):
+    shipment = f.make_shipment(f.make_user(), status="Pending Payment")
+    return "POST", "/api/payments", {"json": {
+        "shipment_id_str": shipment.shipment_id_str, "utr": "123456789012", "amount": 118.0,
+    }}
+
+@budgeted("shipments.get_user_shipments")
+def _(f):
+    user = f.make_user()
+    f.make_shipment(user)
+    return "GET", f"/api/shipments?email={user.email}", {}
+
+@budgeted("shipments.get_shipment_detail")
+def _(f):
+    shipment = f.make_shipment(f.make_user())
+    f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr="123456789012", status="Pending"))
+    return "GET", f"/api/shipments/{shipment.shipment_id_str}", {}
+
+@budgeted("shipments.get_user_payments")
+def _(f):
+    shipment = f.make_shipment(f.make_user())
+    f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr="123456789012", status="Pending"))
+    return "GET", f"/api/user/payments?email={shipment.user_email}", {}
+
+@budgeted("shipments.redeem_balance_code")
+def _(f):
+    employee = f.make_user(is_employee=True)
+    code = f.add(BalanceCode(code="TOPUP-TEST0001", amount=Decimal("500.00")))
+    return "POST", "/api/employee/redeem-code", {"json": {"code": code.code, "email": employee.email}}
+
+@budgeted("shipments.get_day_end_stats")
+def _(f):
+    employee = f.make_user(is_employee=True)
+    f.make_shipment(employee)
+    return "GET", "/api/employee/day-end-stats", {"headers": {"X-User-Email": employee.email}}
+
+@budgeted("shipments.add_employee_saved_address")
+def _(f):
+    employee = f.make_user(is_employee=True)
+    return "POST", "/api/employee/addresses", {"headers": {"X-User-Email": employee.email}, "json": {
+        "address_type": "sender", "nickname": "Home", "name": "Sender", "address_street": "1 Test Road",
+        "address_city": "Delhi", "address_state": "Delhi", "address_pincode": "110001",
+        "address_country": "India", "phone": "9000000000",
+    }}
+
+@budgeted("shipments.get_employee_saved_addresses")
+def _(f):
+    employee = f.make_user(is_employee=True)
+    f.address(employee)
+    return "GET", "/api/employee/addresses?type=sender", {"headers": {"X-User-Email": employee.email}}
+
+@budgeted("shipments.delete_employee_saved_address")
+def _(f):
+    employee = f.make_user(is_employee=True)
+    address = f.address(employee)
+    return "DELETE", f"/api/employee/addresses/{address.id}", {"headers": {"X-User-Email": employee.email}}
+
+@budgeted("shipments.handle_customer_addresses")
+def _(f):
+    customer = f.make_user()
+    return "POST", "/api/customer/addresses", {"headers": {"X-User-Email": customer.email}, "json": {
+        "address_type": "receiver", "nickname": "Office", "name": "Receiver", "address_street": "2 Test Road",
+        "address_city": "Delhi", "address_state": "Delhi", "address_pincode": "110001",
+        "address_country": "India", "phone": "9000000001",
+    }}
+
+@budgeted("shipments.handle_customer_address_item")
+def _(f):
+    customer = f.make_user()
+    address = f.address(customer)
+    return "PUT", f"/api/customer/addresses/{address.id}", {"headers": {"X-User-Email": customer.email}, "json": {
+        "address_type": "sender", "nickname": "Home", "name": "Sender", "address_street": "3 Test Road",
+        "address_city": "Delhi", "address_state": "Delhi", "address_pincode": "110001",
+        "address_country": "India", "phone": "9000000000",
+    }}
+
+@budgeted("shipments.stream_user_shipment_events")
+def _(f):
+    return "GET", f"/api/shipments/events?email={f.make_user().email}", {}
+
+@budgeted("shipments.stream_shipment_events")
+def _(f):
+    shipment = f.make_shipment(f.make_user())
+    return "GET", f"/api/shipments/{shipment.shipment_id_str}/events", {}
+
+@budgeted("admin.create_invoice_from_payment")
+def _(f):
+    f.make_user(INVOICE_OWNER_EMAIL, is_admin=True)
+    f.monkeypatch.setitem(shipment_ids._block, "pid", None)
+    party = {
+        "name": "Party", "address_line1": "1 Test Road", "city": "Delhi", "state": "Delhi",
+        "pincode": "110001", "country": "India", "phone": "9000000000",
+    }
+    return "POST", "/api/admin/create-invoice-from-payment", {"json": {
+        "transaction": {"amount": "118.00", "utr": "123456789012", "type": "UPI", "weight": "1"},
+        "order": {"sender": party, "receiver": party},
+    }}
+
+@budgeted("admin.reconcile_bank_statement")
+def _(f):
+    headers = {"X-User-Email": f.make_user(INVOICE_OWNER_EMAIL, is_admin=True).email}
+    f.monkeypatch.setitem(shipment_ids._block, "pid", None)
+    f.monkeypatch.setattr(statement, "STATEMENT_CHUNK_SIZE", 2)
+    party = {
+        "name": "Party", "address_line1": "1 Test Road", "city": "Delhi", "state": "Delhi",
+        "pincode": "110001", "country": "India", "phone": "9000000000",
+    }
+    lines = []
+    for n in range(2):
+        # A credit that approves a pending payment, then one that is invoiced
+        shipment = f.make_shipment(f.make_user(), status="Pending Payment")
+        f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr=f"10000000000{n}", status="Pending"))
+        lines.append({"utr": f"10000000000{n}", "amount": "118.00", "type": "UPI"})
+        lines.append({"transaction": {"utr": f"20000000000{n}", "amount": "236.00", "type": "UPI", "weight": "1"},
+                      "order": {"sender": party, "receiver": party}})
+    f.chunks = 2
+    return "POST", "/api/admin/reconcile-statement", {
+        "headers": headers, "data": "\n".join(json.dumps(line) for line in lines), "content_type": "application/x-ndjson",
+    }
+
+@budgeted("admin.bulk_update_shipment_status")
+def _(f):
+    headers = f.admin()
+    f.monkeypatch.setattr(admin_routes, "BULK_STATUS_CHUNK_SIZE", 2)
+    user = f.make_user()
+    for _ in range(5):
+        f.make_shipment(user)
+    f.chunks = 3
+    return "POST", "/api/admin/shipments/bulk-status-update", {"headers": headers, "json": {
+        "filter": {"status": "Booked"}, "status": "In Transit",
+    }}
+
+@budgeted("admin.create_balance_code")
+def _(f):
+    return "POST", "/api/admin/balance-codes", {"headers": f.admin(), "json": {"amount": "500"}}
+
+@budgeted("admin.get_balance_codes")
+def _(f):
+    headers = f.admin()
+    f.add(BalanceCode(code="TOPUP-TEST0001", amount=Decimal("500.00")))
+    return "GET", "/api/admin/balance-codes", {"headers": headers}
+
+@budgeted("admin.delete_balance_code")
+def _(f):
+    headers = f.admin()
+    code = f.add(BalanceCode(code="TOPUP-TEST0001", amount=Decimal("500.00")))
+    return "DELETE", f"/api/admin/balance-codes/{code.id}", {"headers": headers}
+
+@budgeted("admin.get_all_shipments")
+def _(f):
+    headers = f.admin()
+    f.make_shipment(f.make_user())
+    return "GET", "/api/admin/shipments?page=1&q=delhi", {"headers": headers}
+
+@budgeted("admin.stream_all_shipment_events")
+def _(f):
+    return "GET", "/api/admin/shipments/events", {"headers": f.admin()}
+
+@budgeted("admin.update_shipment_status")
+def _(f):
+    headers = f.admin()
+    shipment = f.make_shipment(f.make_user())
+    return "PUT", f"/api/admin/shipments/{shipment.shipment_id_str}/status", {"headers": headers, "json": {
+        "status": "In Transit", "location": "Delhi",
+    }}
+
+@budgeted("admin.web_analytics")
+def _(f):
+    headers = f.admin()
+    f.make_shipment(f.make_user())
+    return "GET", "/api/admin/web_analytics?group_by=status,service_type", {"headers": headers}
+
+@budgeted("admin.quote_cache_stats")
+def _(f):
+    return "GET", "/api/admin/quote-cache/stats", {"headers": f.admin()}
+
+@budgeted("admin.shipment_cache_stats")
+def _(f):
+    return "GET", "/api/admin/shipment-cache/stats", {"headers": f.admin()}
+
+@budgeted("admin.get_payments")
+def _(f):
+    headers = f.admin()
+    shipment = f.make_shipment(f.make_user())
+    f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr="123456789012", status="Pending"))
+    return "GET", "/api/admin/payments", {"headers": headers}
+
+@budgeted("admin.update_payment_status")
+def _(f):
+    headers = f.admin()
+    shipment = f.make_shipment(f.make_user(), status="Pending Payment")
+    payment = f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr="123456789012", status="Pending"))
+    return "PUT", f"/api/admin/payments/{payment.id}/status", {"headers": headers, "json": {"status": "Approved"}}
+
+@budgeted("admin.get_all_users")
+def _(f):
+    headers = f.admin()
+    f.make_shipment(f.make_user(first_name="Asha"))
+    return "GET", "/api/admin/users?page=1&q=asha", {"headers": headers}
+
+@budgeted("admin.get_user_details")
+def _(f):
+    headers = f.admin()
+    shipment = f.make_shipment(f.make_user(is_employee=True))
+    f.add(PaymentRequest(user_id=shipment.user_id, shipment_id=shipment.id, amount=Decimal("118.00"), utr="123456789012", status="Pending"))
+    return "GET", f"/api/admin/users/{shipment.user_id}", {"headers": headers}
+
+@budgeted("admin.create_employee")
+def _(f):
+    return "POST", "/api/admin/employees", {"headers": f.admin(), "json": {
+        "firstName": "New", "lastName": "Employee", "email": "employee@example.com", "password": "secret1",
+    }}
+
+@budgeted("admin.get_all_employees")
+def _(f):
+    headers = f.admin()
+    f.make_shipment(f.make_user(first_name="Ravi", is_employee=True))
+    return "GET", "/api/admin/employees?page=1&q=ravi", {"headers": headers}
+
+@budgeted("admin.update_employee")
+def _(f):
+    headers = f.admin()
+    employee = f.make_user(is_employee=True)
+    return "PUT", f"/api/admin/employees/{employee.id}", {"headers": headers, "json": {
+        "firstName": "Renamed", "email": "renamed@example.com", "password": "secret2",
+    }}
+
+@budgeted("admin.delete_employee")
+def _(f):
+    headers = f.admin()
+    employee = f.make_user(is_employee=True)
+    f.address(employee)
+    return "DELETE", f"/api/admin/employees/{employee.id}", {"headers": headers}
+
+def test_every_budget_is_exercised():
+    assert sorted(REQUESTS) == sorted(QUERY_BUDGETS)
+
+@pytest.mark.parametrize("endpoint", sorted(REQUESTS))
+def test_endpoint_stays_within_its_budget(endpoint, app, client, db, make_user, make_shipment, monkeypatch):
+    f = Fixtures(db, make_user, make_shipment, monkeypatch)
+    method, url, kwargs = REQUESTS[endpoint](f)
+    assert app.url_map.bind("localhost").match(url.split("?")[0], method)[0] == endpoint
+
+    # TestingConfig raises QueryBudgetExceeded from the request itself; the
+    # enclosing budget also sees the count, so it can be reported
+    with query_budget(f.budget(endpoint)) as stats:
+        response = client.open(url, method=method, **kwargs)
+    response.close()
+
+    assert response.status_code < 400, response.get_data(as_text=True)
+    assert 0 < stats.statements <= f.budget(endpoint)
+
+@pytest.mark.parametrize("url", ["/api/admin/shipments?page=1", "/api/admin/users?page=1", "/api/admin/employees?page=1"])
+def test_a_page_of_an_admin_list_fetches_its_rows_and_total_together(url, client, db, make_user, make_shipment, monkeypatch):
+    f = Fixtures(db, make_user, make_shipment, monkeypatch)
+    headers = f.admin()
+    for is_employee in (False, True):
+        f.make_shipment(f.make_user(is_employee=is_employee))
+
+    # The admin lookup and one statement for the page
+    with query_budget(2):
+        response = client.get(url, headers=headers)
+    assert response.get_json()["totalCount"] == 1 + ("shipments" in url)
+
+def test_a_streamed_response_is_checked_when_the_stream_ends(client, db, make_user, make_shipment, monkeypatch):
+    f = Fixtures(db, make_user, make_shipment, monkeypatch)
+    method, url, kwargs = REQUESTS["admin.bulk_update_shipment_status"](f)
+    kwargs["json"]["stream"] = True
+
+    with query_budget(f.budget("admin.bulk_update_shipment_status")):
+        response = client.open(url, method=method, **kwargs)
+        progress = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        response.close()
+    assert progress[-1]["done"] and progress[-1]["chunks"] == f.chunks
+
+    # The statements of a streamed body are issued after the response has
+    # started, so the budget is checked once the body has been read
+    make_shipment(make_user())
+    monkeypatch.setitem(QUERY_BUDGETS, "admin.bulk_update_shipment_status", (2, 1))
+    response = client.open(url, method=method, **kwargs)
+    with pytest.raises(QueryBudgetExceeded, match="issued 4 SQL statements, budget is 3"):
+        response.get_data()
+    response.close()
+
+def test_exceeding_a_budget_fails_the_request(client, make_user, monkeypatch):
+    user = make_user()
+    monkeypatch.setitem(QUERY_BUDGETS, "auth.login", 0)
+
+    with pytest.raises(QueryBudgetExceeded, match="auth.login issued 1 SQL statements, budget is 0"):
+        client.post("/api/auth/login", json={"email": user.email, "password": "secret"})
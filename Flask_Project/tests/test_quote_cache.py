@@ -0,0 +1,57 @@
+import pytest
+
+from app.services import domestic_pricing_service, pricing_service
+from app.services.domestic_pricing_service import calculate_domestic_price
+from app.services.pricing_service import calculate_international_price
+from app.services.quote_cache import QuoteCache
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = QuoteCache()
+    monkeypatch.setattr(domestic_pricing_service, "quote_cache", cache)
+    monkeypatch.setattr(pricing_service, "quote_cache", cache)
+    return cache
+
+def test_express_quotes_share_an_entry_per_whole_kg(cache):
+    first = calculate_domestic_price("Maharashtra", "Mumbai", "express", 1.2)
+    second = calculate_domestic_price("Maharashtra", "Bombay", "express", 1.9)
+
+    assert first == second
+    assert list(cache._entries) == [("domestic", "7", "express", 2)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_per_kg_quotes_are_keyed_by_exact_weight(cache):
+    light = calculate_domestic_price("Maharashtra", "Mumbai", "surface", 7.2)
+    heavy = calculate_domestic_price("Maharashtra", "Mumbai", "surface", 7.7)
+
+    assert light["price"] != heavy["price"]
+    assert list(cache._entries) == [("domestic", "7", "surface", 7.2), ("domestic", "7", "surface", 7.7)]
+
+def test_destinations_in_one_zone_share_entries(cache):
+    calculate_domestic_price("Tamil Nadu", "", "air", 6)
+    calculate_domestic_price("Goa", "", "air", 6)
+
+    assert len(cache._entries) == 1
+    assert cache.hits == 1
+
+def test_international_quotes_are_keyed_by_country_and_whole_kg(cache):
+    calculate_international_price("Kenya", 2.1)
+    calculate_international_price(" kenya ", 3)
+
+    assert list(cache._entries) == [("international", "kenya", 3)]
+
+def test_callers_cannot_alter_cached_quotes(cache):
+    calculate_domestic_price("Maharashtra", "Mumbai", "express", 1)["price"] = 0
+
+    assert calculate_domestic_price("Maharashtra", "Mumbai", "express", 1)["price"] > 0
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = QuoteCache(maxsize=2)
+    cache.put("a", {"price": 1})
+    cache.put("b", {"price": 2})
+    cache.get("a")
+    cache.put("c", {"price": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"price": 1}
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 1, "evictions": 1, "hit_rate": 0.6667}
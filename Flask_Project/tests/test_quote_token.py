@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from itsdangerous import TimestampSigner
+
+from app.services import quote_token
+from app.services.quote_token import QUOTE_TOKEN_MAX_AGE, QuoteTokenError, issue_quote_token, verify_quote_token
+
+MUMBAI = ("Maharashtra", "Mumbai")
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    with app.app_context():
+        yield app
+
+def _rejection(token, *booking):
+    with pytest.raises(QuoteTokenError) as excinfo:
+        verify_quote_token(token, *booking)
+    return str(excinfo.value), excinfo.value.status_code
+
+def test_a_matching_booking_gets_the_quoted_total():
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 472.0)
+
+    assert verify_quote_token(token, "domestic", (" maharashtra", "MUMBAI "), "express", 2.5004) == 472.0
+    assert verify_quote_token(issue_quote_token("international", "Kenya", None, 3, 5310.0),
+                              "international", "kenya", None, 3) == 5310.0
+
+@pytest.mark.parametrize("booking", [
+    ("domestic", ("Maharashtra", "Pune"), "express", 2.5),
+    ("domestic", MUMBAI, "surface", 2.5),
+    ("domestic", MUMBAI, "express", 3),
+])
+def test_a_booking_that_differs_from_the_quote_is_rejected(booking):
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 472.0)
+
+    assert _rejection(token, *booking) == (
+        "Shipment details do not match the quoted destination, service or weight.", 400
+    )
+
+def test_a_quote_for_another_shipment_type_is_rejected():
+    token = issue_quote_token("international", "Kenya", None, 3, 5310.0)
+
+    assert _rejection(token, "domestic", MUMBAI, None, 3)[0] == "This quote was issued for a different shipment type."
+
+def test_a_tampered_token_is_rejected():
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 472.0)
+    cheaper = issue_quote_token("domestic", MUMBAI, "express", 2.5, 1.0)
+    # Swap in the payload of a cheaper quote, or corrupt the signature
+    forged = cheaper.split(".")[0] + token[token.index("."):]
+    corrupted = token[:-10] + ("A" if token[-10] != "A" else "g") + token[-9:]
+
+    for bad in (forged, corrupted, "not-a-token", "", None):
+        assert _rejection(bad, "domestic", MUMBAI, "express", 2.5)[1] == 400
+
+def test_a_token_signed_with_another_key_is_rejected(app, monkeypatch):
+    monkeypatch.setitem(app.config, "SECRET_KEY", "another-secret")
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 1.0)
+    monkeypatch.undo()
+
+    assert _rejection(token, "domestic", MUMBAI, "express", 2.5) == ("Invalid quote token.", 400)
+
+def test_an_expired_token_is_rejected(monkeypatch):
+    issued_at = int(time.time()) - QUOTE_TOKEN_MAX_AGE - 1
+    monkeypatch.setattr(TimestampSigner, "get_timestamp", lambda self: issued_at)
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 472.0)
+    monkeypatch.undo()
+
+    assert _rejection(token, "domestic", MUMBAI, "express", 2.5) == (
+        "This quote has expired. Please re-calculate the price.", 400
+    )
+
+def test_a_quote_from_an_older_rate_card_is_refused_with_a_conflict(monkeypatch):
+    token = issue_quote_token("domestic", MUMBAI, "express", 2.5, 472.0)
+    monkeypatch.setattr(quote_token, "DOMESTIC_RATE_VERSION", "not-the-same")
+
+    assert _rejection(token, "domestic", MUMBAI, "express", 2.5)[1] == 409
@@ -0,0 +1,77 @@
+import copy
+import json
+import os
+import shutil
+
+import pytest
+
+from app.services import rate_card_snapshot
+from app.services.domestic_pricing_service import DOMESTIC_PRICES, DOMESTIC_ZONES, compile_domestic_rates
+from app.services.pricing_service import compile_international_rates
+from app.services.rate_card_snapshot import SOURCE_FILES, load_snapshot_section, write_snapshot
+from compile_rate_cards import validate_rate_cards
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A copy of Data/ whose snapshot the tests can rewrite."""
+    for name in SOURCE_FILES:
+        shutil.copy(os.path.join(rate_card_snapshot.DATA_DIR, name), tmp_path / name)
+    monkeypatch.setattr(rate_card_snapshot, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(rate_card_snapshot, "SNAPSHOT_PATH", str(tmp_path / "rate_cards.snapshot"))
+    monkeypatch.setattr(rate_card_snapshot, "_loaded", {"mtime": None, "snapshot": None})
+    return tmp_path
+
+def _compile(data_dir):
+    raw = {name: (data_dir / name).read_bytes() for name in SOURCE_FILES}
+    domestic = compile_domestic_rates(json.loads(raw["domestic.json"]), json.loads(raw["dom_prices.json"]))
+    return write_snapshot(domestic, compile_international_rates(raw["pricing.json"]),
+                          path=rate_card_snapshot.SNAPSHOT_PATH)
+
+def test_versions_change_with_the_rates():
+    prices = copy.deepcopy(DOMESTIC_PRICES)
+    prices["7"]["express"]["1"] += 1
+    raw = open(rate_card_snapshot.source_path("pricing.json"), "rb").read()
+
+    assert compile_domestic_rates(DOMESTIC_ZONES, prices)["rate_version"] != \
+        compile_domestic_rates(DOMESTIC_ZONES, DOMESTIC_PRICES)["rate_version"]
+    assert compile_international_rates(raw)["version"] == compile_international_rates(raw)["version"]
+    assert compile_international_rates(raw.replace(b"3150", b"3151", 1))["version"] != \
+        compile_international_rates(raw)["version"]
+
+def test_snapshot_is_served_until_a_source_changes(data_dir):
+    snapshot = _compile(data_dir)
+
+    assert load_snapshot_section("domestic")["rate_version"] == snapshot["domestic"]["rate_version"]
+
+    stat = os.stat(data_dir / "dom_prices.json")
+    os.utime(data_dir / "dom_prices.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_snapshot_section("domestic") == {}
+
+def test_recompiling_an_edited_source_changes_the_version(data_dir):
+    before = _compile(data_dir)
+    pricing = json.loads((data_dir / "pricing.json").read_bytes())
+    pricing[0]["1"] += 10
+    (data_dir / "pricing.json").write_text(json.dumps(pricing))
+    after = _compile(data_dir)
+
+    assert after["international"]["version"] != before["international"]["version"]
+    assert after["version"] != before["version"]
+    assert load_snapshot_section("international")["version"] == after["international"]["version"]
+
+def test_a_snapshot_in_an_older_format_is_ignored(data_dir, monkeypatch):
+    _compile(data_dir)
+    monkeypatch.setattr(rate_card_snapshot, "SNAPSHOT_FORMAT", rate_card_snapshot.SNAPSHOT_FORMAT + 1)
+
+    assert load_snapshot_section("domestic") == {}
+
+def test_bad_rates_are_validation_errors():
+    prices = copy.deepcopy(DOMESTIC_PRICES)
+    del prices["7"]["express"]["3"]
+    prices["8"]["surface"]["<5"] = "76"
+
+    errors, _ = validate_rate_cards(DOMESTIC_ZONES, prices, [{"country": "Kenya", "per_kg": 0}])
+
+    assert "dom_prices.json zone 7 express is missing the '3' slab." in errors
+    assert "dom_prices.json zone 8 surface '<5' rate must be a positive number." in errors
+    assert "pricing.json 'Kenya' is missing the 1kg slab." in errors
+    assert "pricing.json 'Kenya' per_kg must be a positive number." in errors
@@ -0,0 +1,31 @@
+import pytest
+
+@pytest.fixture
+def admin_headers(make_user):
+    return {"X-User-Email": make_user("admin@example.com", is_admin=True).email}
+
+def _emails(client, url, headers):
+    return sorted(user["email"] for user in client.get(url, headers=headers).get_json()["users"])
+
+def test_short_terms_match_the_start_of_the_email(client, make_user, admin_headers):
+    make_user("ab.customer@example.com")
+    make_user("Abhay@example.com")
+    make_user("zara@example.com", first_name="Ab")
+
+    assert _emails(client, "/api/admin/users?q=ab", admin_headers) == ["Abhay@example.com", "ab.customer@example.com"]
+    assert _emails(client, "/api/admin/users?q=%25", admin_headers) == []
+
+def test_email_lookup_ignores_case(client, make_user, make_shipment, admin_headers):
+    customer = make_user("Customer@Example.com")
+    make_shipment(customer)
+
+    assert _emails(client, "/api/admin/users?q=customer@example.COM", admin_headers) == ["Customer@Example.com"]
+    shipments = client.get("/api/admin/shipments?q=CUSTOMER@example.com", headers=admin_headers).get_json()["shipments"]
+    assert len(shipments) == 1
+
+def test_short_shipment_terms_match_the_booker_email(client, make_user, make_shipment, admin_headers):
+    make_shipment(make_user("kiran@example.com"))
+    make_shipment(make_user("meera@example.com"))
+
+    shipments = client.get("/api/admin/shipments?q=Ki", headers=admin_headers).get_json()["shipments"]
+    assert len(shipments) == 1
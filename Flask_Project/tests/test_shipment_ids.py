@@ -0,0 +1,68 @@
+import os
+import re
+from itertools import count
+
+import pytest
+
+from app.services import shipment_ids
+from app.services.shipment_ids import (
+    SHIPMENT_ID_BLOCK_SIZE, _encode, _id_key, _permute, allocate_shipment_id_str, allocate_shipment_id_strs,
+)
+
+SHIPMENT_ID_FORMAT = re.compile(r"^SBC[0-9A-Z]{12}$")
+
+class BlockSequence:
+    """Stands in for the session, answering nextval() on the block sequence."""
+
+    def __init__(self, start=1):
+        self.blocks = count(start)
+        self.calls = 0
+
+    def execute(self, statement):
+        self.calls += 1
+        block_number = next(self.blocks)
+        return type("Result", (), {"scalar": lambda self: block_number})()
+
+@pytest.fixture
+def app_context(app, monkeypatch):
+    monkeypatch.setattr(shipment_ids, "_block", {"pid": os.getpid(), "next": 0, "end": 0})
+    with app.app_context():
+        yield app
+
+def test_ids_are_distinct_and_well_formed(app_context):
+    sequence = BlockSequence()
+    ids = allocate_shipment_id_strs(sequence, 2 * SHIPMENT_ID_BLOCK_SIZE + 1)
+
+    assert len(set(ids)) == len(ids)
+    assert all(SHIPMENT_ID_FORMAT.match(shipment_id) for shipment_id in ids)
+    assert sequence.calls == 3
+
+def test_ids_are_served_from_the_claimed_block(app_context):
+    sequence = BlockSequence()
+    first = allocate_shipment_id_str(sequence)
+    rest = [allocate_shipment_id_str(sequence) for _ in range(SHIPMENT_ID_BLOCK_SIZE - 1)]
+
+    assert sequence.calls == 1
+    assert first not in rest and len(set(rest)) == len(rest)
+
+def test_permutation_is_a_bijection_on_consecutive_and_distant_serials(app_context):
+    key = _id_key()
+    serials = list(range(5000)) + [(1 << 62) - 1 - n for n in range(5000)]
+    permuted = [_permute(serial, key) for serial in serials]
+
+    assert len(set(permuted)) == len(serials)
+    assert all(0 <= value < 1 << 62 for value in permuted)
+    assert _encode(0) == "SBC000000000000"
+    assert SHIPMENT_ID_FORMAT.match(_encode((1 << 62) - 1))
+
+def test_rotating_the_secret_key_keeps_the_ids(app_context, monkeypatch):
+    sequence = BlockSequence(start=7)
+    before = allocate_shipment_id_strs(sequence, 3)
+
+    monkeypatch.setitem(app_context.config, "SECRET_KEY", "a-rotated-secret")
+    monkeypatch.setattr(shipment_ids, "_block", {"pid": os.getpid(), "next": 0, "end": 0})
+    assert allocate_shipment_id_strs(BlockSequence(start=7), 3) == before
+
+    monkeypatch.setitem(app_context.config, "SHIPMENT_ID_KEY", "another-id-key")
+    monkeypatch.setattr(shipment_ids, "_block", {"pid": os.getpid(), "next": 0, "end": 0})
+    assert allocate_shipment_id_strs(BlockSequence(start=7), 3) != before
@@ -0,0 +1,77 @@
+from sqlalchemy import func, select
+
+from app.models import Shipment, TrackingEvent
+from app.services.tracking import add_tracking_event, shipment_tracking_history
+from backfill_tracking_events import BACKFILL_SQL, CLEAR_JSONB_SQL
+
+LEGACY_HISTORY = [
+    {"stage": "Booked", "date": "2024-03-01T09:00:00", "location": "Delhi", "activity": "Shipment booked."},
+    {"stage": "In Transit", "date": "2024-03-02T18:30:00", "location": "Jaipur", "activity": "Left the hub."},
+]
+
+def _unmigrated_shipment(make_user, make_shipment):
+    return make_shipment(make_user(), status="In Transit", tracking_history=LEGACY_HISTORY, tracking_history_migrated=False)
+
+def _backfill(db, clear_jsonb=False):
+    params = {"first_id": 1, "end_id": 1_000_000}
+    inserted = db.session.execute(BACKFILL_SQL, params).rowcount
+    if clear_jsonb:
+        db.session.execute(CLEAR_JSONB_SQL, params)
+    db.session.commit()
+    db.session.expire_all()
+    return inserted
+
+def _stages(shipment):
+    return [(entry["stage"], entry["location"]) for entry in shipment_tracking_history(shipment)]
+
+EXPECTED = [("Booked", "Delhi"), ("In Transit", "Jaipur"), ("Delivered", "Ajmer")]
+
+def test_new_event_keeps_the_legacy_history(db, make_user, make_shipment):
+    shipment = _unmigrated_shipment(make_user, make_shipment)
+    add_tracking_event(shipment, "Delivered", "Ajmer", "Delivered to the receiver.")
+    db.session.commit()
+    db.session.expire_all()
+
+    assert _stages(shipment) == EXPECTED
+
+def test_backfill_migrates_legacy_history_of_shipments_with_events(db, make_user, make_shipment):
+    shipment = _unmigrated_shipment(make_user, make_shipment)
+    add_tracking_event(shipment, "Delivered", "Ajmer", "Delivered to the receiver.")
+    db.session.commit()
+
+    assert _backfill(db, clear_jsonb=True) == 2
+
+    shipment = db.session.get(Shipment, shipment.id)
+    assert shipment.tracking_history_migrated
+    assert shipment.tracking_history == []
+    assert _stages(shipment) == EXPECTED
+    assert db.session.scalar(select(func.count()).select_from(TrackingEvent)) == 3
+
+    # Re-running copies nothing twice
+    assert _backfill(db, clear_jsonb=True) == 0
+    assert _stages(db.session.get(Shipment, shipment.id)) == EXPECTED
+
+def test_clear_jsonb_leaves_unmigrated_shipments_alone(db, make_user, make_shipment):
+    shipment = _unmigrated_shipment(make_user, make_shipment)
+    add_tracking_event(shipment, "Delivered", "Ajmer", "Delivered to the receiver.")
+    db.session.commit()
+
+    db.session.execute(CLEAR_JSONB_SQL, {"first_id": 1, "end_id": 1_000_000})
+    db.session.commit()
+    db.session.expire_all()
+
+    assert db.session.get(Shipment, shipment.id).tracking_history == LEGACY_HISTORY
+    assert _stages(db.session.get(Shipment, shipment.id)) == EXPECTED
+
+def test_history_copied_by_an_earlier_backfill_is_not_repeated(db, make_user, make_shipment):
+    shipment = _unmigrated_shipment(make_user, make_shipment)
+    # An earlier version of the backfill copied the entries without marking the shipment
+    _backfill(db)
+    db.session.execute(
+        Shipment.__table__.update().where(Shipment.id == shipment.id).values(tracking_history_migrated=False)
+    )
+    db.session.commit()
+    db.session.expire_all()
+
+    assert _stages(db.session.get(Shipment, shipment.id)) == EXPECTED[:2]
+    assert _backfill(db) == 0
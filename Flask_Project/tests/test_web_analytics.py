@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from app.services.analytics_rollups import rebuild_rollups
+
+@pytest.fixture
+def admin_headers(make_user):
+    return {"X-User-Email": make_user("admin@example.com", is_admin=True).email}
+
+def _analytics(client, headers, query=""):
+    return client.get(f"/api/admin/web_analytics{query}", headers=headers).get_json()
+
+def test_totals_come_from_the_base_tables_until_the_rollups_are_built(client, db, make_user, make_shipment, admin_headers):
+    customer = make_user()
+    make_shipment(customer)
+    make_shipment(customer, status="Delivered", total_with_tax_18_percent=Decimal("236.00"))
+    # A database from before the rollups: no rollup rows and no deltas
+    db.session.execute(text("TRUNCATE shipment_rollup_deltas, user_rollup_deltas"))
+    db.session.commit()
+
+    expected = {"total_orders": 2, "total_revenue": 354.0, "avg_revenue": 177.0, "total_users": 1}
+    assert _analytics(client, admin_headers) == expected
+    grouped = _analytics(client, admin_headers, "?group_by=status")
+    assert grouped["groups"] == [
+        {"status": "Booked", "orders": 1, "revenue": 118.0},
+        {"status": "Delivered", "orders": 1, "revenue": 236.0},
+    ]
+
+    rebuild_rollups()
+    db.session.commit()
+    assert _analytics(client, admin_headers) == expected
+    assert _analytics(client, admin_headers, "?group_by=status") == grouped
+
+def test_shipments_follow_their_booker_when_the_user_type_changes(client, db, make_user, make_shipment, admin_headers):
+    employee = make_user(is_employee=True)
+    leaver = make_user(is_employee=True)
+    make_shipment(employee)
+    make_shipment(employee, status="Delivered", total_with_tax_18_percent=Decimal("236.00"))
+    make_shipment(leaver)
+    make_shipment(make_user())
+    db.session.commit()
+
+    employee.is_employee = False
+    db.session.commit()
+    db.session.execute(text("DELETE FROM users WHERE id = :id"), {"id": leaver.id})
+    db.session.commit()
+
+    grouped = _analytics(client, admin_headers, "?group_by=user_type")
+    assert grouped["groups"] == [{"user_type": "Customer", "orders": 3, "revenue": 472.0}]
+
+    rebuild_rollups()
+    db.session.commit()
+    assert _analytics(client, admin_headers, "?group_by=user_type") == grouped
+
+    employee.is_employee = True
+    db.session.commit()
+    assert _analytics(client, admin_headers, "?group_by=user_type")["groups"] == [
+        {"user_type": "Customer", "orders": 1, "revenue": 118.0},
+        {"user_type": "Employee", "orders": 2, "revenue": 354.0},
+    ]
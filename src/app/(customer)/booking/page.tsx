@@ -28,6 +28,7 @@ import { Textarea } from "@/components/ui/textarea";
 
 interface PriceResponse {
     total_price: number;
+    quote_token: string;
     [key: string]: any;
 }
 
@@ -214,6 +215,7 @@ export default function CustomerBookingPage() {
             user_email: session.email,
             pickup_date: format(values.pickup_date, 'yyyy-MM-dd'),
             final_total_price_with_tax: priceDetails.total_price,
+            quote_token: priceDetails.quote_token,
             package_length_cm: values.package_length_cm || 0,
             package_width_cm: values.package_width_cm || 0,
             package_height_cm: values.package_height_cm || 0,